@@ -0,0 +1,165 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from config import settings
+
+# Constants for the audit log file and queue
+AUDIT_LOG_FILE_PATH = "audit_log.jsonl"
+AUDIT_QUEUE_SIZE = 10000  # Records beyond this are dropped rather than blocking the caller
+AUDIT_BODY_MAX_LENGTH = 2000  # Longer response bodies are truncated
+
+
+class AuditLog:
+    """
+    Structured audit log written by a background thread.
+    log() only puts a record on a queue, so callers never wait for the disk. The
+    writer appends compact JSON lines and rotates the file by size and age. Records
+    can be sampled per event and the verbosity decides how much detail is kept.
+    """
+
+    def __init__(self, path=AUDIT_LOG_FILE_PATH, verbosity=None, max_bytes=None, rotate_seconds=None,
+                 backup_count=None, sample_rates=None):
+        """
+        Args:
+            path (str): Path to the log file.
+            verbosity (int): 0 disables logging, 1 logs summaries, 2 also logs response bodies.
+            max_bytes (int): Rotate the file once it is larger than this.
+            rotate_seconds (int): Rotate the file once it is older than this.
+            backup_count (int): Number of rotated files to keep.
+            sample_rates (dict): Share of records to keep per event, between 0 and 1.
+        Unset arguments are taken from config.settings.
+        """
+        self.path = path
+        self.verbosity = settings.AUDIT_LOG_VERBOSITY if verbosity is None else verbosity
+        self.max_bytes = max_bytes or settings.AUDIT_LOG_MAX_BYTES
+        self.rotate_seconds = rotate_seconds or settings.AUDIT_LOG_ROTATE_SECONDS
+        self.backup_count = settings.AUDIT_LOG_BACKUP_COUNT if backup_count is None else backup_count
+        self.sample_rates = settings.AUDIT_LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+        self._file = None
+        self._opened_at = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def log(self, event, body=None, **fields):
+        """
+        Queue an audit record without blocking.
+        Args:
+            event (str): What happened, e.g. "send_sms".
+            body (str or requests.Response): Response body, only read and kept at verbosity 2.
+            **fields: Further details, e.g. status=200.
+        """
+        if self.verbosity <= 0:
+            return
+        rate = self.sample_rates.get(event, 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return
+
+        record = {"ts": round(time.time(), 3), "event": event, **fields}
+        if body is not None and self.verbosity >= 2:
+            text = body if isinstance(body, str) else body.text
+            record["body"] = text[:AUDIT_BODY_MAX_LENGTH]
+
+        self.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        self._file = open(self.path, 'a')
+        try:
+            self._opened_at = os.path.getmtime(self.path) if self._file.tell() else time.time()
+        except OSError:
+            self._opened_at = time.time()
+
+    def _rotate(self):
+        """Close the file and shift it to path.1, path.2, ... keeping backup_count files."""
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _write(self, records):
+        if self._file is None:
+            self._open()
+        for record in records:
+            if self._file.tell() >= self.max_bytes or time.time() - self._opened_at > self.rotate_seconds:
+                self._rotate()
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            # Write whatever else is waiting in the same batch
+            while len(records) < 1000:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in records
+            try:
+                self._write([record for record in records if record is not None])
+            except OSError as e:
+                print(f"Could not write audit log: {e}")
+            for _ in records:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def start(self):
+        """Start the writer thread if it is not running yet."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="audit-log", daemon=True)
+                    self._thread.start()
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Write the remaining records, stop the writer thread and close the file."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_audit_log = None
+_audit_log_lock = threading.Lock()
+
+
+def get_audit_log():
+    """
+    Returns:
+        AuditLog: The shared audit log.
+    """
+    global _audit_log
+    with _audit_log_lock:
+        if _audit_log is None:
+            _audit_log = AuditLog()
+        return _audit_log
+
+
+def audit(event, body=None, **fields):
+    """Queue a record on the shared audit log, see AuditLog.log()."""
+    get_audit_log().log(event, body, **fields)
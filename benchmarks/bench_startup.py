@@ -0,0 +1,229 @@
+"""
+Startup-latency benchmark of the entry points.
+
+Every entry module is imported in a fresh interpreter with `-X importtime`, in an
+empty working directory. The report lists each module's import time (median of
+the runs) and the top-level packages that time is spent in, and checks that the
+import
+  * stays within the time budget,
+  * loads none of the modules reserved for the code paths that need them (LAZY_MODULES),
+  * prints nothing and creates no files.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup                           # run, print and check
+    python -m benchmarks.bench_startup --modules main --top 20
+    python -m benchmarks.bench_startup --save-baseline
+    python -m benchmarks.bench_startup --compare --threshold 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_MODULES = ["main", "service", "sharding", "retrieve_phone_numbers"]
+# Only loaded by the code paths that use them, never by importing an entry point
+LAZY_MODULES = ["IPython", "aiohttp", "numpy", "dotenv", "schedule", "requests", "urllib3"]
+DEFAULT_REPEAT = 5
+DEFAULT_BUDGET_MS = 400.0  # Import time allowed per entry module
+DEFAULT_TOP = 8
+DEFAULT_THRESHOLD = 0.25  # Allowed slowdown of the median before an import counts as regressed
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+
+def parse_importtime(stderr):
+    """
+    Parse the `-X importtime` report of an interpreter.
+    Returns:
+        list: (name, depth, self_us, cumulative_us) per imported module, in the
+            report's order: every module follows the modules it imported.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # The header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), depth, int(fields[0]), int(fields[1])))
+    return entries
+
+
+def subtree(entries, module):
+    """
+    Returns:
+        list: The entries imported by importing `module`, the module's own entry last.
+    """
+    start = 0
+    for index, (name, depth, _, _) in enumerate(entries):
+        if depth == 0 and name == module:
+            return entries[start:index + 1]
+        if depth == 0:
+            start = index + 1
+    return []
+
+
+def import_once(module):
+    """
+    Import a module in a fresh interpreter, in an empty working directory.
+    Returns:
+        dict: The parsed importtime entries of the module, the wall time of the
+            interpreter, its output, the files it left behind and its exit code.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT, PYTHONDONTWRITEBYTECODE="1")
+    with tempfile.TemporaryDirectory() as work_dir:
+        started = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                 cwd=work_dir, env=env, capture_output=True, text=True)
+        wall = time.perf_counter() - started
+        files = sorted(os.listdir(work_dir))
+    return {"entries": subtree(parse_importtime(process.stderr), module), "wall": wall,
+            "stdout": process.stdout, "files": files, "returncode": process.returncode,
+            "stderr": process.stderr}
+
+
+def measure(module, repeat, top):
+    """
+    Import a module `repeat` times.
+    Returns:
+        dict: Median and min import time in ms, the heaviest top-level packages by
+            their own import time, the lazy modules loaded and the side effects seen.
+    """
+    runs = [import_once(module) for _ in range(repeat)]
+    failed = next((run for run in runs if run["returncode"] != 0 or not run["entries"]), None)
+    if failed:
+        return {"error": failed["stderr"].strip().splitlines()[-1:] or [f"exit code {failed['returncode']}"]}
+
+    import_ms = [run["entries"][-1][3] / 1000 for run in runs]
+    packages = {}
+    for name, _, self_us, _ in runs[-1]["entries"]:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us / 1000
+    loaded = {name.split(".")[0] for run in runs for name, _, _, _ in run["entries"]}
+    return {"median": statistics.median(import_ms), "min": min(import_ms),
+            "wall_median": statistics.median(run["wall"] for run in runs) * 1000,
+            "modules": len(runs[-1]["entries"]),
+            "heaviest": sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+            "lazy_loaded": sorted(loaded.intersection(LAZY_MODULES)),
+            "stdout": next((run["stdout"] for run in runs if run["stdout"]), ""),
+            "files": sorted({name for run in runs for name in run["files"]})}
+
+
+def run(modules, repeat, top):
+    """
+    Measure every entry module and print its import-time report.
+    Returns:
+        dict: The results with metadata, in the same layout as the micro-benchmarks.
+    """
+    results = {}
+    for module in modules:
+        result = measure(module, repeat, top)
+        results[module] = result
+        if "error" in result:
+            print(f"{module:<24} import failed: {' '.join(result['error'])}")
+            continue
+        print(f"{module:<24} median {result['median']:8.1f} ms   min {result['min']:8.1f} ms   "
+              f"interpreter {result['wall_median']:8.1f} ms   {result['modules']} modules")
+        for package, milliseconds in result["heaviest"]:
+            print(f"    {package:<28} {milliseconds:8.1f} ms")
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "timestamp": time.time(), "repeat": repeat},
+            "results": results}
+
+
+def check(current, budget_ms):
+    """
+    Check every import against the budget and for lazy modules and side effects.
+    Returns:
+        list: A description of every violation found.
+    """
+    violations = []
+    for module, result in current["results"].items():
+        if "error" in result:
+            violations.append(f"{module}: import failed")
+            continue
+        if result["median"] > budget_ms:
+            violations.append(f"{module}: import takes {result['median']:.1f} ms, budget {budget_ms:.0f} ms")
+        if result["lazy_loaded"]:
+            violations.append(f"{module}: loads {', '.join(result['lazy_loaded'])} on import")
+        if result["stdout"]:
+            violations.append(f"{module}: prints on import: {result['stdout'].strip()[:80]!r}")
+        if result["files"]:
+            violations.append(f"{module}: creates {', '.join(result['files'])} on import")
+    return violations
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare the median import times with a baseline.
+    Returns:
+        list: Names of the modules whose import got slower by more than the threshold.
+    """
+    regressions = []
+    for module, result in current["results"].items():
+        base = baseline["results"].get(module)
+        if not base or "median" not in base or "median" not in result:
+            continue
+        change = result["median"] / base["median"] - 1 if base["median"] else 0.0
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{module:<24} {base['median']:8.1f} -> {result['median']:8.1f} ms ({change:+.1%}) {marker}")
+        if change > threshold:
+            regressions.append(module)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the AquaMind entry points.")
+    parser.add_argument("--modules", nargs="+", default=ENTRY_MODULES)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="Packages to list per module")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Import time allowed per module")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare with the baseline, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    current = run(args.modules, args.repeat, args.top)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(current, output_file, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(current, baseline_file, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+
+    failed = False
+    violations = check(current, args.budget_ms)
+    for violation in violations:
+        print(violation)
+    if violations:
+        print(f"{len(violations)} startup check(s) failed.")
+        failed = True
+    if args.compare:
+        try:
+            with open(args.baseline, 'r') as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            sys.exit(2)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} import(s) regressed by more than {args.threshold:.0%}.")
+            failed = True
+    if failed:
+        sys.exit(1)
+    print("Startup checks passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark of the scalar and vectorized daily water intake calculations.
+
+Checks first that calculate_daily_intake_batch returns exactly the same targets
+as calculate_daily_intake, then times both over a synthetic population.
+
+Run from the repository root:
+    python -m benchmarks.bench_water_intake [rows]
+"""
+import sys
+import time
+
+import numpy as np
+
+from water_intake import calculate_daily_intake, calculate_daily_intake_batch
+
+DEFAULT_ROWS = 1_000_000
+
+
+def make_population(rows, seed=42):
+    """
+    Build a reproducible synthetic population.
+    Returns:
+        tuple: (genders, ages, weights) as NumPy arrays.
+    """
+    rng = np.random.default_rng(seed)
+    genders = rng.choice(np.array(['male', 'female']), size=rows)
+    ages = rng.integers(1, 100, size=rows)
+    weights = np.round(rng.uniform(10.0, 150.0, size=rows), 1)
+    return genders, ages, weights
+
+
+def check_equivalence(genders, ages, weights):
+    """
+    Compare the vectorized results with the scalar function, element by element.
+    Raises:
+        AssertionError: If any target differs.
+    """
+    batch = calculate_daily_intake_batch(genders, ages, weights)
+    scalar = [calculate_daily_intake(g, a, w) for g, a, w in zip(genders.tolist(), ages.tolist(), weights.tolist())]
+    mismatches = np.flatnonzero(batch != np.array(scalar))
+    assert mismatches.size == 0, f"{mismatches.size} targets differ, first at row {mismatches[0]}"
+
+
+def time_call(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(rows=DEFAULT_ROWS):
+    # Edge cases around the age and weight thresholds, plus a random sample
+    edge_genders = np.array(['male', 'female'] * 6)
+    edge_ages = np.array([13, 13, 14, 14, 0, 0, 149, 149, 13, 14, 13, 14])
+    edge_weights = np.array([70.0, 63.3, 83.3, 66.7, 83.34, 66.67, 0.1, 200.0, 70.0, 70.0, 63.0, 66.0])
+    check_equivalence(edge_genders, edge_ages, edge_weights)
+    check_equivalence(*make_population(100_000, seed=7))
+    print("Equivalence check passed.")
+
+    genders, ages, weights = make_population(rows)
+    genders_list, ages_list, weights_list = genders.tolist(), ages.tolist(), weights.tolist()
+
+    scalar_time = time_call(lambda: [calculate_daily_intake(g, a, w)
+                                     for g, a, w in zip(genders_list, ages_list, weights_list)])
+    batch_time = time_call(lambda: calculate_daily_intake_batch(genders, ages, weights))
+
+    print(f"Rows:       {rows:,}")
+    print(f"Scalar:     {scalar_time:.3f}s ({rows / scalar_time:,.0f} rows/s)")
+    print(f"Vectorized: {batch_time:.3f}s ({rows / batch_time:,.0f} rows/s)")
+    print(f"Speed-up:   {scalar_time / batch_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS)
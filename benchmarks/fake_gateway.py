@@ -0,0 +1,220 @@
+"""
+Local stand-in for the hackathon SMS gateway.
+
+Implements the endpoints used by sms_service with configurable latency, error
+rate and rate limit, and generates inbound replies: registration details in
+answer to the data request, and "done"/"skip" in answer to reminders.
+
+Run standalone from the repository root:
+    python -m benchmarks.fake_gateway --port 3030 --users 100
+and point the service at it with AQUAMIND_GATEWAY_URL=http://127.0.0.1:3030.
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DATA_REQUEST_PREFIX = "Please send your username"
+
+
+def _timestamp(seconds=None):
+    """Format a time like the gateway's receivedAt values."""
+    moment = datetime.fromtimestamp(seconds or time.time(), tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+
+class _GatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Room for bursts of concurrent connections
+
+
+class FakeGateway:
+    """
+    In-memory gateway state plus the HTTP server serving it.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0.0, reply_probability=1.0,
+                 done_probability=0.7, seed=1):
+        """
+        Args:
+            latency (float): Seconds added to every request.
+            jitter (float): Up to this many extra seconds, uniformly random.
+            error_rate (float): Share of requests answered with HTTP 500.
+            rate_limit (float): Requests per second accepted before answering HTTP 429; 0 for unlimited.
+            reply_probability (float): Share of reminders that get a reply.
+            done_probability (float): Share of reminder replies that are "done" rather than "skip".
+            seed (int): Seed for the random generator, for repeatable runs.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.reply_probability = reply_probability
+        self.done_probability = done_probability
+        self.random = random.Random(seed)
+        self.teams = set()
+        self.numbers = {}  # phone number -> team
+        self.inbox = {}  # phone number -> list of inbound messages
+        self.sent = 0
+        self.requests = {}
+        self._window = (0, 0)  # (second, requests in that second)
+        self._lock = threading.Lock()
+        self.server = None
+
+    def seed_users(self, count, team_name="WaterProof", prefix="4915"):
+        """
+        Create `count` subscribers that already sent their registration details.
+        Returns:
+            list: The phone numbers.
+        """
+        numbers = []
+        with self._lock:
+            for index in range(count):
+                phone_number = f"{prefix}{index:08d}"
+                self.numbers[phone_number] = team_name
+                self.inbox[phone_number] = [{"text": self._registration_text(index), "receivedAt": _timestamp()}]
+                numbers.append(phone_number)
+        return numbers
+
+    def _registration_text(self, index):
+        gender = self.random.choice(["male", "female"])
+        return f"user{index} {self.random.randint(10, 90)} {self.random.randint(30, 130)} {gender}"
+
+    def _reply(self, phone_number, message):
+        """Generate the subscriber's inbound reply to an outbound SMS. Must hold the lock."""
+        if message.startswith(DATA_REQUEST_PREFIX):
+            text = self._registration_text(len(self.inbox))
+        elif "drink" in message and self.random.random() < self.reply_probability:
+            text = "done" if self.random.random() < self.done_probability else "skip"
+        else:
+            return
+        self.inbox.setdefault(phone_number, []).append({"text": text, "receivedAt": _timestamp()})
+
+    def _admit(self, endpoint):
+        """Count the request and decide whether to answer it normally. Returns an HTTP status."""
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            if self.rate_limit:
+                second = int(time.monotonic())
+                window_second, count = self._window
+                count = count + 1 if window_second == second else 1
+                self._window = (second, count)
+                if count > self.rate_limit:
+                    return 429
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 500
+        return 200
+
+    def handle(self, method, path, payload):
+        """
+        Answer one request.
+        Returns:
+            tuple: (HTTP status, JSON-serializable body)
+        """
+        endpoint = "/team/getMessages" if path.startswith("/team/getMessages/") else path
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.random() * self.jitter)
+        status = self._admit(endpoint)
+        if status != 200:
+            return status, {"status": "Error", "description": "Too many requests" if status == 429 else "Internal error"}
+
+        if method == "POST" and path == "/team/addNewTeam":
+            with self._lock:
+                if payload.get("teamName") in self.teams:
+                    return 500, {"error": f"Team {payload.get('teamName')} already exists"}
+                self.teams.add(payload.get("teamName"))
+            return 200, {"status": "Success", "description": "Team added"}
+
+        if method == "POST" and path == "/team/registerNumber":
+            with self._lock:
+                self.numbers[payload.get("phoneNumber")] = payload.get("teamName")
+            return 200, {"status": "Success", "description": "Number registered"}
+
+        if method == "GET" and endpoint == "/team/getMessages":
+            team_name = path.rsplit("/", 1)[-1]
+            with self._lock:
+                return 200, [{phone_number: list(messages)} for phone_number, messages in self.inbox.items()
+                             if self.numbers.get(phone_number) == team_name]
+
+        if method == "POST" and path == "/sms/send":
+            with self._lock:
+                self.sent += 1
+                self._reply(payload.get("phoneNumber"), payload.get("message", ""))
+            return 200, {"status": "Success", "description": "SMS sent"}
+
+        return 404, {"error": f"Unknown endpoint {method} {path}"}
+
+    def start(self, port=0, host="127.0.0.1"):
+        """
+        Serve the gateway in a background thread.
+        Returns:
+            str: The base URL to use as sms_service.BASE_URL.
+        """
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real server
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; don't let Nagle delay the body
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                status, body = gateway.handle(method, self.path, payload)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _GatewayServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="fake-gateway", daemon=True).start()
+        return f"http://{host}:{self.server.server_port}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake SMS gateway.")
+    parser.add_argument("--port", type=int, default=3030)
+    parser.add_argument("--users", type=int, default=0, help="Subscribers to seed with registration replies")
+    parser.add_argument("--team", default="WaterProof")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    gateway = FakeGateway(args.latency, args.jitter, args.error_rate, args.rate_limit)
+    gateway.seed_users(args.users, args.team)
+    print(f"Fake gateway listening on {gateway.start(args.port)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        gateway.stop()
+
+
+if __name__ == "__main__":
+    main()
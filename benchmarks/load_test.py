@@ -0,0 +1,143 @@
+"""
+End-to-end load test of the main.main() flow against the local fake gateway.
+
+For every population size a fresh child process runs main.main() in an empty
+working directory, with metrics enabled and reminder intervals shortened to 0.
+The report shows messages/sec, p50/p99 gateway latency (estimated from the
+metrics histograms) and the child's peak RSS.
+
+Run from the repository root:
+    python -m benchmarks.load_test --users 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _merged_quantile(snapshot, metric_name, q, **label_filter):
+    """Estimate a quantile over all label sets of a histogram snapshot that match the filter."""
+    metric = snapshot["metrics"].get(metric_name)
+    if not metric:
+        return None
+    merged = {}
+    for value in metric["values"]:
+        if all(value["labels"].get(name) == wanted for name, wanted in label_filter.items()):
+            for bound, count in value["buckets"].items():
+                merged[bound] = merged.get(bound, 0) + count
+    if not merged or not merged["+Inf"]:
+        return None
+
+    rank = q * merged["+Inf"]
+    lower_bound, lower_count = 0.0, 0
+    for bound, count in merged.items():
+        if bound == "+Inf":
+            return lower_bound
+        if count >= rank:
+            if count == lower_count:
+                return float(bound)
+            return lower_bound + (float(bound) - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = float(bound), count
+    return lower_bound
+
+
+def run_child(reminder_rounds):
+    """Run main.main() in this process and print the results as JSON (child side)."""
+    import main
+    import metrics
+
+    metrics.set_enabled(True)
+    main.REMINDER_REPEAT = reminder_rounds
+    main.REMINDER_INTERVAL_SECONDS = 0
+
+    start = time.perf_counter()
+    main.main()
+    duration = time.perf_counter() - start
+
+    snapshot = metrics.registry.snapshot()
+    sent = sum(value["count"] for value in snapshot["metrics"]["gateway_request_seconds"]["values"]
+               if value["labels"]["endpoint"] == "send_sms")
+    result = {
+        "duration": duration,
+        "sms_sent": sent,
+        "messages_per_second": sent / duration if duration else 0.0,
+        "p50": _merged_quantile(snapshot, "gateway_request_seconds", 0.5, endpoint="send_sms"),
+        "p99": _merged_quantile(snapshot, "gateway_request_seconds", 0.99, endpoint="send_sms"),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    print("LOAD_TEST_RESULT " + json.dumps(result))
+
+
+def run_size(users, args):
+    """Seed a fresh fake gateway, run the child and return its results."""
+    from benchmarks.fake_gateway import FakeGateway
+
+    gateway = FakeGateway(args.latency, args.jitter, args.error_rate, args.rate_limit)
+    gateway.seed_users(users)
+    base_url = gateway.start()
+
+    env = dict(os.environ,
+               PYTHONPATH=REPO_ROOT,
+               AQUAMIND_GATEWAY_URL=base_url,
+               AQUAMIND_SMS_RATE_LIMIT=str(args.sms_rate_limit),
+               AQUAMIND_SMS_CONCURRENCY=str(args.concurrency),
+               AQUAMIND_AUDIT_VERBOSITY="0",
+               AQUAMIND_METRICS="1")
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.load_test", "--child", "--rounds", str(args.rounds)],
+                cwd=work_dir, env=env, capture_output=True, text=True)
+    finally:
+        gateway.stop()
+
+    for line in completed.stdout.splitlines():
+        if line.startswith("LOAD_TEST_RESULT "):
+            result = json.loads(line[len("LOAD_TEST_RESULT "):])
+            result["gateway_requests"] = dict(gateway.requests)
+            return result
+    raise RuntimeError(f"Load test run for {users} users failed:\n{completed.stderr[-2000:]}")
+
+
+def _ms(seconds):
+    return "n/a" if seconds is None else f"{seconds * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test main.main() against the local fake gateway.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--rounds", type=int, default=3, help="Reminder rounds in subscribe_reminders")
+    parser.add_argument("--latency", type=float, default=0.0, help="Gateway latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Gateway requests/sec before 429")
+    parser.add_argument("--sms-rate-limit", type=float, default=0.0, help="Client-side SMS/sec, 0 for unlimited")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.rounds)
+        return
+
+    results = {}
+    print(f"{'users':>8} {'duration s':>11} {'SMS sent':>9} {'msg/s':>8} {'p50 ms':>7} {'p99 ms':>7} {'RSS MB':>7}")
+    for users in args.users:
+        result = results[users] = run_size(users, args)
+        print(f"{users:>8} {result['duration']:>11.2f} {result['sms_sent']:>9} {result['messages_per_second']:>8.0f} "
+              f"{_ms(result['p50']):>7} {_ms(result['p99']):>7} {result['peak_rss_mb']:>7.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Micro-benchmarks for the storage, parsing and scheduling hot paths.
+
+Every benchmark runs on synthetic data generated from a fixed seed, so results
+are comparable between checkouts. Nothing touches the network. baseline.json
+holds the results of the current tree; save a new one when comparing on
+different hardware.
+
+Run from the repository root:
+    python -m benchmarks.micro_benchmarks                        # run and print
+    python -m benchmarks.micro_benchmarks --save-baseline        # store as the baseline
+    python -m benchmarks.micro_benchmarks --compare --threshold 0.25
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.20  # Allowed slowdown of the median before a benchmark counts as regressed
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MESSAGES_PER_PHONE = 10
+
+
+def make_users(count, seed=1):
+    """Generate `count` user records like register_user creates them."""
+    rng = random.Random(seed)
+    users = []
+    for index in range(count):
+        gender = rng.choice(["male", "female"])
+        age = rng.randint(5, 90)
+        weight = round(rng.uniform(20, 130), 1)
+        users.append({"id": index + 1, "username": f"user{index}", "phone_number": f"4915{index:08d}",
+                      "gender": gender, "age": age, "weight": weight,
+                      "daily_target": max(2.5 if gender == "male" else 2.0, weight * 0.03)})
+    return users
+
+
+def make_messages(phones, per_phone=MESSAGES_PER_PHONE, seed=2):
+    """Generate a getMessages response with `per_phone` unsorted messages for each of `phones` numbers."""
+    rng = random.Random(seed)
+    response = []
+    for index in range(phones):
+        messages = [{"text": rng.choice(["done", "skip", f"user{index} 30 70.5 male"]),
+                     "receivedAt": f"2026-10-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:"
+                                   f"{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}.000Z"}
+                    for _ in range(per_phone)]
+        response.append({f"4915{index:08d}": messages})
+    return response
+
+
+def timed(func, setup=None, repeat=DEFAULT_REPEAT):
+    """
+    Time `func(*setup())` `repeat` times; setup runs outside the timing.
+    Returns:
+        dict: min and median seconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return {"min": min(samples), "median": statistics.median(samples)}
+
+
+def bench_storage(size, repeat, work_dir):
+    from user_management import UserStore
+
+    path = os.path.join(work_dir, f"users_{size}.json")
+    with open(path, 'w') as user_file:
+        json.dump({"users": make_users(size)}, user_file, indent=4)
+
+    store = UserStore(path)
+    store.refresh()
+    return {
+        "load_user_data": timed(lambda: UserStore(path).refresh(), repeat=repeat),
+        "save_user_data": timed(store.save, repeat=repeat),
+        "lookup_by_username": timed(lambda: [store.get_by_username(f"user{i}") for i in range(0, size, 7)],
+                                    repeat=repeat),
+    }
+
+
+def bench_messages(size, repeat):
+    import main
+    from message_ingestion import MessageIndex
+
+    response = make_messages(size)
+    phones = [phone for group in response for phone in group]
+    sample = random.Random(3).sample(phones, min(len(phones), 1000))
+    return {
+        "get_all_numbers": timed(main.get_all_numbers, lambda: (response,), repeat=repeat),
+        "get_last_message_x1000": timed(lambda: [main.get_last_message(phone, response) for phone in sample],
+                                        repeat=repeat),
+        "message_index_build": timed(MessageIndex, lambda: (response,), repeat=repeat),
+        "message_index_latest_x1000": timed(lambda index: [main.get_last_message(phone, index) for phone in sample],
+                                            lambda: (MessageIndex(response),), repeat=repeat),
+    }
+
+
+def bench_parse(size, repeat):
+    import main
+
+    rng = random.Random(4)
+    replies = [(f"4915{i:08d}", f"user{i} {rng.randint(5, 90)} {rng.uniform(20, 130):.1f} "
+                                f"{rng.choice(['male', 'female'])}") for i in range(size)]
+    return {"parse_data": timed(lambda: [main.parse_data(phone, text) for phone, text in replies], repeat=repeat)}
+
+
+def bench_scheduling(size, repeat, work_dir):
+    import schedule_management
+    from schedule_management import ReminderScheduler, schedule_reminders
+    from user_management import UserStore, set_user_store
+
+    def schedule_and_tick():
+        clock = [0.0]
+        scheduler = ReminderScheduler(clock=lambda: clock[0])
+        scheduler.add_job("reminder", lambda users: None, every=60)
+        scheduler.add_users(range(1, size + 1), "reminder", first_due=0)
+        # Spread a tenth of the users over later slots, as with staggered registration
+        for user_id in range(1, size + 1, 10):
+            scheduler.add_user(user_id, ["reminder"], first_due=user_id % 60)
+        for tick in range(0, 120):
+            clock[0] = tick
+            scheduler.pop_due()
+
+    store = UserStore(os.path.join(work_dir, f"scheduled_users_{size}.json"))
+    store.replace({"users": make_users(size)})
+    set_user_store(store)
+
+    def fresh_scheduler():
+        schedule_management._scheduler = None  # schedule_reminders() builds the shared scheduler on first use
+        return ()
+
+    def schedule_all():
+        with contextlib.redirect_stdout(io.StringIO()):  # Drop the load report it prints
+            schedule_reminders()
+
+    return {"schedule_reminders_and_tick": timed(schedule_and_tick, repeat=repeat),
+            "schedule_reminders": timed(schedule_all, fresh_scheduler, repeat=repeat)}
+
+
+def run(sizes, repeat):
+    """
+    Run every benchmark for every size.
+    Returns:
+        dict: {"meta": {...}, "results": {"<benchmark>[<size>]": {"min": s, "median": s}}}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            for suite in (bench_storage(size, repeat, work_dir), bench_messages(size, repeat),
+                          bench_parse(size, repeat), bench_scheduling(size, repeat, work_dir)):
+                for name, timing in suite.items():
+                    results[f"{name}[{size}]"] = timing
+                    print(f"{name + f'[{size}]':<40} median {timing['median'] * 1000:10.2f} ms   "
+                          f"min {timing['min'] * 1000:10.2f} ms")
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "timestamp": time.time(), "repeat": repeat},
+            "results": results}
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare the medians with a baseline.
+    Returns:
+        list: Names of the benchmarks that got slower by more than the threshold.
+    """
+    regressions = []
+    for name, timing in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        change = timing["median"] / base["median"] - 1 if base["median"] else 0.0
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{name:<40} {base['median'] * 1000:10.2f} -> {timing['median'] * 1000:10.2f} ms "
+              f"({change:+.1%}) {marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AquaMind micro-benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="Compare with the baseline, exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    current = run(args.sizes, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(current, output_file, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(current, baseline_file, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        try:
+            with open(args.baseline, 'r') as baseline_file:
+                baseline = json.load(baseline_file)
+        except FileNotFoundError:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            sys.exit(2)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}.")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
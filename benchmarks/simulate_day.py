@@ -0,0 +1,332 @@
+"""
+Accelerated replay of one service day on a virtual clock.
+
+The real scheduler, outbox, reply poller, message ingestor, intake journal and
+rollups run against a synthetic user base in an empty working directory. The
+shared clock (clocks module) is replaced with a VirtualClock that jumps from
+one due event to the next, and the gateway is answered in-process through a
+requests transport adapter, so the SMS sends go through the full client stack
+(circuit breaker, concurrency limit, metrics) without a network. Simulated
+users reply to reminders with a configurable probability and delay; their
+replies are delivered to the ingestor once per poll interval, like the
+service's reply loop does.
+
+Sends take no simulated time, so the client-side token bucket is disabled and
+the gateway's throughput is modelled by the scheduler's slot capacity instead
+(--gateway-rate messages per simulated second).
+
+The report has one row per simulated hour: messages sent, average and peak send
+rate, replies handled, queue depths at the end of the hour (outbox pending and
+dead-lettered messages, replies not yet polled, reply waiters), the planned
+peak users per scheduler slot, and the store I/O (journal events, outbox rows
+written, bytes read and written by the process) plus the wall time the hour took.
+
+Run from the repository root:
+    python -m benchmarks.simulate_day --users 100000
+"""
+import argparse
+import contextlib
+import heapq
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from benchmarks.fake_gateway import _timestamp
+from benchmarks.micro_benchmarks import make_users
+
+SIM_TEAM_NAME = "WaterProof"
+SIM_HOUR_SECONDS = 3600
+
+
+class SimulatedGateway:
+    """
+    In-process SMS gateway on the virtual clock.
+    Counts the sends per simulated second and schedules the replies of the
+    simulated users: a reminder is answered with the given probability, with
+    'done' or 'skip', after an exponentially distributed delay.
+    """
+
+    def __init__(self, clock, reply_probability=0.7, done_probability=0.8, reply_delay=300.0, seed=7):
+        """
+        Args:
+            clock (VirtualClock): The simulation's clock.
+            reply_probability (float): Share of reminders that get a reply.
+            done_probability (float): Share of the replies that are 'done' rather than 'skip'.
+            reply_delay (float): Mean seconds between a reminder and its reply.
+            seed (int): Seed of the reply behaviour, so runs are repeatable.
+        """
+        self.clock = clock
+        self.reply_probability = reply_probability
+        self.done_probability = done_probability
+        self.reply_delay = reply_delay
+        self.random = random.Random(seed)
+        self.sent_per_second = Counter()
+        self._replies = []  # Heap of (received_at, seq, phone_number, text)
+        self._seq = 0
+
+    def handle(self, method, path, payload):
+        """
+        Answer one request.
+        Returns:
+            tuple: (HTTP status, JSON-serializable body)
+        """
+        if method != "POST" or path != "/sms/send":
+            return 404, {"error": f"Unknown endpoint {method} {path}"}
+        now = self.clock.time()
+        message = payload.get("message", "")
+        self.sent_per_second[int(now)] += 1
+        if "drink" in message and self.random.random() < self.reply_probability:
+            text = "done" if self.random.random() < self.done_probability else "skip"
+            self._seq += 1
+            received_at = now + self.random.expovariate(1.0 / self.reply_delay)
+            heapq.heappush(self._replies, (received_at, self._seq, payload.get("phoneNumber"), text))
+        return 200, {"status": "Success", "description": "SMS sent"}
+
+    def take_replies(self, until):
+        """
+        Remove the replies received up to `until`.
+        Returns:
+            list: New messages in the getMessages shape, one {phone_number: [messages]} group per number.
+        """
+        groups = {}
+        while self._replies and self._replies[0][0] <= until:
+            received_at, _, phone_number, text = heapq.heappop(self._replies)
+            groups.setdefault(phone_number, []).append({"text": text, "receivedAt": _timestamp(received_at)})
+        return [{phone_number: messages} for phone_number, messages in groups.items()]
+
+    def pending_replies(self):
+        """
+        Returns:
+            int: Replies scheduled but not received or not polled yet.
+        """
+        return len(self._replies)
+
+
+class SimulatedTransport(BaseAdapter):
+    """requests transport adapter that answers every request from a SimulatedGateway."""
+
+    def __init__(self, gateway):
+        super().__init__()
+        self.gateway = gateway
+
+    def send(self, request, **kwargs):
+        payload = json.loads(request.body) if request.body else {}
+        status, body = self.gateway.handle(request.method, urlsplit(request.url).path, payload)
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(0)
+        return response
+
+    def close(self):
+        pass
+
+
+def _process_io():
+    """
+    Returns:
+        dict: Bytes read and written by this process so far ({} where /proc is not available).
+    """
+    try:
+        with open("/proc/self/io") as io_file:
+            fields = dict(line.split(":") for line in io_file.read().splitlines())
+        return {"read": int(fields["rchar"]), "written": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def _counter_total(metrics, name):
+    """Sum a counter over all its label sets."""
+    return sum(value["value"] for value in metrics.registry.counter(name).snapshot())
+
+
+def simulate(users, day, hours, reminder_interval, gateway_rate, poll_interval, reply_probability, done_probability,
+             reply_delay, out):
+    """
+    Replay one day in the current working directory (simulation side).
+    The application modules are imported here, after the caller prepared the environment.
+    Returns:
+        list: One report row per simulated hour.
+    """
+    import clocks
+    import metrics
+    from intake_journal import get_intake_journal
+    from message_ingestion import get_message_ingestor
+    from outbox import get_outbox
+    from reply_poller import get_reply_poller
+    from schedule_management import create_scheduler, handle_user_response
+    from sms_service import TokenBucket, get_gateway_client, set_rate_limiter
+    from user_management import get_user_store
+    from fetch_data import get_quote_pool
+
+    start = datetime.combine(day, datetime.min.time()).timestamp()
+    clock = clocks.VirtualClock(start)
+    clocks.set_clock(clock)
+    metrics.set_enabled(True)
+
+    gateway = SimulatedGateway(clock, reply_probability, done_probability, reply_delay)
+    get_gateway_client().session.mount("http://", SimulatedTransport(gateway))
+    get_gateway_client().session.mount("https://", SimulatedTransport(gateway))
+    set_rate_limiter(TokenBucket(0, 1))  # Sends take no simulated time; the slot capacity limits them
+    get_quote_pool(background=False)  # No quote API here; reminders use the fallback text
+    outbox = get_outbox(background=False)  # Retries are drained by the loop below, on the virtual clock
+    poller = get_reply_poller(SIM_TEAM_NAME, poll_interval)
+    poller.driven_externally = True
+    ingestor = get_message_ingestor(SIM_TEAM_NAME)
+    journal = get_intake_journal()
+
+    store = get_user_store()
+    store.add_users(make_users(users))
+    user_ids = [user["id"] for user in store.users()]
+    scheduler = create_scheduler(reminder_interval, slot_capacity=int(gateway_rate) or None)
+    scheduler.add_users(user_ids, "reminder")
+    scheduler.add_users(user_ids, "statistics")
+
+    rows = []
+    end = start + hours * SIM_HOUR_SECONDS
+    next_poll = start + poll_interval
+    hour_start, replies = start, 0
+
+    def begin_hour():
+        return {"io": _process_io(), "wall": time.perf_counter(), "journal": journal.last_seq(),
+                "outbox": _counter_total(metrics, "outbox_enqueued_total"),
+                "users": _counter_total(metrics, "scheduler_users_total"),
+                "plan": scheduler.load_report(hour_start, hour_start + SIM_HOUR_SECONDS)}
+
+    def end_hour(base, replies):
+        io = _process_io()
+        seconds = range(int(hour_start), int(hour_start) + SIM_HOUR_SECONDS)
+        sent = sum(gateway.sent_per_second.get(second, 0) for second in seconds)
+        status = outbox.stats()
+        row = {
+            "hour": datetime.fromtimestamp(hour_start).strftime("%H:00"),
+            "sent": sent,
+            "rate_avg": round(sent / SIM_HOUR_SECONDS, 2),
+            "rate_peak": max((gateway.sent_per_second.get(second, 0) for second in seconds), default=0),
+            "users_handled": _counter_total(metrics, "scheduler_users_total") - base["users"],
+            "replies": replies,
+            "outbox_pending": status["pending"],
+            "outbox_dead": status["dead"],
+            "replies_unpolled": gateway.pending_replies(),
+            "reply_waiters": poller.pending(),
+            "slot_peak": base["plan"]["peak"],
+            "journal_events": journal.last_seq() - base["journal"],
+            "outbox_rows": _counter_total(metrics, "outbox_enqueued_total") - base["outbox"],
+            "mb_read": round((io.get("read", 0) - base["io"].get("read", 0)) / 1e6, 1),
+            "mb_written": round((io.get("written", 0) - base["io"].get("written", 0)) / 1e6, 1),
+            "wall_seconds": round(time.perf_counter() - base["wall"], 2),
+        }
+        print(_format_row(row), file=out, flush=True)
+        return row
+
+    print(_format_row(None), file=out, flush=True)
+    baseline = begin_hour()
+    while True:
+        next_run = scheduler.next_run()
+        moment = min(t for t in (next_run, next_poll, hour_start + SIM_HOUR_SECONDS) if t is not None)
+        clock.advance_to(min(moment, end))
+        if clock.time() >= hour_start + SIM_HOUR_SECONDS or clock.time() >= end:
+            rows.append(end_hour(baseline, replies))
+            hour_start, replies = hour_start + SIM_HOUR_SECONDS, 0
+            if hour_start >= end:
+                break
+            baseline = begin_hour()
+            continue
+
+        scheduler.run_pending()
+        if clock.time() >= next_poll:
+            next_poll += poll_interval
+            new_groups = ingestor.ingest(gateway.take_replies(clock.time()))
+            poller.dispatch(new_groups)
+            poller.expire()
+            for group in new_groups:
+                for phone_number, messages in group.items():
+                    user = store.get_by_phone(phone_number)
+                    for message in messages:
+                        handle_user_response(user["username"], message["text"])
+                        replies += 1
+            ingestor.commit(new_groups)
+            outbox.drain()  # The follow-up reminders enqueued for the replies, and retries that became due
+    clocks.set_clock(None)
+    return rows
+
+
+_COLUMNS = [("hour", 5), ("sent", 8), ("rate_avg", 8), ("rate_peak", 9), ("users_handled", 13), ("replies", 8),
+            ("outbox_pending", 14), ("outbox_dead", 11), ("replies_unpolled", 16), ("reply_waiters", 13),
+            ("slot_peak", 9), ("journal_events", 14), ("outbox_rows", 11), ("mb_read", 8), ("mb_written", 10),
+            ("wall_seconds", 12)]
+
+
+def _format_row(row):
+    """Format a report row, or the header for None."""
+    if row is None:
+        return " ".join(f"{name:>{width}}" for name, width in _COLUMNS)
+    return " ".join(f"{row[name]:>{width}}" for name, width in _COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay one service day for many users on a virtual clock.")
+    parser.add_argument("--users", type=int, default=100000, help="Number of synthetic users.")
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(),
+                        help="Simulated day (YYYY-MM-DD), replayed from midnight.")
+    parser.add_argument("--hours", type=int, default=24, help="Simulated hours to replay.")
+    parser.add_argument("--reminder-interval", type=float, default=60,
+                        help="Minutes between two reminders of a user (the service uses "
+                             "schedule_management.NOTIFICATION_INTERVAL_MINUTES).")
+    parser.add_argument("--gateway-rate", type=float, default=50,
+                        help="Messages the gateway accepts per simulated second; caps the users per scheduler slot.")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="Simulated seconds between reply polls. Defaults to reply_poller.REPLY_POLL_INTERVAL.")
+    parser.add_argument("--reply-probability", type=float, default=0.7, help="Share of reminders answered.")
+    parser.add_argument("--done-probability", type=float, default=0.8, help="Share of answers that are 'done'.")
+    parser.add_argument("--reply-delay", type=float, default=300, help="Mean seconds until a reminder is answered.")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="sqlite", help="User storage backend.")
+    parser.add_argument("--output", help="Also write the hourly rows to this JSON file.")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so the environment is prepared before the application is imported
+    os.environ["AQUAMIND_USER_STORAGE"] = args.backend
+    os.environ["AQUAMIND_AUDIT_VERBOSITY"] = "0"
+    os.environ["AQUAMIND_SMS_CONCURRENCY"] = "1"  # In-process sends are instant; threads would only add overhead
+    output = os.path.abspath(args.output) if args.output else None
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    out = sys.stdout
+    wall_start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="aquamind-sim-") as work_dir:
+        os.chdir(work_dir)
+        from reply_poller import REPLY_POLL_INTERVAL
+        poll_interval = args.poll_interval or REPLY_POLL_INTERVAL
+        print(f"Simulating {args.hours}h of {args.date} for {args.users} users (reminders every {args.reminder_interval:g} min, "
+              f"gateway {args.gateway_rate:g} msg/s, replies polled every {poll_interval:g}s)...", file=out)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # Silence per-message output
+            rows = simulate(args.users, args.date, args.hours, args.reminder_interval * 60, args.gateway_rate, poll_interval,
+                            args.reply_probability, args.done_probability, args.reply_delay, out)
+
+    totals = {name: sum(row[name] for row in rows)
+              for name in ("sent", "replies", "journal_events", "outbox_rows", "mb_read", "mb_written")}
+    print(f"Replayed in {time.perf_counter() - wall_start:.1f}s: {totals['sent']} messages sent, "
+          f"{totals['replies']} replies, {totals['journal_events']} journal events, "
+          f"{totals['outbox_rows']} outbox rows, {totals['mb_read']:.1f} MB read, "
+          f"{totals['mb_written']:.1f} MB written.", file=out)
+    if output:
+        with open(output, "w") as output_file:
+            json.dump({"users": args.users, "date": args.date.isoformat(), "hours": args.hours, "rows": rows}, output_file, indent=2)
+        print(f"Wrote {output}", file=out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+class SystemClock:
+    """
+    The real wall clock. Used unless a simulation installs another clock with set_clock().
+    """
+
+    def time(self):
+        """
+        Returns:
+            float: Seconds since the epoch.
+        """
+        return time.time()
+
+    def monotonic(self):
+        """
+        Returns:
+            float: Seconds of a clock that never goes backwards, for deadlines.
+        """
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """Block for `seconds`."""
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    Clock whose time only moves when told to.
+    sleep() and advance() move the time forward instantly, so a simulation can
+    replay a whole day in the time it takes to run the work that happens in it.
+    The monotonic time is the virtual time as well, so deadlines follow the
+    simulated day.
+    """
+
+    def __init__(self, start=None):
+        """
+        Args:
+            start (float): Initial time in seconds since the epoch. Defaults to now.
+        """
+        self._now = time.time() if start is None else float(start)
+        self._lock = threading.Lock()
+
+    def time(self):
+        """
+        Returns:
+            float: The virtual time in seconds since the epoch.
+        """
+        return self._now
+
+    def monotonic(self):
+        """
+        Returns:
+            float: The virtual time, which never goes backwards either.
+        """
+        return self._now
+
+    def sleep(self, seconds):
+        """Move the time forward by `seconds` without blocking."""
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        """Move the time forward by `seconds`. Negative values are ignored."""
+        with self._lock:
+            self._now += max(0.0, seconds)
+
+    def advance_to(self, moment):
+        """Move the time forward to `moment`, if it lies in the future."""
+        with self._lock:
+            self._now = max(self._now, float(moment))
+
+
+_clock = SystemClock()
+
+
+def get_clock():
+    """
+    Returns:
+        SystemClock or VirtualClock: The clock the scheduling code currently runs on.
+    """
+    return _clock
+
+
+def set_clock(clock):
+    """
+    Replace the shared clock, e.g. with a VirtualClock for a simulation.
+    Code that reads the time through now(), monotonic() and sleep() follows the new clock immediately.
+    Args:
+        clock: An object with time(), monotonic() and sleep(seconds). None restores the system clock.
+    """
+    global _clock
+    _clock = clock or SystemClock()
+
+
+def now():
+    """
+    Returns:
+        float: The current time of the shared clock, in seconds since the epoch.
+    """
+    return _clock.time()
+
+
+def monotonic():
+    """
+    Returns:
+        float: The current monotonic time of the shared clock.
+    """
+    return _clock.monotonic()
+
+
+def sleep(seconds):
+    """Sleep on the shared clock: blocks on the system clock, returns at once on a virtual one."""
+    _clock.sleep(seconds)
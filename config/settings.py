@@ -1 +1,44 @@
 """Global configuration variables, such as debug settings or API URLs."""
+
+import os
+
+# User storage backend used by user_management: "json" or "sqlite"
+USER_STORAGE_BACKEND = os.getenv("AQUAMIND_USER_STORAGE", "json")
+
+# SMS gateway HTTP client (sms_service.GatewayClient)
+GATEWAY_BASE_URL = os.getenv("AQUAMIND_GATEWAY_URL", "http://hackathons.masterschool.com:3030")
+GATEWAY_POOL_SIZE = int(os.getenv("AQUAMIND_GATEWAY_POOL_SIZE", "20"))  # Kept-alive connections per host
+GATEWAY_CONNECT_TIMEOUT = float(os.getenv("AQUAMIND_GATEWAY_CONNECT_TIMEOUT", "3.05"))  # Seconds
+GATEWAY_READ_TIMEOUT = float(os.getenv("AQUAMIND_GATEWAY_READ_TIMEOUT", "10"))  # Seconds
+GATEWAY_MAX_RETRIES = int(os.getenv("AQUAMIND_GATEWAY_MAX_RETRIES", "3"))  # Idempotent calls: on 5xx and connection errors; others only if no connection was made
+GATEWAY_BACKOFF_FACTOR = 0.5  # Seconds; delay doubles on every retry
+GATEWAY_BACKOFF_MAX = 8.0  # Seconds; upper bound for a single retry delay
+GATEWAY_BREAKER_WINDOW = 20  # Recent calls per endpoint the circuit breaker judges
+GATEWAY_BREAKER_MIN_CALLS = 10  # Calls in the window before the breaker may open
+GATEWAY_BREAKER_FAILURE_RATE = 0.5  # Share of failed or slow calls that opens the breaker
+GATEWAY_BREAKER_SLOW_CALL = float(os.getenv("AQUAMIND_GATEWAY_SLOW_CALL", "5"))  # Seconds; slower calls count as failed
+GATEWAY_BREAKER_OPEN_SECONDS = float(os.getenv("AQUAMIND_GATEWAY_BREAKER_OPEN", "30"))  # Before probing again
+GATEWAY_BREAKER_PROBES = 1  # Concurrent trial calls while half-open
+GATEWAY_CONCURRENCY_MIN = 1  # Lower bound of the adaptive concurrency limit
+GATEWAY_LATENCY_TARGET = float(os.getenv("AQUAMIND_GATEWAY_LATENCY_TARGET", "1.0"))  # Seconds; slower calls shrink the limit
+
+# Bulk SMS dispatch (sms_service.send_sms_bulk)
+SMS_BULK_CONCURRENCY = int(os.getenv("AQUAMIND_SMS_CONCURRENCY", "10"))  # Parallel gateway requests
+SMS_RATE_LIMIT = float(os.getenv("AQUAMIND_SMS_RATE_LIMIT", "10"))  # Messages per second, 0 for unlimited
+SMS_RATE_BURST = int(os.getenv("AQUAMIND_SMS_RATE_BURST", "10"))  # Messages that may be sent back to back
+
+# Audit log of gateway calls (audit_log.AuditLog)
+AUDIT_LOG_VERBOSITY = int(os.getenv("AQUAMIND_AUDIT_VERBOSITY", "1"))  # 0 off, 1 summaries, 2 with response bodies
+AUDIT_LOG_MAX_BYTES = int(os.getenv("AQUAMIND_AUDIT_MAX_BYTES", str(10 * 1024 * 1024)))  # Rotate above this size
+AUDIT_LOG_ROTATE_SECONDS = int(os.getenv("AQUAMIND_AUDIT_ROTATE_SECONDS", "86400"))  # Rotate at least this often
+AUDIT_LOG_BACKUP_COUNT = 5  # Rotated files to keep
+AUDIT_LOG_SAMPLE_RATES = {"get_messages": 1.0}  # Share of records kept per event; unlisted events keep all
+
+# Metrics (metrics module)
+METRICS_ENABLED = os.getenv("AQUAMIND_METRICS", "0") == "1"
+METRICS_HTTP_PORT = int(os.getenv("AQUAMIND_METRICS_PORT", "0"))  # Serve Prometheus text on this port, 0 to disable
+METRICS_SNAPSHOT_PATH = os.getenv("AQUAMIND_METRICS_SNAPSHOT", "metrics_snapshot.json")
+METRICS_SNAPSHOT_INTERVAL = int(os.getenv("AQUAMIND_METRICS_SNAPSHOT_INTERVAL", "60"))  # Seconds, 0 to disable
+
+# Sharded worker mode
+SHARD_WORKERS = int(os.getenv("AQUAMIND_SHARD_WORKERS", str(os.cpu_count() or 1)))  # Worker processes
@@ -1,20 +1,242 @@
-import requests
 import os
-from dotenv import load_dotenv
+import json
+import metrics
 import random
+import threading
+from collections import deque
 
-# Load environment variables
-load_dotenv()
-API_KEY = os.getenv('API_KEY')
+API_KEY = None  # Read from the environment (or a .env file) by init_env()
+_env_loaded = False
 
 # Define categories for quotes
-categories = ['inspirational', 'love', 'life', 'friendship', 'success', 'health', 'fitness'
+categories = ['inspirational', 'love', 'life', 'friendship', 'success', 'health', 'fitness',
               'happiness']
 
+# Quote pool settings
+QUOTE_CACHE_FILE_PATH = "quote_cache.json"
+QUOTE_MAX_LENGTH = 120  # Longer quotes are never kept
+QUOTE_POOL_TARGET = 20  # Unserved quotes to keep per category
+QUOTE_POOL_LOW_WATER = 5  # Refill once a category drops below this
+QUOTE_REFILL_INTERVAL = 300  # Seconds between background refills when nothing triggers one
+QUOTE_RETRY_DELAY = 30  # Seconds to wait after a refill that added nothing, e.g. during an API outage
+QUOTE_SERVED_HISTORY = 500  # Served quotes kept as a fallback while the API is unavailable
+
+
+def init_env():
+    """
+    Load a .env file into the environment and read the quote API key.
+    Entry points call this at startup; fetch_quote() calls it on first use otherwise.
+    Returns:
+        str or None: The API key.
+    """
+    global API_KEY, _env_loaded
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    API_KEY = os.getenv('API_KEY')
+    _env_loaded = True
+    return API_KEY
+
+
+def fetch_quote(category):
+    """
+    Fetch a single quote of the given category from the API.
+    Args:
+        category (str): The quote category.
+    Returns:
+        str or None: The quote text, or None if the API returned no quote.
+    Raises:
+        requests.exceptions.RequestException: If the request fails.
+    """
+    import requests
+
+    api_url = f"https://api.api-ninjas.com/v1/quotes?category={category}"
+    with metrics.timer("quote_fetch"):
+        response = requests.get(api_url, headers={'X-Api-Key': API_KEY if _env_loaded else init_env()}, timeout=10)
+        response.encoding = "utf-8"
+
+        response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
+
+        quotes = response.json()
+    return quotes[0]['quote'] if quotes else None
+
+
+class QuotePool:
+    """
+    Pool of quotes per category, filled ahead of time by a background thread.
+    Quotes are filtered by length and deduplicated against the pool and the
+    served history when they are fetched, so taking one never waits for the API. Served quotes are remembered and reused
+    when the pool runs dry, e.g. while the API is down. The pool is saved to disk
+    and reloaded on restart.
+    """
+
+    def __init__(self, cache_path=QUOTE_CACHE_FILE_PATH, quote_categories=None, max_length=QUOTE_MAX_LENGTH,
+                 target=QUOTE_POOL_TARGET, low_water=QUOTE_POOL_LOW_WATER):
+        self.cache_path = cache_path
+        self.categories = list(quote_categories or categories)
+        self.max_length = max_length
+        self.target = target
+        self.low_water = low_water
+        self._fresh = {category: deque() for category in self.categories}
+        self._served = deque(maxlen=QUOTE_SERVED_HISTORY)
+        self._seen = set()
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """Load the pool saved by a previous run, if there is one."""
+        try:
+            with open(self.cache_path, 'r') as cache_file:
+                cached = json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        with self._lock:
+            for category, quotes in cached.get("fresh", {}).items():
+                if category in self._fresh:
+                    for quote in quotes:
+                        self._add(category, quote)
+            for quote in cached.get("served", []):
+                self._served.append(quote)
+                self._seen.add(quote)
+
+    def save(self):
+        """Write the pool to disk, replacing the previous file atomically."""
+        with self._lock:
+            cached = {"fresh": {category: list(quotes) for category, quotes in self._fresh.items()},
+                      "served": list(self._served)}
+        temp_path = f"{self.cache_path}.tmp"
+        try:
+            with open(temp_path, 'w') as cache_file:
+                json.dump(cached, cache_file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Could not save quote cache: {e}")
+
+    def _add(self, category, quote):
+        """Add a quote unless it is too long or already known. Must hold the lock."""
+        if not quote or len(quote) > self.max_length or quote in self._seen:
+            return False
+        self._seen.add(quote)
+        self._fresh[category].append(quote)
+        return True
+
+    def needs_refill(self):
+        """Whether a category dropped below the low-water mark."""
+        return any(len(quotes) < self.low_water for quotes in self._fresh.values())
+
+    def refill(self):
+        """
+        Fetch quotes for every category below its target.
+        Stops early when the API fails, so an outage costs one request per refill.
+        Returns:
+            int: The number of new quotes added.
+        """
+        import requests
+
+        with self._lock:
+            # Only quotes still in the pool or the served history are duplicates, so _seen stays bounded
+            self._seen = set(self._served).union(*self._fresh.values())
+        added = 0
+        for category in self.categories:
+            with self._lock:
+                missing = self.target - len(self._fresh[category])
+            # Allow a few misses for duplicates and quotes that are too long
+            for _ in range(max(0, missing) * 3):
+                with self._lock:
+                    if len(self._fresh[category]) >= self.target:
+                        break
+                try:
+                    quote = fetch_quote(category)
+                except requests.exceptions.RequestException as err:
+                    print(f"Quote refill stopped: {err}")
+                    self.save()
+                    return added
+                with self._lock:
+                    added += self._add(category, quote)
+        self.save()
+        return added
+
+    def get(self, max_length=QUOTE_MAX_LENGTH):
+        """
+        Take a quote no longer than max_length without calling the API.
+        Args:
+            max_length (int): Maximum allowed length for the quote.
+        Returns:
+            str or None: A quote, or None if no cached quote fits.
+        """
+        with self._lock:
+            candidates = [c for c in self.categories if any(len(q) <= max_length for q in self._fresh[c])]
+            if candidates:
+                quotes = self._fresh[random.choice(candidates)]
+                quote = next(q for q in quotes if len(q) <= max_length)
+                quotes.remove(quote)
+                self._served.append(quote)
+                metrics.inc("quote_pool_requests_total", outcome="fresh")
+            else:
+                served = [q for q in self._served if len(q) <= max_length]
+                quote = random.choice(served) if served else None
+                metrics.inc("quote_pool_requests_total", outcome="reused" if quote else "empty")
+
+            if self.needs_refill():
+                self._refill_needed.set()
+        return quote
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self.needs_refill() and not self.refill():
+                self._stopped.wait(QUOTE_RETRY_DELAY)  # Don't hammer an API that is down
+            self._refill_needed.wait(QUOTE_REFILL_INTERVAL)
+            self._refill_needed.clear()
+
+    def start(self, background=True):
+        """
+        Load the saved pool and start warming it in a background thread.
+        Args:
+            background (bool): Start the refill thread. Without it the caller refills, e.g. from an event loop.
+        """
+        if self._thread is None:
+            self.load()
+            if not background:
+                return
+            self._thread = threading.Thread(target=self._run, name="quote-pool", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and save the pool."""
+        self._stopped.set()
+        self._refill_needed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.save()
+
+
+_quote_pool = None
+_quote_pool_lock = threading.Lock()
+
+
+def get_quote_pool(background=True):
+    """
+    Args:
+        background (bool): Whether the first call starts the refill thread, see QuotePool.start().
+    Returns:
+        QuotePool: The shared pool, loaded and warming in the background after the first call.
+    """
+    global _quote_pool
+    with _quote_pool_lock:
+        if _quote_pool is None:
+            _quote_pool = QuotePool()
+            _quote_pool.start(background)
+        return _quote_pool
+
 
 def get_random_quote(max_length=120):
     """
-    Fetch a random quote from the API, ensuring it doesn't exceed the maximum length.
+    Take a random quote from the prefetched pool, ensuring it doesn't exceed the maximum length.
+    Never waits for the API: the pool is refilled in the background.
     Args:
         max_length (int): Maximum allowed length for the quote.
     Returns:
@@ -24,28 +246,7 @@ def get_random_quote(max_length=120):
     if not isinstance(max_length, int) or max_length <= 0:
         return "Invalid max_length provided. It must be a positive integer."
 
-    while True:
-        category = random.choice(categories)
-        api_url = f"https://api.api-ninjas.com/v1/quotes?category={category}"
-
-        try:
-            response = requests.get(api_url, headers={'X-Api-Key': API_KEY})
-            response.encoding = "utf-8"
-
-            response.raise_for_status()  # Raise HTTPError for bad responses (4xx or 5xx)
-
-            quotes = response.json()
-            if quotes:
-                quote_text = quotes[0]['quote']
-                if len(quote_text) <= max_length:
-                    return quote_text
-
-        except requests.exceptions.HTTPError as http_err:
-            return {"error": f"HTTP error occurred: {http_err}"}
-        except requests.exceptions.ConnectionError:
-            return {"error": "Unable to connect to the API. Please check your internet connection."}
-        except requests.exceptions.Timeout:
-            return {"error": "The request timed out. Please try again later."}
-        except requests.exceptions.RequestException as err:
-            return {"error": f"An error occurred: {err}"}
-
+    quote_text = get_quote_pool().get(max_length)
+    if quote_text is None:
+        return {"error": "No cached quote available yet. Please try again later."}
+    return quote_text
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import clocks
+from intake_rollups import get_intake_rollups
+
+# Constants for the journal file and compaction
+INTAKE_JOURNAL_FILE_PATH = "intake_journal.jsonl"
+JOURNAL_COMPACT_EVERY = 1000  # Events appended before the applied ones are dropped from the file
+JOURNAL_FSYNC = False  # Also fsync every event, to survive power loss and not just a process crash
+
+
+class IntakeJournal:
+    """
+    Append-only journal of intake events ('done'/'skip' replies), the record the
+    intake rollups are projected from.
+    Recording a reply appends one small JSON line and then applies the event to
+    the rollups. Every event carries a sequence number and the rollups store the
+    last one they applied in the same transaction, so after a crash between the
+    two writes recover() replays exactly the events the rollups are missing.
+    Compaction drops the events the rollups already hold (the snapshot) and
+    starts an empty journal.
+    """
+
+    def __init__(self, path=INTAKE_JOURNAL_FILE_PATH, compact_every=JOURNAL_COMPACT_EVERY, rollups=None):
+        """
+        Args:
+            path (str): Path to the journal file.
+            compact_every (int): Number of events after which the journal is compacted.
+            rollups (IntakeRollups): The projection to keep up to date. Defaults to the shared rollups.
+        """
+        self.path = path
+        self.compact_every = compact_every
+        self.rollups = rollups or get_intake_rollups()
+        self._pending = []  # Events appended since the last compaction
+        self._seq = 0
+        self._file = None
+        self._lock = threading.RLock()
+
+    def recover(self):
+        """
+        Load the pending events from the journal file, e.g. after a restart or crash,
+        and apply those the rollups are missing. A partially written last line is discarded.
+        """
+        with self._lock:
+            self._pending = []
+            valid_size = 0
+            if os.path.exists(self.path):
+                with open(self.path, 'rb') as journal_file:
+                    for line in journal_file:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            break  # Torn write at the end of the journal
+                        if not line.endswith(b"\n"):
+                            break
+                        valid_size += len(line)
+                        if "base_seq" in entry:
+                            self._seq = max(self._seq, entry["base_seq"])
+                            continue
+                        self._seq = max(self._seq, entry["seq"])
+                        self._pending.append(entry)
+                if valid_size != os.path.getsize(self.path):
+                    with open(self.path, 'r+b') as journal_file:
+                        journal_file.truncate(valid_size)
+
+            # A lost journal must not restart the numbering below events the rollups already hold
+            self._seq = max(self._seq, self.rollups.applied_seq())
+            self._file = open(self.path, 'a')
+            if valid_size == 0:
+                self._write({"base_seq": self._seq})
+            self._catch_up()
+
+    def _catch_up(self):
+        """
+        Apply the pending events the rollups have not applied yet, in journal order. Must hold the lock.
+        Returns:
+            int: The number of events applied.
+        """
+        applied_seq = self.rollups.applied_seq()
+        missing = [event for event in self._pending if event["seq"] > applied_seq]
+        for event in missing:
+            self.rollups.apply(event)
+        return len(missing)
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._file.flush()
+        if JOURNAL_FSYNC:
+            os.fsync(self._file.fileno())
+
+    def record(self, user, amount, reminder_index, timestamp=None):
+        """
+        Append an intake event for a user and apply it to the rollups.
+        Args:
+            user (dict): The user's record.
+            amount (float): Liters drunk; 0 for a skipped reminder.
+            reminder_index (int): Which of the day's reminders the reply answers.
+            timestamp (float): When the reply was received. Defaults to now.
+        Returns:
+            dict: The user's totals for the day after the event, see IntakeRollups.day_totals().
+        """
+        with self._lock:
+            if self._file is None:
+                self.recover()
+            self._seq += 1
+            # The daily target goes into the event, so replaying it judges the goal like the original write
+            event = {"seq": self._seq, "user_id": user["id"], "ts": timestamp or clocks.now(),
+                     "amount": amount, "reminder_index": reminder_index,
+                     "daily_target": user.get("daily_target", 0)}
+            self._write(event)
+            self._pending.append(event)
+            totals = self.rollups.apply(event)
+            if len(self._pending) >= self.compact_every:
+                self.compact()
+        return totals
+
+    def last_seq(self):
+        """
+        Returns:
+            int: The sequence number of the latest event.
+        """
+        with self._lock:
+            if self._file is None:
+                self.recover()
+            return self._seq
+
+    def compact(self):
+        """
+        Make sure the rollups hold every pending event, then start an empty journal.
+        Returns:
+            int: The number of events dropped from the journal.
+        """
+        with self._lock:
+            if self._file is None:
+                self.recover()
+            if not self._pending:
+                return 0
+
+            self._catch_up()  # An event whose apply failed must not be dropped unapplied
+
+            # Start a fresh journal; the rollups are the snapshot of everything before base_seq
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as journal_file:
+                journal_file.write(json.dumps({"base_seq": self._seq}, separators=(",", ":")) + "\n")
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'a')
+            dropped, self._pending = len(self._pending), []
+            return dropped
+
+    def close(self):
+        """Compact the journal and close the file."""
+        with self._lock:
+            if self._file is not None:
+                self.compact()
+                self._file.close()
+                self._file = None
+
+
+_intake_journal = None
+_intake_journal_lock = threading.Lock()
+
+
+def get_intake_journal():
+    """
+    Returns:
+        IntakeJournal: The shared journal, recovered from disk on first use.
+    """
+    global _intake_journal
+    with _intake_journal_lock:
+        if _intake_journal is None:
+            _intake_journal = IntakeJournal()
+            _intake_journal.recover()
+        return _intake_journal
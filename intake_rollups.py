@@ -0,0 +1,295 @@
+import sqlite3
+import threading
+import clocks
+from datetime import date, timedelta
+
+# Constants for the rollup database
+INTAKE_ROLLUPS_DB_PATH = "intake_rollups.db"
+ROLLUP_DAILY_RETENTION_DAYS = 90  # Older per-day rows are pruned at rollover
+GOAL_REACHED_PERCENTAGE = 95  # Share of the daily target that counts as reaching it, as in the daily statistics
+ROLLUP_MAX_PARAMETERS = 900  # Batches up to this size are looked up by id; larger ones read the whole day
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily (
+    user_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    intake REAL NOT NULL DEFAULT 0,
+    reminders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_day ON daily (day);
+CREATE TABLE IF NOT EXISTS weekly (
+    user_id INTEGER NOT NULL,
+    week TEXT NOT NULL,
+    intake REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, week)
+);
+CREATE TABLE IF NOT EXISTS monthly (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    intake REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month)
+);
+CREATE TABLE IF NOT EXISTS streaks (
+    user_id INTEGER PRIMARY KEY,
+    current INTEGER NOT NULL DEFAULT 0,
+    best INTEGER NOT NULL DEFAULT 0,
+    last_goal_day TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+UPSERT_DAILY = ("INSERT INTO daily (user_id, day, intake, reminders) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (user_id, day) DO UPDATE SET intake = intake + excluded.intake, reminders = reminders + 1")
+UPSERT_WEEKLY = ("INSERT INTO weekly (user_id, week, intake) VALUES (?, ?, ?) "
+                 "ON CONFLICT (user_id, week) DO UPDATE SET intake = intake + excluded.intake")
+UPSERT_MONTHLY = ("INSERT INTO monthly (user_id, month, intake) VALUES (?, ?, ?) "
+                  "ON CONFLICT (user_id, month) DO UPDATE SET intake = intake + excluded.intake")
+SELECT_DAILY = "SELECT intake, reminders FROM daily WHERE user_id = ? AND day = ?"
+SELECT_DAILY_MANY = "SELECT user_id, intake, reminders FROM daily WHERE day = ?"
+SELECT_WEEKLY = "SELECT intake FROM weekly WHERE user_id = ? AND week = ?"
+SELECT_MONTHLY = "SELECT intake FROM monthly WHERE user_id = ? AND month = ?"
+SELECT_STREAK = "SELECT current, best, last_goal_day FROM streaks WHERE user_id = ?"
+UPSERT_STREAK = "INSERT OR REPLACE INTO streaks (user_id, current, best, last_goal_day) VALUES (?, ?, ?, ?)"
+SELECT_APPLIED_SEQ = "SELECT value FROM meta WHERE key = 'applied_seq'"
+SET_APPLIED_SEQ = "INSERT OR REPLACE INTO meta (key, value) VALUES ('applied_seq', ?)"
+
+# Columns besides user_id of every table, for moving a user's rows to another database
+ROLLUP_TABLES = {
+    "daily": ("day", "intake", "reminders"),
+    "weekly": ("week", "intake"),
+    "monthly": ("month", "intake"),
+    "streaks": ("current", "best", "last_goal_day"),
+}
+EXPORT_USER = {table: f"SELECT {', '.join(columns)} FROM {table} WHERE user_id = ?"
+               for table, columns in ROLLUP_TABLES.items()}
+IMPORT_USER = {table: f"INSERT OR REPLACE INTO {table} (user_id, {', '.join(columns)}) "
+                      f"VALUES (?, {', '.join('?' * len(columns))})"
+               for table, columns in ROLLUP_TABLES.items()}
+DELETE_USER = {table: f"DELETE FROM {table} WHERE user_id = ?" for table in ROLLUP_TABLES}
+
+
+def _week_key(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _month_key(day):
+    return f"{day.year}-{day.month:02d}"
+
+
+class IntakeRollups:
+    """
+    Per-user intake totals bucketed by day, ISO week and month.
+    The rollups are a projection of the intake journal: its events are applied
+    in order, so the daily, weekly, monthly and streak statistics are single
+    primary-key reads. The seq of the last applied event is stored in the same
+    transaction as the buckets it changed, which lets the journal replay exactly
+    the events a crash kept from being applied. Rows are keyed by their period,
+    which makes the daily rollover free: a new day simply starts with no row, so
+    reminders_sent and today's intake read as 0 without touching any user's data.
+    """
+
+    def __init__(self, db_path=INTAKE_ROLLUPS_DB_PATH, clock=clocks.now):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file.
+            clock (callable): Returns the current time in seconds since the epoch. Defaults to the shared clock.
+        """
+        self.db_path = db_path
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._current_day = None
+
+    def today(self):
+        """
+        Returns:
+            date: The current day, rolling the rollups over when it changed.
+        """
+        day = date.fromtimestamp(self.clock())
+        if day != self._current_day:
+            self.rollover(day)
+        return day
+
+    def rollover(self, day=None):
+        """
+        Start a new day. Today's counters need no reset since they live in the
+        new day's rows; only per-day rows past the retention period are pruned.
+        Args:
+            day (date): The new day. Defaults to today.
+        """
+        day = day or date.fromtimestamp(self.clock())
+        cutoff = (day - timedelta(days=ROLLUP_DAILY_RETENTION_DAYS)).isoformat()
+        with self._lock:
+            self._conn.execute("DELETE FROM daily WHERE day < ?", (cutoff,))
+            self._current_day = day
+
+    def applied_seq(self):
+        """
+        Returns:
+            int: The seq of the last intake journal event applied, 0 if none was.
+        """
+        with self._lock:
+            row = self._conn.execute(SELECT_APPLIED_SEQ).fetchone()
+        return row[0] if row else 0
+
+    def apply(self, event):
+        """
+        Add an intake journal event to the user's daily, weekly and monthly buckets and update their streak.
+        An event whose seq is not newer than the last applied one was counted before and is skipped.
+        Args:
+            event (dict): The event, see IntakeJournal.record().
+        Returns:
+            dict: The user's totals for the event's day, see day_totals().
+        """
+        self.today()  # Prunes the per-day rows past retention once the day changed
+        day = date.fromtimestamp(event["ts"])
+        user_id, amount = event["user_id"], event["amount"]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if event["seq"] > self.applied_seq():
+                    before = self.day_totals(user_id, day)["intake"]
+                    self._conn.execute(UPSERT_DAILY, (user_id, day.isoformat(), amount))
+                    self._conn.execute(UPSERT_WEEKLY, (user_id, _week_key(day), amount))
+                    self._conn.execute(UPSERT_MONTHLY, (user_id, _month_key(day), amount))
+
+                    goal = event.get("daily_target", 0) * GOAL_REACHED_PERCENTAGE / 100
+                    if goal > 0 and before < goal <= before + amount:
+                        self._goal_reached(user_id, day)
+                    self._conn.execute(SET_APPLIED_SEQ, (event["seq"],))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self.day_totals(user_id, day)
+
+    def _goal_reached(self, user_id, day):
+        """Extend or restart the user's streak of days on which the goal was reached."""
+        row = self._conn.execute(SELECT_STREAK, (user_id,)).fetchone()
+        current, best, last_goal_day = row if row else (0, 0, None)
+        if last_goal_day == day.isoformat():
+            return
+        current = current + 1 if last_goal_day == (day - timedelta(days=1)).isoformat() else 1
+        self._conn.execute(UPSERT_STREAK, (user_id, current, max(best, current), day.isoformat()))
+
+    def day_totals(self, user_id, day=None):
+        """
+        Returns:
+            dict: {"intake": liters, "reminders": answered reminders} for the day (default today).
+        """
+        day = day or self.today()
+        with self._lock:
+            row = self._conn.execute(SELECT_DAILY, (user_id, day.isoformat())).fetchone()
+        return {"intake": row[0], "reminders": row[1]} if row else {"intake": 0.0, "reminders": 0}
+
+    def day_totals_many(self, user_ids, day=None):
+        """
+        Read the totals of many users for one day with a single query.
+        Returns:
+            dict: user id -> {"intake": liters, "reminders": answered reminders}; users without
+                a row for the day get zeros.
+        """
+        day = day or self.today()
+        user_ids = list(user_ids)
+        with self._lock:
+            if len(user_ids) < ROLLUP_MAX_PARAMETERS:
+                # A scheduler slot's batch: look its users up instead of reading the whole day
+                sql = f"{SELECT_DAILY_MANY} AND user_id IN ({', '.join('?' * len(user_ids))})"
+                rows = self._conn.execute(sql, [day.isoformat(), *user_ids]).fetchall()
+            else:
+                rows = self._conn.execute(SELECT_DAILY_MANY, (day.isoformat(),)).fetchall()
+        found = {user_id: {"intake": intake, "reminders": reminders} for user_id, intake, reminders in rows}
+        return {user_id: found.get(user_id, {"intake": 0.0, "reminders": 0}) for user_id in user_ids}
+
+    def week_total(self, user_id, day=None):
+        """Return the liters drunk in the ISO week containing the day (default today)."""
+        day = day or self.today()
+        with self._lock:
+            row = self._conn.execute(SELECT_WEEKLY, (user_id, _week_key(day))).fetchone()
+        return row[0] if row else 0.0
+
+    def month_total(self, user_id, day=None):
+        """Return the liters drunk in the month containing the day (default today)."""
+        day = day or self.today()
+        with self._lock:
+            row = self._conn.execute(SELECT_MONTHLY, (user_id, _month_key(day))).fetchone()
+        return row[0] if row else 0.0
+
+    def streak(self, user_id, day=None):
+        """
+        Returns:
+            dict: {"current": days, "best": days}. The current streak counts while the
+                goal was reached today or yesterday.
+        """
+        day = day or self.today()
+        with self._lock:
+            row = self._conn.execute(SELECT_STREAK, (user_id,)).fetchone()
+        if not row:
+            return {"current": 0, "best": 0}
+        current, best, last_goal_day = row
+        if last_goal_day not in (day.isoformat(), (day - timedelta(days=1)).isoformat()):
+            current = 0
+        return {"current": current, "best": best}
+
+    def export_user(self, user_id):
+        """
+        Read all of a user's rows, e.g. to move the user to another shard.
+        Returns:
+            dict: table name -> list of rows without the user id.
+        """
+        with self._lock:
+            return {table: [list(row) for row in self._conn.execute(sql, (user_id,))]
+                    for table, sql in EXPORT_USER.items()}
+
+    def import_user(self, user_id, rows):
+        """Store rows returned by export_user() under a (possibly new) user id."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for table, table_rows in rows.items():
+                    self._conn.executemany(IMPORT_USER[table], [(user_id, *row) for row in table_rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def forget_user(self, user_id):
+        """Delete all of a user's rows."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql in DELETE_USER.values():
+                    self._conn.execute(sql, (user_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_intake_rollups = None
+_intake_rollups_lock = threading.Lock()
+
+
+def get_intake_rollups():
+    """
+    Returns:
+        IntakeRollups: The shared rollup store, opened on first use.
+    """
+    global _intake_rollups
+    with _intake_rollups_lock:
+        if _intake_rollups is None:
+            _intake_rollups = IntakeRollups()
+        return _intake_rollups
@@ -1,35 +1,64 @@
-import time
+import clocks
+from datetime import date
 
-import IPython
-
-from user_management import register_user
+from user_management import DATA_REQUEST_MESSAGE, parse_user_details, register_users
 from schedule_management import schedule_reminders, send_reminder, handle_user_response, schedule_daily_statistics_reminders, send_daily_statistics
-import schedule
-from sms_service import send_sms, get_messages
+from sms_service import send_sms, send_sms_bulk
+from message_ingestion import MessageIndex, get_message_ingestor
+from reply_poller import get_reply_poller
+from metrics import init_metrics
+from fetch_data import init_env
+from outbox import get_outbox
 TEAM_NAME = "WaterProof"
+NO_REPLY_ERROR = "No reply received."
+REMINDER_REPEAT = 3
+REMINDER_INTERVAL_SECONDS = 60
+# Numbers whose messages are not registration replies (the team's own test phone)
+EXCLUDED_NUMBERS = {"491736536574"}
 
-def get_all_numbers(messages_response):
-    phone_numbers = set()
-    for phone_messages in messages_response:
-        if phone_messages != "491736536574":
+def get_all_numbers(messages):
+    """
+    Returns:
+        list: The distinct numbers that sent messages, without EXCLUDED_NUMBERS.
+            `messages` is a MessageIndex or a getMessages response.
+    """
+    if isinstance(messages, MessageIndex):
+        phone_numbers = messages.senders()
+    else:
+        phone_numbers = set()
+        for phone_messages in messages:
             phone_numbers.update(phone_messages.keys())
-    return list(phone_numbers)
+    return list(phone_numbers - EXCLUDED_NUMBERS)
 
 def subscribe_reminders(numbers, message="Don't forget to drink water!", repeat=3, interval=60):
-    for _ in range(repeat):
-        for number in numbers:
-            #send_sms(number, message)
-            print(f"sent remainder to {number}")
-        time.sleep(interval)
-
-def get_last_message(phone_number, messages_response):
-    for phone_messages in messages_response:
-        if phone_number in phone_messages:
-            messages = phone_messages[phone_number]
-            messages.sort(key=lambda msg: msg['receivedAt'], reverse=True)
-            return messages[0]['text']
-    print("got No messages")
-    return None
+    """
+    Send `repeat` rounds of reminders through the outbox. Every round of a day is
+    keyed per number, so a rerun of the pipeline does not send it again.
+    """
+    day = date.fromtimestamp(clocks.now()).isoformat()
+    for round_number in range(repeat):
+        report = get_outbox().send_now((f"subscribe:{number}:{day}:{round_number}", number, message)
+                                       for number in numbers)
+        print(f"sent reminder to {report['stats']['sent']}/{report['stats']['total']} numbers")
+        clocks.sleep(interval)
+
+def get_last_message(phone_number, messages):
+    """
+    Returns the text of the number's most recent message, or None.
+    `messages` is a MessageIndex (constant-time lookup) or a getMessages response.
+    """
+    if isinstance(messages, MessageIndex):
+        latest = messages.latest(phone_number)
+    else:
+        latest = None
+        for phone_messages in messages:
+            if phone_messages.get(phone_number):
+                latest = max(phone_messages[phone_number], key=lambda msg: msg['receivedAt'])
+                break
+    if latest is None:
+        print("got No messages")
+        return None
+    return latest['text']
 
 def send_sms_real(phone_number, message):
     """
@@ -43,49 +72,19 @@ def send_sms_real(phone_number, message):
 
 def fetch_user_response(phone_number, team_name, timeout=60, poll_interval=10):
     """
-    Polls for user responses within a timeout period.
+    Waits for a user response within a timeout period.
+    The wait is registered with the team's shared reply poller, which fetches the
+    messages once per interval for all waiting numbers.
     """
-    elapsed_time = 0
-    while elapsed_time < timeout:
-        messages_response = get_messages(team_name)  # Fetch messages for the team
-
-        # Print the response to understand its structure
-        print("Received messages_response:", messages_response)
-
-        if isinstance(messages_response, list):  # Check if it's a list
-            for message_group in messages_response:
-                # Each group is a dictionary where the key is the phone number
-                for phone, messages in message_group.items():
-                    if phone == phone_number:
-                        return messages[-1]
-                        # for message in messages:
-                        #     return message.get("text", "").strip().lower()
-        else:
-            print("Error: Expected a list of messages, but got:", type(messages_response))
-
-        time.sleep(poll_interval)
-        elapsed_time += poll_interval
-    return "skip"  # Default response if no reply is received within the timeout
+    poller = get_reply_poller(team_name, poll_interval)
+    # "skip" is the default response if no reply is received within the timeout
+    return poller.wait_for_reply(phone_number, timeout).result()
 
 def parse_data(phone_number, message):
     """
     Processes the registration message from the user and adds them to the system.
     """
-    user_details = message.split()
-    if len(user_details) != 4:
-        raise ValueError("Incorrect input format.")
-
-    username, age, weight, gender = user_details
-    if not age.isdigit() or not weight.replace('.', '', 1).isdigit():
-        raise ValueError("Age must be an integer and weight a float.")
-
-    age = int(age)
-    weight = float(weight)
-    gender = gender.lower()
-    if gender not in ['male', 'female']:
-        raise ValueError("Gender must be 'male' or 'female'.")
-
-    return username, age, weight, gender
+    return parse_user_details(message)
     #     # Register the user
     #     result_message = register_user(username, phone_number, gender, age, weight)
     #     send_sms_real(phone_number, result_message)
@@ -108,11 +107,74 @@ def handle_incoming_message(phone_number, message):
     process_registration(phone_number, message)  # Register the user
 
 def send_get_data_sms(phone_number):
-    message = (
-        "Please send your username, age, weight, gender (e.g., john_doe 30 70 male)"
-    )
+    message = DATA_REQUEST_MESSAGE
     sender = ""
-    send_sms(phone_number, message, sender)
+    # Asked at most once a day, even if the pipeline is rerun
+    get_outbox().enqueue(f"get_data:{phone_number}:{date.fromtimestamp(clocks.now()).isoformat()}", phone_number, message, sender)
+
+def collect_replies(numbers, messages):
+    """
+    Pipeline stage 1: ask every number for its details and collect its latest reply.
+    Returns:
+        list: (phone_number, message) pairs; message is None if the number sent nothing.
+    """
+    replies = []
+    for number in numbers:
+        send_get_data_sms(number)  # Function that gets a phone number, and sends an SMS that asks for details.
+        replies.append((number, get_last_message(number, messages)))
+    return replies
+
+
+def parse_replies(replies):
+    """
+    Pipeline stage 2: parse the collected replies into registration records.
+    A reply that cannot be parsed is reported as an error instead of stopping the batch.
+    Returns:
+        tuple: (records, errors) where errors maps phone numbers to error messages.
+    """
+    records = []
+    errors = {}
+    for number, message in replies:
+        if message is None:
+            errors[number] = NO_REPLY_ERROR
+            continue
+        try:
+            username, age, weight, gender = parse_data(number, message)
+        except ValueError as e:
+            errors[number] = f"Invalid input: {e} Please try again."
+            continue
+        records.append({"username": username, "phone_number": number,
+                        "gender": gender, "age": age, "weight": weight})
+    return records, errors
+
+
+def notify_registration_results(results, errors):
+    """
+    Pipeline stage 4: tell every user who replied the outcome of their registration.
+    """
+    messages = [(result["phone_number"], result["message"]) for result in results]
+    messages += [(number, error) for number, error in errors.items() if error != NO_REPLY_ERROR]
+
+    report = send_sms_bulk(messages)
+    for result in report["results"]:
+        if result["success"]:
+            print(f"SMS sent to {result['phone_number']}: {result['message']}")
+        else:
+            print(f"Failed to send SMS to {result['phone_number']}: {result['response'].get('description')}")
+
+
+def report_registration_results(results, errors):
+    """
+    Print a per-record summary of the registration batch.
+    """
+    registered = [r for r in results if r["success"]]
+    print(f"Registered {len(registered)} users, {len(results) - len(registered) + len(errors)} failed.")
+    for result in results:
+        if not result["success"]:
+            print(f"  {result['phone_number']}: {result['message']}")
+    for number, error in errors.items():
+        print(f"  {number}: {error}")
+
 
 def main():
     """
@@ -131,6 +193,8 @@ def main():
     Handles SMS-based user interaction.
     """
     print("Starting AquaMind SMS Service...")
+    init_env()
+    init_metrics()
 
 
     # phone_number = input("Enter phone number: ").strip()
@@ -139,22 +203,28 @@ def main():
     # # Register the phone number with the team
     # subscribe_message = f"SUBSCRIBE {team_name}"
     # send_sms_real(phone_number, subscribe_message)  # Send subscription message
-    messages_dict = get_messages(TEAM_NAME)
+    # Only messages that were not processed by a previous run
+    ingestor = get_message_ingestor(TEAM_NAME)
+    new_groups = ingestor.poll()
+    messages = MessageIndex(new_groups)
     print("step 0 - get_messages ")
-    numbers = get_all_numbers(messages_dict)
+    numbers = get_all_numbers(messages)
     print("step 1 - get_all_numbers ")
 
-    for number in numbers:
-        send_get_data_sms(number) # Functino that get's a phone number, and sends an SMS that asks for details.
-        print("step 2 - send_get_data_sms ")
-        data = get_last_message(number, messages_dict)
-        print("step 3 - get_last_message ")
-        username, age, weight, gender = parse_data(number, data)
-        print("step 4 - parse_data ")
-        result_message = register_user(username, number, gender, age, weight)
-        print("step 5 - register_user ")
-
-    subscribe_reminders(numbers)
+    replies = collect_replies(numbers, messages)
+    get_outbox().flush()  # Deliver the detail requests before moving on
+    print("step 2 - collect_replies ")
+    records, errors = parse_replies(replies)
+    print("step 3 - parse_replies ")
+    results = register_users(records)
+    print("step 4 - register_users ")
+    notify_registration_results(results, errors)
+    print("step 5 - notify_registration_results ")
+    report_registration_results(results, errors)
+    ingestor.commit(new_groups)  # Only now are the replies processed; a crash before this re-reads them
+
+    registered_numbers = [result["phone_number"] for result in results if result["success"]]
+    subscribe_reminders(registered_numbers, repeat=REMINDER_REPEAT, interval=REMINDER_INTERVAL_SECONDS)
     print("step 6 - subscribe_reminders ")
 
     # # Wait for the user's response via SMS
@@ -0,0 +1,287 @@
+import bisect
+import json
+import os
+import threading
+from sms_service import get_messages
+
+# Where the per-phone receivedAt cursors are persisted
+MESSAGE_CURSOR_FILE_PATH = "message_cursor.json"
+MESSAGE_CURSOR_COMPACT_MIN = 1000  # Logged cursor updates before the log may be folded into the file
+
+
+def _message_key(message):
+    """Identify a message among those received at the same timestamp."""
+    return f"{message.get('receivedAt')}|{message.get('text')}"
+
+
+class MessageIndex:
+    """
+    Inbound messages grouped by phone number and ordered by receivedAt.
+    Built once per fetch instead of scanning and sorting the whole response for
+    every lookup: the latest message of a phone is the last entry of its list,
+    and "messages since T" is a binary search. New messages can be added at any
+    time; those arriving in order are appended without re-sorting.
+    """
+
+    def __init__(self, messages_response=None):
+        """
+        Args:
+            messages_response (list): Optional getMessages response to index, a list of {phone_number: [messages]} groups.
+        """
+        self._times = {}  # phone_number -> sorted receivedAt values
+        self._messages = {}  # phone_number -> messages in the same order
+        if messages_response:
+            self.update(messages_response)
+
+    def add(self, phone_number, messages):
+        """Add messages received from a phone number."""
+        times = self._times.setdefault(phone_number, [])
+        ordered = self._messages.setdefault(phone_number, [])
+        for message in messages:
+            received_at = message.get("receivedAt") or ""
+            if not times or received_at >= times[-1]:
+                times.append(received_at)
+                ordered.append(message)
+            else:
+                position = bisect.bisect_right(times, received_at)
+                times.insert(position, received_at)
+                ordered.insert(position, message)
+
+    def update(self, messages_response):
+        """Add every message of a getMessages response (or of MessageIngestor.ingest())."""
+        for message_group in messages_response:
+            for phone_number, messages in message_group.items():
+                self.add(phone_number, messages)
+
+    def senders(self):
+        """
+        Returns:
+            set: The distinct phone numbers that sent messages.
+        """
+        return set(self._messages)
+
+    def latest(self, phone_number):
+        """
+        Returns:
+            dict: The most recent message of the phone number, or None.
+        """
+        messages = self._messages.get(phone_number)
+        return messages[-1] if messages else None
+
+    def since(self, received_at, phone_number=None):
+        """
+        Messages received strictly after a timestamp.
+        Args:
+            received_at (str): ISO timestamp in the gateway's receivedAt format.
+            phone_number (str): Only this number's messages. Defaults to all numbers.
+        Returns:
+            list: The phone's messages oldest first, or for all numbers a dict
+                mapping each phone with newer messages to its list.
+        """
+        if phone_number is not None:
+            times = self._times.get(phone_number, [])
+            return self._messages.get(phone_number, [])[bisect.bisect_right(times, received_at):]
+        newer = {}
+        for number, times in self._times.items():
+            position = bisect.bisect_right(times, received_at)
+            if position < len(times):
+                newer[number] = self._messages[number][position:]
+        return newer
+
+    def __contains__(self, phone_number):
+        return phone_number in self._messages
+
+    def __len__(self):
+        return len(self._messages)
+
+
+class MessageIngestor:
+    """
+    Passes on only the messages that were not handled before.
+    For every phone number it remembers the latest receivedAt handled (plus the
+    messages received at exactly that time), persists these cursors and filters
+    each gateway response against them, so downstream work depends on new
+    traffic instead of the whole history.
+
+    ingest() and poll() do not move the cursors. The caller hands the messages it
+    handled to commit() afterwards; if it crashes in between, the next poll
+    returns the same messages again. Every reply is therefore handled at least
+    once, and exactly once as long as nothing fails mid-way.
+
+    The cursors are kept in a snapshot file plus an append-only log of the
+    cursors each ingest changed, so persisting a poll costs O(new messages)
+    rather than rewriting every phone's cursor. The log is folded into the
+    snapshot once it holds as many updates as there are cursors.
+    """
+
+    def __init__(self, team_name, cursor_path=MESSAGE_CURSOR_FILE_PATH):
+        """
+        Args:
+            team_name (str): The team whose messages are ingested.
+            cursor_path (str): Path to the JSON file holding the cursors; the log is kept next to it.
+        """
+        self.team_name = team_name
+        self.cursor_path = cursor_path
+        self.log_path = f"{cursor_path}.log"
+        self._cursors = {}  # phone_number -> {"receivedAt": ..., "keys": [...]}
+        self._logged = 0  # Cursor updates in the log since the last snapshot
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the cursors saved by a previous run, if there are any, and replay the log over them."""
+        try:
+            with open(self.cursor_path, 'r') as cursor_file:
+                self._cursors = json.load(cursor_file)
+        except (OSError, json.JSONDecodeError):
+            self._cursors = {}
+        self._logged = 0
+        if not os.path.exists(self.log_path):
+            return
+        valid_size = 0
+        with open(self.log_path, 'rb') as log_file:
+            for line in log_file:
+                try:
+                    updates = json.loads(line)
+                except ValueError:
+                    break  # Torn write at the end of the log
+                if not line.endswith(b"\n"):
+                    break
+                valid_size += len(line)
+                for phone_number, cursor in updates.items():
+                    self._merge(phone_number, cursor)
+                self._logged += len(updates)
+        if valid_size != os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as log_file:
+                log_file.truncate(valid_size)  # So later appends start on a line of their own
+
+    def _merge(self, phone_number, cursor):
+        """
+        Apply a cursor unless the known one is newer. Neither a log left over from
+        before the last snapshot (e.g. after a crash while compacting) nor a late
+        commit() of older messages can therefore move a cursor back.
+        """
+        known = self._cursors.get(phone_number)
+        if known is None or cursor["receivedAt"] > known["receivedAt"]:
+            self._cursors[phone_number] = cursor
+        elif cursor["receivedAt"] == known["receivedAt"]:
+            known["keys"] = list(dict.fromkeys(known["keys"] + cursor["keys"]))
+
+    def save(self):
+        """Write all cursors to disk, replacing the previous file atomically, and empty the log."""
+        temp_path = f"{self.cursor_path}.tmp"
+        try:
+            with open(temp_path, 'w') as cursor_file:
+                cursor_file.write(json.dumps(self._cursors))  # The C encoder; json.dump() encodes in Python
+            os.replace(temp_path, self.cursor_path)
+            open(self.log_path, 'w').close()
+            self._logged = 0
+        except OSError as e:
+            print(f"Could not save message cursors: {e}")
+
+    def _log(self, phone_numbers):
+        """Append the cursors of the given numbers to the log, compacting it once it grew large."""
+        updates = {phone_number: self._cursors[phone_number] for phone_number in phone_numbers}
+        try:
+            with open(self.log_path, 'a') as log_file:
+                log_file.write(json.dumps(updates, separators=(",", ":")) + "\n")
+        except OSError as e:
+            print(f"Could not save message cursors: {e}")
+            return
+        self._logged += len(updates)
+        if self._logged >= max(MESSAGE_CURSOR_COMPACT_MIN, len(self._cursors)):
+            self.save()
+
+    def cursor(self, phone_number):
+        """
+        Returns:
+            The receivedAt of the last message processed for the phone number, or None.
+        """
+        cursor = self._cursors.get(phone_number)
+        return cursor["receivedAt"] if cursor else None
+
+    def _new_messages(self, phone_number, messages):
+        """Return the phone's messages newer than its cursor, oldest first; a missing receivedAt sorts first."""
+        cursor = self._cursors.get(phone_number)
+        if cursor:
+            last_seen, seen_keys = cursor["receivedAt"], set(cursor["keys"])
+            new = [m for m in messages
+                   if (m.get("receivedAt") or "") > last_seen
+                   or ((m.get("receivedAt") or "") == last_seen and _message_key(m) not in seen_keys)]
+        else:
+            new = list(messages)
+        new.sort(key=lambda msg: msg.get("receivedAt") or "")
+        return new
+
+    def ingest(self, messages_response, phone_numbers=None):
+        """
+        Filter a getMessages response down to the messages not handled before.
+        The cursors stay where they are until the messages are passed to commit().
+        Args:
+            messages_response (list): The gateway response, a list of {phone_number: [messages]} groups.
+            phone_numbers (iterable): Only ingest these numbers; the others stay unread. Defaults to all.
+        Returns:
+            list: The new messages in the same shape as the response, each phone's
+                messages ordered oldest first. Phones without new messages are left out.
+        """
+        wanted = set(phone_numbers) if phone_numbers is not None else None
+        new_groups = []
+        with self._lock:
+            for message_group in messages_response:
+                for phone_number, messages in message_group.items():
+                    if wanted is not None and phone_number not in wanted:
+                        continue
+                    new = self._new_messages(phone_number, messages)
+                    if new:
+                        new_groups.append({phone_number: new})
+        return new_groups
+
+    def commit(self, message_groups):
+        """
+        Mark messages as handled: move their phones' cursors past them and persist the cursors.
+        Args:
+            message_groups (list): Messages returned by ingest() or poll() that were
+                handled, in the same shape. Phones left out stay pending.
+        """
+        committed = []
+        with self._lock:
+            for message_group in message_groups:
+                for phone_number, messages in message_group.items():
+                    if not messages:
+                        continue
+                    latest = max(message.get("receivedAt") or "" for message in messages)
+                    keys = [_message_key(m) for m in messages if (m.get("receivedAt") or "") == latest]
+                    self._merge(phone_number, {"receivedAt": latest, "keys": keys})
+                    committed.append(phone_number)
+            if committed:
+                self._log(committed)
+
+    def poll(self, phone_numbers=None):
+        """
+        Fetch the team's messages and return only the new ones.
+        Pass them to commit() once they are handled.
+        Args:
+            phone_numbers (iterable): Only ingest these numbers. Defaults to all.
+        Returns:
+            list: The new messages, see ingest(). Empty if the gateway returned an error.
+        """
+        messages_response = get_messages(self.team_name)
+        if not isinstance(messages_response, list):
+            print("Error: Expected a list of messages, but got:", messages_response)
+            return []
+        return self.ingest(messages_response, phone_numbers)
+
+
+_ingestors = {}
+_ingestors_lock = threading.Lock()
+
+
+def get_message_ingestor(team_name):
+    """
+    Returns:
+        MessageIngestor: The shared ingestor of the team, so all callers advance the same cursors.
+    """
+    with _ingestors_lock:
+        if team_name not in _ingestors:
+            _ingestors[team_name] = MessageIngestor(team_name)
+        return _ingestors[team_name]
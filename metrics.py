@@ -0,0 +1,312 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import settings
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, per label set."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._values = {}  # label key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += value
+
+    def _cumulative(self, values):
+        counts, total = [], 0
+        for count in values[:-1]:
+            total += count
+            counts.append(total)
+        return counts
+
+    def render(self):
+        lines = []
+        with self._lock:
+            items = [(key, list(values)) for key, values in self._values.items()]
+        for key, values in items:
+            counts = self._cumulative(values)
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            items = [(key, list(values)) for key, values in self._values.items()]
+        return [{"labels": dict(key), "count": self._cumulative(values)[-1], "sum": values[-1],
+                 "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self._cumulative(values)))}
+                for key, values in items]
+
+    def quantile(self, q, **labels):
+        """
+        Estimate a quantile from the buckets, interpolating linearly within the bucket.
+        Returns:
+            float or None: The estimate, or None if nothing was observed.
+        """
+        with self._lock:
+            values = self._values.get(_label_key(labels))
+            values = list(values) if values else None
+        if not values:
+            return None
+        counts = self._cumulative(values)
+        rank = q * counts[-1]
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in zip(self.buckets, counts):
+            if count >= rank:
+                if count == lower_count:
+                    return bound
+                return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+            lower_bound, lower_count = bound, count
+        return self.buckets[-1]  # Beyond the last bucket
+
+
+class MetricsRegistry:
+    """Holds all metrics by name and renders them for export."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        metric = self._metrics.get(name)  # Lock-free fast path for existing metrics
+        if metric is not None:
+            return metric
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render_prometheus(self):
+        """
+        Returns:
+            str: All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: All metrics as JSON-serializable data.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {"ts": time.time(), "metrics": {m.name: {"type": m.kind, "values": m.snapshot()} for m in metrics}}
+
+
+registry = MetricsRegistry()
+_enabled = settings.METRICS_ENABLED
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    """Turn metrics collection on or off at runtime."""
+    global _enabled
+    _enabled = bool(value)
+
+
+def inc(name, amount=1, **labels):
+    """Increment a counter, doing nothing while metrics are disabled."""
+    if _enabled:
+        registry.counter(name).inc(amount, **labels)
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge, doing nothing while metrics are disabled."""
+    if _enabled:
+        registry.gauge(name).set(value, **labels)
+
+
+def observe(name, value, **labels):
+    """Record a value in a histogram, doing nothing while metrics are disabled."""
+    if _enabled:
+        registry.histogram(name).observe(value, **labels)
+
+
+class _Timer:
+    __slots__ = ("histogram", "counter", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.histogram = registry.histogram(f"{name}_seconds")
+        self.counter = registry.counter(f"{name}_total")
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.labels
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.labels.setdefault("outcome", "error" if exc_type else "ok")
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        self.counter.inc(**self.labels)
+        return False
+
+
+def timer(name, **labels):
+    """
+    Time a block into the '<name>_seconds' histogram and count it in '<name>_total'.
+    The block can set labels["outcome"]; it defaults to "ok", or "error" if the block raises.
+    While metrics are disabled this returns a no-op context; it still yields a
+    labels dict of its own, since concurrent blocks write to it.
+
+    Example:
+        with metrics.timer("gateway_request", endpoint="send_sms") as labels:
+            labels["outcome"] = "ok" if send() else "failed"
+    """
+    if not _enabled:
+        return nullcontext(labels)
+    return _Timer(name, labels)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """
+    Serve the metrics in Prometheus text format on http://host:port/metrics.
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_snapshot(path):
+    """Write a JSON snapshot of all metrics, replacing the previous file atomically."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as snapshot_file:
+        json.dump(registry.snapshot(), snapshot_file)
+    os.replace(temp_path, path)
+
+
+def start_snapshot_writer(path, interval, stop_event=None):
+    """
+    Write a JSON snapshot every `interval` seconds in a background thread.
+    Returns:
+        threading.Event: Set it to stop the writer.
+    """
+    stop_event = stop_event or threading.Event()
+
+    def run():
+        while not stop_event.wait(interval):
+            try:
+                write_snapshot(path)
+            except OSError as e:
+                print(f"Could not write metrics snapshot: {e}")
+
+    threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
+    return stop_event
+
+
+def init_metrics():
+    """
+    Start the exporters configured in config.settings, if metrics are enabled.
+    """
+    if not _enabled:
+        return
+    if settings.METRICS_HTTP_PORT:
+        start_http_server(settings.METRICS_HTTP_PORT)
+        print(f"Metrics available at http://127.0.0.1:{settings.METRICS_HTTP_PORT}/metrics")
+    if settings.METRICS_SNAPSHOT_INTERVAL:
+        start_snapshot_writer(settings.METRICS_SNAPSHOT_PATH, settings.METRICS_SNAPSHOT_INTERVAL)
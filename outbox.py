@@ -0,0 +1,375 @@
+import asyncio
+import sqlite3
+import threading
+import clocks
+import metrics
+from sms_service import send_sms_bulk, send_sms_bulk_async, bulk_report
+
+# Constants for the outbox database and delivery
+OUTBOX_DB_PATH = "outbox.db"
+OUTBOX_BATCH_SIZE = 500  # Messages claimed and sent per batch
+OUTBOX_MAX_ATTEMPTS = 5  # Sends of a message before it is dead-lettered
+OUTBOX_RETRY_DELAY = 30  # Seconds before the first retry, doubled on every further one
+OUTBOX_RETRY_DELAY_MAX = 3600  # Upper bound for a single retry delay
+OUTBOX_POLL_INTERVAL = 5  # Longest a drainer sleeps when nothing wakes it
+OUTBOX_RETENTION_DAYS = 7  # Sent and dead messages are kept this long for inspection
+
+# Message states
+PENDING = "pending"  # Waiting to be sent, possibly for a retry
+SENDING = "sending"  # Claimed by a drainer
+SENT = "sent"
+DEAD = "dead"  # Given up on; see last_error
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    phone_number TEXT NOT NULL,
+    message TEXT NOT NULL,
+    sender TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at);
+"""
+
+INSERT_MESSAGE = ("INSERT OR IGNORE INTO outbox (idempotency_key, phone_number, message, sender, status, "
+                  "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)")
+SELECT_NEW_BY_KEY = ("SELECT id, idempotency_key, phone_number, message, sender, attempts FROM outbox "
+                     "WHERE idempotency_key = ? AND status = 'pending' AND attempts = 0")
+SELECT_DUE = ("SELECT id, idempotency_key, phone_number, message, sender, attempts FROM outbox "
+              "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?")
+CLAIM_MESSAGE = "UPDATE outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?"
+MARK_SENT = "UPDATE outbox SET status = 'sent', updated_at = ?, last_error = NULL WHERE id = ?"
+MARK_RETRY = ("UPDATE outbox SET status = 'pending', next_attempt_at = ?, updated_at = ?, last_error = ? "
+              "WHERE id = ?")
+MARK_DEAD = "UPDATE outbox SET status = 'dead', updated_at = ?, last_error = ? WHERE id = ?"
+RECOVER_SENDING = ("UPDATE outbox SET status = 'dead', updated_at = ?, "
+                   "last_error = 'Interrupted while sending; not resent to avoid a duplicate' "
+                   "WHERE status = 'sending'")
+SELECT_NEXT_DUE = "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+COUNT_BY_STATUS = "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+REQUEUE_DEAD = ("UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, updated_at = ? "
+                "WHERE status = 'dead'")
+PRUNE_FINISHED = "DELETE FROM outbox WHERE status IN ('sent', 'dead') AND updated_at < ?"
+
+
+class Outbox:
+    """
+    Durable queue in front of sms_service.send_sms.
+    Producers enqueue a message under an idempotency key (e.g. phone, day and
+    reminder slot); a key that is already queued or sent is ignored, so a repeated
+    round or a restart never queues a message twice. Drainers claim due messages
+    in batches inside a transaction, send them through the bulk SMS path and
+    record the outcome: sent, retried later with exponential backoff, or
+    dead-lettered after too many attempts or a permanent error.
+
+    A message is only resent when the send provably failed before reaching the
+    gateway (see sms_service.send_sms()). A message is claimed before it is sent,
+    so no two drainers send the same row. A message whose outcome is unknown,
+    after a read timeout, a 5xx or a crash of the process while sending, is
+    dead-lettered instead of resent, since the gateway may already have
+    delivered it; use requeue_dead() to send such messages again on purpose.
+    """
+
+    def __init__(self, db_path=OUTBOX_DB_PATH, clock=clocks.now, batch_size=OUTBOX_BATCH_SIZE,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file.
+            clock (callable): Returns the current time in seconds since the epoch. Defaults to the shared clock.
+            batch_size (int): Messages claimed per batch.
+            max_attempts (int): Sends of a message before it is dead-lettered.
+        """
+        self.db_path = db_path
+        self.clock = clock
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def _transaction(self, statements):
+        """Run (sql, params) statements in one transaction. Must hold the lock."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                self._conn.execute(sql, params)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def recover(self):
+        """
+        Dead-letter the messages a previous process was sending when it stopped.
+        Returns:
+            int: The number of messages dead-lettered.
+        """
+        with self._lock:
+            cursor = self._conn.execute(RECOVER_SENDING, (self.clock(),))
+        if cursor.rowcount:
+            print(f"Outbox: {cursor.rowcount} message(s) were in flight during a crash; see requeue_dead().")
+        return cursor.rowcount
+
+    def enqueue(self, key, phone_number, message, sender=""):
+        """
+        Queue a message unless its key was queued before.
+        Returns:
+            bool: True if the message was queued, False for a duplicate key.
+        """
+        return self.enqueue_many([(key, phone_number, message, sender)]) == 1
+
+    def enqueue_many(self, items):
+        """
+        Queue many messages in one transaction.
+        Args:
+            items (iterable): (key, phone_number, message) or (key, phone_number, message, sender) tuples.
+        Returns:
+            int: The number of messages queued; duplicates of known keys are skipped.
+        """
+        queued, _ = self._insert(items, claim=False)
+        self._wakeup.set()
+        return queued
+
+    def _insert(self, items, claim):
+        """Insert messages in one transaction, optionally claiming the new ones in the same transaction."""
+        now = self.clock()
+        rows = [(item[0], item[1], item[2], item[3] if len(item) > 3 else "", now, now, now) for item in items]
+        if not rows:
+            return 0, []
+        claimed = []
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(INSERT_MESSAGE, rows)
+                queued = self._conn.total_changes - before
+                if claim:
+                    for row in rows:
+                        claimed.extend(self._conn.execute(SELECT_NEW_BY_KEY, (row[0],)).fetchall())
+                    self._conn.executemany(CLAIM_MESSAGE, [(now, row[0]) for row in claimed])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        metrics.inc("outbox_enqueued_total", queued)
+        metrics.inc("outbox_duplicates_total", len(rows) - queued)
+        return queued, claimed
+
+    def send_now(self, items):
+        """
+        Queue messages and send the new ones right away, e.g. for a scheduled round.
+        The messages are claimed in the enqueueing transaction, so the background
+        drainers never pick them up, while failed sends still get retried by them.
+        Args:
+            items (iterable): See enqueue_many().
+        Returns:
+            dict: The bulk send report of the new messages; duplicate keys are neither queued nor sent.
+        """
+        _, rows = self._insert(items, claim=True)
+        report = send_sms_bulk(self._messages(rows))
+        self._settle(rows, report["results"])
+        return report
+
+    async def send_now_async(self, items):
+        """asyncio version of send_now(); the database work runs in worker threads."""
+        _, rows = await asyncio.to_thread(self._insert, items, True)
+        report = await send_sms_bulk_async(self._messages(rows))
+        await asyncio.to_thread(self._settle, rows, report["results"])
+        return report
+
+    def _claim(self, limit=None):
+        """Mark up to `limit` due messages as being sent and return them."""
+        now = self.clock()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(SELECT_DUE, (now, limit or self.batch_size)).fetchall()
+                self._conn.executemany(CLAIM_MESSAGE, [(now, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _retry_delay(self, attempts):
+        return min(OUTBOX_RETRY_DELAY_MAX, OUTBOX_RETRY_DELAY * (2 ** (attempts - 1)))
+
+    def _settle(self, rows, results):
+        """Record the outcome of sending claimed rows; `results` are the bulk results in row order."""
+        now = self.clock()
+        statements = []
+        for row, result in zip(rows, results):
+            message_id, attempts = row[0], row[5] + 1
+            response = result["response"]
+            if result["success"]:
+                statements.append((MARK_SENT, (now, message_id)))
+                outcome = SENT
+            elif response.get("not_sent") and attempts < self.max_attempts:
+                statements.append((MARK_RETRY, (now + self._retry_delay(attempts), now,
+                                                str(response)[:500], message_id)))
+                outcome = "retry"
+            elif response.get("not_sent") or response.get("status") == "Error":
+                # Out of attempts, or rejected before reaching the gateway (e.g. invalid number)
+                statements.append((MARK_DEAD, (now, str(response)[:500], message_id)))
+                outcome = DEAD
+            else:
+                # The gateway may have delivered it; resending could send it twice
+                statements.append((MARK_DEAD, (now, f"Outcome unknown; not resent to avoid a duplicate: "
+                                                    f"{response}"[:500], message_id)))
+                outcome = "unknown"
+            metrics.inc("outbox_sends_total", outcome=outcome)
+        with self._lock:
+            self._transaction(statements)
+
+    @staticmethod
+    def _messages(rows):
+        return [(row[2], row[3], row[4]) for row in rows]
+
+    def drain_once(self, limit=None):
+        """
+        Claim one batch of due messages and send it.
+        Returns:
+            dict: The bulk send report of the batch, see sms_service.send_sms_bulk().
+        """
+        rows = self._claim(limit)
+        if not rows:
+            return bulk_report([], 0.0)
+        report = send_sms_bulk(self._messages(rows))
+        self._settle(rows, report["results"])
+        return report
+
+    def drain(self):
+        """
+        Send batches until no message is due. Retries scheduled for later are left for the drainers.
+        Returns:
+            dict: One bulk send report covering all batches.
+        """
+        results, duration = [], 0.0
+        while True:
+            report = self.drain_once()
+            if not report["results"]:
+                return bulk_report(results, duration)
+            results.extend(report["results"])
+            duration += report["stats"]["duration"]
+
+    async def drain_async(self):
+        """asyncio version of drain(); the database work runs in worker threads."""
+        results, duration = [], 0.0
+        while True:
+            rows = await asyncio.to_thread(self._claim)
+            if not rows:
+                return bulk_report(results, duration)
+            report = await send_sms_bulk_async(self._messages(rows))
+            await asyncio.to_thread(self._settle, rows, report["results"])
+            results.extend(report["results"])
+            duration += report["stats"]["duration"]
+
+    def next_due(self):
+        """
+        Returns:
+            float or None: When the next pending message is due.
+        """
+        with self._lock:
+            return self._conn.execute(SELECT_NEXT_DUE).fetchone()[0]
+
+    def stats(self):
+        """
+        Returns:
+            dict: The number of messages per state.
+        """
+        with self._lock:
+            counts = dict(self._conn.execute(COUNT_BY_STATUS).fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, SENDING, SENT, DEAD)}
+
+    def requeue_dead(self):
+        """
+        Give all dead-lettered messages a fresh set of attempts.
+        Returns:
+            int: The number of messages requeued.
+        """
+        now = self.clock()
+        with self._lock:
+            count = self._conn.execute(REQUEUE_DEAD, (now, now)).rowcount
+        self._wakeup.set()
+        return count
+
+    def prune(self):
+        """Delete sent and dead messages older than the retention period."""
+        with self._lock:
+            return self._conn.execute(PRUNE_FINISHED, (self.clock() - OUTBOX_RETENTION_DAYS * 86400,)).rowcount
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                if self.drain_once()["results"]:
+                    continue
+                next_due = self.next_due()
+            except Exception as e:  # Keep draining
+                print(f"Outbox drainer error: {e}")
+                next_due = None
+            delay = OUTBOX_POLL_INTERVAL if next_due is None else \
+                min(OUTBOX_POLL_INTERVAL, max(0.0, next_due - self.clock()))
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def start(self, drainers=1):
+        """Start background drainer threads if none are running."""
+        if self._threads:
+            return
+        self._stopped.clear()
+        for index in range(drainers):
+            thread = threading.Thread(target=self._run, name=f"outbox-drainer-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def flush(self):
+        """Send everything that is due now, e.g. before a short-lived script exits."""
+        return self.drain()
+
+    def stop(self):
+        """Stop the drainer threads."""
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def close(self):
+        """Stop the drainers and close the database connection."""
+        self.stop()
+        with self._lock:
+            self._conn.close()
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox(background=True):
+    """
+    Args:
+        background (bool): Start the drainer threads when the outbox is created. A
+            caller that drives drain() itself (e.g. a simulation) passes False.
+    Returns:
+        Outbox: The shared outbox, recovered (and drained in the background) after the first call.
+    """
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+            _outbox.recover()
+            _outbox.prune()
+            if background:
+                _outbox.start()
+        return _outbox
@@ -0,0 +1,184 @@
+import heapq
+import itertools
+import threading
+import clocks
+from concurrent.futures import Future
+from message_ingestion import get_message_ingestor
+
+# Reply polling defaults
+REPLY_POLL_INTERVAL = 10  # Seconds between gateway fetches
+REPLY_TIMEOUT = 60  # Seconds a waiter waits for a reply
+DEFAULT_REPLY = "skip"  # Result of a waiter that timed out
+
+
+class ReplyPoller:
+    """
+    Waits for replies from many phone numbers with a single polling loop.
+    Every tick makes one gateway fetch for all waiting numbers and hands each new
+    reply to the waiters registered for its number. Waiters are futures, so a
+    caller can block on one, attach a callback or wait on thousands at once.
+    """
+
+    def __init__(self, team_name, poll_interval=REPLY_POLL_INTERVAL):
+        """
+        Args:
+            team_name (str): The team whose messages are polled.
+            poll_interval (float): Seconds between gateway fetches.
+        """
+        self.team_name = team_name
+        self.poll_interval = poll_interval
+        self.ingestor = get_message_ingestor(team_name)
+        self._waiters = {}  # phone_number -> list of futures
+        self._deadlines = []  # Heap of (deadline, seq, phone_number, future, default)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        # Set when another loop (e.g. the asyncio service) fetches the messages and calls dispatch()
+        self.driven_externally = False
+
+    def wait_for_reply(self, phone_number, timeout=REPLY_TIMEOUT, callback=None, default=DEFAULT_REPLY):
+        """
+        Register a waiter for the next reply from a phone number.
+        Args:
+            phone_number (str): The number to wait for.
+            timeout (float): Seconds to wait before resolving with the default.
+            callback (callable): Optional callback(phone_number, reply), called once resolved.
+            default: Result if no reply arrives in time.
+        Returns:
+            Future: Resolves with the latest new message, or the default on timeout.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(phone_number, f.result()))
+
+        with self._lock:
+            self._waiters.setdefault(phone_number, []).append(future)
+            heapq.heappush(self._deadlines, (clocks.monotonic() + timeout, next(self._seq), phone_number, future, default))
+        self.start()
+        return future
+
+    def pending(self):
+        """
+        Returns:
+            int: The number of phone numbers currently waited on.
+        """
+        with self._lock:
+            return len(self._waiters)
+
+    def _expire(self, now):
+        """
+        Remove the waiters whose deadline passed. Must hold the lock.
+        Returns:
+            list: (future, default) pairs to resolve once the lock is released, since
+                done-callbacks may register new waiters.
+        """
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, phone_number, future, default = heapq.heappop(self._deadlines)
+            waiters = self._waiters.get(phone_number, [])
+            if future.done() or future not in waiters:
+                continue  # Already answered, or taken by dispatch()
+            waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(phone_number, None)
+            expired.append((future, default))
+        return expired
+
+    @staticmethod
+    def _resolve(expired):
+        """Resolve expired waiters with their default. Must not hold the lock."""
+        for future, default in expired:
+            future.set_result(default)
+
+    def poll_once(self):
+        """
+        Fetch new messages once and dispatch them to the waiting futures.
+        Returns:
+            int: The number of phone numbers whose waiters got a reply.
+        """
+        phone_numbers = self.waiting_numbers()
+        # Other numbers are left unread for whoever processes them
+        new_groups = self.ingestor.poll(phone_numbers) if phone_numbers else []
+        delivered = self.dispatch(new_groups)
+        # Only what a waiter took; a reply whose waiter expired meanwhile stays unread
+        self.ingestor.commit(delivered)
+        self.expire()
+        return len(delivered)
+
+    def waiting_numbers(self):
+        """
+        Returns:
+            list: The phone numbers that currently have waiters.
+        """
+        with self._lock:
+            return list(self._waiters)
+
+    def dispatch(self, message_groups):
+        """
+        Hand newly ingested messages to the waiters of their numbers.
+        Args:
+            message_groups (list): New messages as returned by MessageIngestor.ingest().
+        Returns:
+            list: The message groups that resolved at least one waiter, ready to commit.
+        """
+        delivered = []
+        for message_group in message_groups:
+            for phone_number, messages in message_group.items():
+                with self._lock:
+                    waiters = self._waiters.pop(phone_number, [])
+                resolved = False
+                for future in waiters:
+                    if not future.done():
+                        future.set_result(messages[-1])
+                        resolved = True
+                if resolved:
+                    delivered.append({phone_number: messages})
+        return delivered
+
+    def expire(self):
+        """Resolve the waiters whose timeout passed with their default."""
+        with self._lock:
+            expired = self._expire(clocks.monotonic())
+        self._resolve(expired)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:  # Keep polling for the other waiters
+                print(f"Reply poller error: {e}")
+            self._stopped.wait(self.poll_interval)
+
+    def start(self):
+        """Start the polling thread if it is not running yet and nothing else drives the poller."""
+        with self._lock:
+            if self._thread is None and not self.driven_externally:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="reply-poller", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop polling and resolve all remaining waiters with their default."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            expired = self._expire(float("inf"))
+        self._resolve(expired)
+
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def get_reply_poller(team_name, poll_interval=REPLY_POLL_INTERVAL):
+    """
+    Returns:
+        ReplyPoller: The shared poller of the team, created on first use.
+    """
+    with _pollers_lock:
+        if team_name not in _pollers:
+            _pollers[team_name] = ReplyPoller(team_name, poll_interval)
+        return _pollers[team_name]
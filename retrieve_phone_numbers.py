@@ -36,7 +36,8 @@ def fetch_phone_numbers_from_json(file_path, key_name='phone_number'):
     return phone_numbers
 
 
-# Example usage:
-file_path = 'user_data.json'  # Ensure this file exists in your directory
-numbers = fetch_phone_numbers_from_json(file_path)
-print(numbers)
+if __name__ == "__main__":
+    # Example usage:
+    file_path = 'user_data.json'  # Ensure this file exists in your directory
+    numbers = fetch_phone_numbers_from_json(file_path)
+    print(numbers)
@@ -1,41 +1,73 @@
-
-from user_management import load_user_data, save_user_data
+import asyncio
+import heapq
+import threading
+import time
+import zlib
+import clocks
+import metrics
+from datetime import datetime, timedelta
+from user_management import get_user_store
 from fetch_data import get_random_quote
-from sms_service import send_sms  # Import the real send_sms function
-import schedule
+from intake_journal import get_intake_journal
+from intake_rollups import get_intake_rollups
+from outbox import get_outbox  # Durable queue in front of the real send_sms function
+from config import settings
 
 # Notification limit and interval
 NOTIFICATION_LIMIT = 3
 NOTIFICATION_INTERVAL_MINUTES = 1
+DAILY_STATISTICS_TIME = "20:00"
+SCHEDULER_SLOT_SECONDS = 1  # Users due within the same slot are handled in one batch
+STATISTICS_SPREAD_SECONDS = 30 * 60  # Daily statistics go out between 20:00 and 20:30
+# Users per slot across all jobs, so a slot never holds more sends than the gateway takes in that time
+SCHEDULER_SLOT_CAPACITY = int(settings.SMS_RATE_LIMIT * SCHEDULER_SLOT_SECONDS) or None
 
 
-def send_reminder(username):
+def reminder_key(phone_number, now=None, interval=NOTIFICATION_INTERVAL_MINUTES * 60):
     """
-    Send a reminder to the user with a motivational message and water intake suggestion.
-
+    Idempotency key of the reminder for a phone number in the current reminder slot.
+    A round that is repeated within the same slot (e.g. after a restart) maps to the same key.
     Args:
-        username (str): The user's name.
+        interval (float): Seconds between two reminder rounds, i.e. the width of a slot.
     """
-    user_data = load_user_data()
-    users = user_data.get('users', [])  # Access 'users' key to get the list of users
+    now = clocks.now() if now is None else now
+    slot = int(now // interval)
+    return f"reminder:{phone_number}:{datetime.fromtimestamp(now).date().isoformat()}:{slot}"
 
-    user = next((u for u in users if u['username'] == username), None)
 
-    if not user:
-        print(f"User '{username}' not found.")
-        return
+def followup_key(phone_number, answered, now=None):
+    """Idempotency key of the reminder sent in answer to a reply: one per answered reminder of the day."""
+    now = clocks.now() if now is None else now
+    return f"followup:{phone_number}:{datetime.fromtimestamp(now).date().isoformat()}:{answered}"
+
 
-    reminders_sent = user.get("reminders_sent", 0)
+def statistics_key(phone_number, now=None):
+    """Idempotency key of the daily statistics for a phone number: one per day."""
+    now = clocks.now() if now is None else now
+    return f"statistics:{phone_number}:{datetime.fromtimestamp(now).date().isoformat()}"
+
+
+def build_reminder_message(user):
+    """
+    Build the reminder SMS for a user, if they should get one.
+
+    Args:
+        user (dict): The user's record.
+    Returns:
+        str or None: The reminder text, or None if no reminder should be sent.
+    """
+    username = user.get("username")
+    reminders_sent = get_intake_rollups().day_totals(user["id"])["reminders"]  # Resets every day
 
     if reminders_sent >= NOTIFICATION_LIMIT:
         print(f"Max reminders sent for '{username}'.")
-        return
+        return None
 
     # Fetch daily water target from user_data.json
     daily_target = user.get("daily_target", 0)  # Assume this is in liters
     if daily_target <= 0:
         print(f"No valid daily water target found for '{username}'.")
-        return
+        return None
 
     # Calculate water intake per reminder
     water_per_notification = round(daily_target / NOTIFICATION_LIMIT, 2)
@@ -46,19 +78,114 @@ def send_reminder(username):
         motivational_message = "Stay hydrated! Health is wealth."
 
     # Construct the reminder message
-    reminder_message = (
-        f"{motivational_message} Don't forget to drink {water_per_notification}l."
-    )
+    return f"{motivational_message} Don't forget to drink {water_per_notification}l."
+
+
+def send_reminder(username, answered=None):
+    """
+    Send a reminder to the user with a motivational message and water intake suggestion.
+
+    Args:
+        username (str): The user's name.
+        answered (int): Reminders the user answered today, when this reminder follows
+            up a reply. Follow-ups are keyed apart from the scheduled rounds.
+    """
+    user = get_user_store().get_by_username(username)
+
+    if not user:
+        print(f"User '{username}' not found.")
+        return
+
+    reminder_message = build_reminder_message(user)
+    if reminder_message is None:
+        return
 
     # Get user phone number
     phone_number = user.get("phone_number", "Unknown Number")
 
-    # Send the SMS using sms_service.py
-    response = send_sms(phone_number, reminder_message)
-    if response.get("status") == "Error":
-        print(f"Failed to send SMS to {username}: {response.get('description')}")
+    # Queue the SMS; the outbox sends it and retries failures
+    key = reminder_key(phone_number) if answered is None else followup_key(phone_number, answered)
+    if get_outbox().enqueue(key, phone_number, reminder_message):
+        print(f"SMS queued for {username}: {reminder_message}")
     else:
-        print(f"SMS successfully sent to {username}: {reminder_message}")
+        print(f"Reminder for {username} was already queued in this slot.")
+
+
+def _users_for_round(usernames, users=None):
+    """Return the users a bulk round applies to: the given records, the given usernames, or everyone."""
+    if users is not None:
+        return users
+
+    user_store = get_user_store()
+    if usernames is None:
+        return list(user_store.users())
+
+    users = []
+    for username in usernames:
+        user = user_store.get_by_username(username)
+        if user:
+            users.append(user)
+        else:
+            print(f"User '{username}' not found.")
+    return users
+
+
+def _report_round(name, report):
+    """Print the outcome of a bulk round."""
+    stats = report["stats"]
+    print(f"{name}: {stats['sent']}/{stats['total']} sent, {stats['failed']} failed "
+          f"in {stats['duration']}s ({stats['messages_per_second']} msg/s).")
+    for result in report["results"]:
+        if not result["success"]:
+            print(f"  Failed to send SMS to {result['phone_number']}: {result['response']}")
+
+
+def build_reminder_messages(users):
+    """
+    Returns:
+        list: (phone_number, message) pairs for the users that should get a reminder now.
+    """
+    messages = []
+    for user in users:
+        reminder_message = build_reminder_message(user)
+        if reminder_message is not None:
+            messages.append((user.get("phone_number", "Unknown Number"), reminder_message))
+    return messages
+
+
+def _keyed(messages, key, **key_args):
+    """Prefix (phone_number, message) pairs with their idempotency key for the outbox."""
+    now = clocks.now()
+    return [(key(phone_number, now, **key_args), phone_number, message) for phone_number, message in messages]
+
+
+def send_reminder_round(usernames=None, users=None, interval=NOTIFICATION_INTERVAL_MINUTES * 60):
+    """
+    Send the next reminder to many users at once through the bulk SMS path.
+
+    Args:
+        usernames (list): Users to remind. Defaults to all users.
+        users (list): User records to remind, when the caller already loaded them.
+        interval (float): Seconds between two reminder rounds, see reminder_key().
+    Returns:
+        dict: Per-message results and aggregate stats from send_sms_bulk, for the
+            messages not already sent in this reminder slot.
+    """
+    messages = build_reminder_messages(_users_for_round(usernames, users))
+    report = get_outbox().send_now(_keyed(messages, reminder_key, interval=interval))
+    _report_round("Reminder round", report)
+    return report
+
+
+async def send_reminder_round_async(users, interval=NOTIFICATION_INTERVAL_MINUTES * 60):
+    """
+    asyncio version of send_reminder_round() for the given user records.
+    The messages are built in a worker thread, since that reads the rollups.
+    """
+    messages = await asyncio.to_thread(build_reminder_messages, users)
+    report = await get_outbox().send_now_async(_keyed(messages, reminder_key, interval=interval))
+    _report_round("Reminder round", report)
+    return report
 
 
 def handle_user_response(username, message):
@@ -71,12 +198,8 @@ def handle_user_response(username, message):
         username (str): The user's name.
         message (str): The response from the user ("done" or "skip").
     """
-    # Load user data from storage (assuming it's a JSON or similar structure)
-    user_data = load_user_data()  # Load user data (this is assumed to be a function already implemented)
-    users = user_data.get('users', [])
-
     # Find the user based on the username
-    user = next((u for u in users if u['username'] == username), None)
+    user = get_user_store().get_by_username(username)
 
     if not user:
         print(f"User '{username}' not found.")
@@ -88,95 +211,520 @@ def handle_user_response(username, message):
 
     # Calculate water intake per reminder
     daily_target = user.get("daily_target", 0)  # Assume this is in liters
-    reminders_sent = user.get("reminders_sent", 0)
+    rollups = get_intake_rollups()
+    reminders_sent = rollups.day_totals(user["id"])["reminders"]
     water_per_notification = round(daily_target / NOTIFICATION_LIMIT, 2)
 
-    # Process user response and update state
-    if message.strip().lower() == 'done':
+    # Process user response: 'done' adds the water intake, 'skip' adds nothing
+    is_done = message.strip().lower() == 'done'
+    amount = water_per_notification if is_done else 0.0
 
-        # Update the water intake if user answers 'done'
-        user["water_intake"] = user.get("water_intake", 0) + water_per_notification
-        print(f"User {username}'s water intake updated to {user['water_intake']:.2f} liters.")
+    # Append the event to the intake journal instead of rewriting the user data; the journal
+    # applies it to today's rollup, which also counts the reminder as answered
+    today = get_intake_journal().record(user, amount, reminders_sent)
 
+    if is_done:
+        print(f"User {username}'s water intake today updated to {today['intake']:.2f} liters.")
     else:
         print(f"User {username} skipped the reminder.")
 
-    # Increment reminders_sent count when user responds
-    user["reminders_sent"] = reminders_sent + 1
-
-    # Save user data after update
-    save_user_data(user_data)
-
     # Check if user has completed all reminders
-    if user["reminders_sent"] >= NOTIFICATION_LIMIT:
+    if today["reminders"] >= NOTIFICATION_LIMIT:
         print(f"User {username} has completed all reminders.")
         return  # Exit after completing all reminders
 
     # Schedule next reminder if the user has not responded to all reminders
-    send_reminder(username)
+    send_reminder(username, answered=today["reminders"])
 
 
-def send_daily_statistics(username):
-    """
-    Send daily statistics to the user summarizing their water intake.
-    """
-    user_data = load_user_data()
-    users = user_data.get('users', [])
+# Daily statistics messages, from the lowest to the highest bracket
+STATISTICS_MESSAGES = [
+    "You're doing great, but could drink more. Stay hydrated tomorrow! You drank {water_intake}l out of {daily_target}l today.",
+    "Good job! You're on the right track, but there's room for improvement. Keep it up! You drank {water_intake}l out of {daily_target}l today.",
+    "Awesome! You hit your water goal today. Keep it up, you're doing amazing! You drank {water_intake}l out of {daily_target}l today.",
+]
 
-    user = next((u for u in users if u['username'] == username), None)
 
-    if not user:
-        print(f"User '{username}' not found.")
-        return
+def _statistics_bracket(percentage):
+    """Map one percentage of the daily target to its STATISTICS_MESSAGES index, like _statistics_brackets()."""
+    if percentage < 50:
+        return 0
+    return 2 if percentage >= 95 else 1
+
+
+def _statistics_brackets(percentages):
+    """Map percentages of the daily target to STATISTICS_MESSAGES indexes: below 50, up to 95, 95 and above."""
+    import numpy as np
+
+    percentages = np.asarray(percentages, dtype=np.float64)
+    return np.select([percentages < 50, percentages >= 95], [0, 2], default=1)
 
-    water_intake = round(user.get("water_intake", 0), 2)  # Round the value to avoid floating-point issues
+
+def build_daily_statistics_message(user):
+    """
+    Build the daily statistics SMS summarizing a user's water intake.
+
+    Args:
+        user (dict): The user's record.
+    Returns:
+        str or None: The statistics text, or None if the user has no valid daily target.
+    """
+    # Users without a valid target cannot get a percentage, as in build_daily_statistics_messages()
     daily_target = user.get("daily_target", 0)
+    if not daily_target > 0:
+        print(f"No valid daily water target found for '{user.get('username')}'.")
+        return None
+
+    # Today's intake from the rollups; round the value to avoid floating-point issues
+    water_intake = round(get_intake_rollups().day_totals(user["id"])["intake"], 2)
 
     # Calculate percentage of daily target reached
     percentage = (water_intake / daily_target) * 100
 
     # Determine the message based on the percentage
-    if percentage < 50:
-        message = f"You're doing great, but could drink more. Stay hydrated tomorrow! You drank {water_intake}l out of {daily_target}l today."
-    elif 50 <= percentage < 80:
-        message = f"Good job! You're on the right track, but there's room for improvement. Keep it up! You drank {water_intake}l out of {daily_target}l today."
-    elif percentage >= 95:
-        message = f"Awesome! You hit your water goal today. Keep it up, you're doing amazing! You drank {water_intake}l out of {daily_target}l today."
+    bracket = _statistics_bracket(percentage)
+    return STATISTICS_MESSAGES[bracket].format(water_intake=water_intake, daily_target=daily_target)
+
+
+def send_daily_statistics(username):
+    """
+    Send daily statistics to the user summarizing their water intake.
+    """
+    user = get_user_store().get_by_username(username)
+
+    if not user:
+        print(f"User '{username}' not found.")
+        return
+
+    message = build_daily_statistics_message(user)
+    if message is None:
+        return
 
     # Get user phone number
     phone_number = user.get("phone_number", "Unknown Number")
 
-    # Send the message to the user
-    send_sms(phone_number, message)
-    print(f"Daily statistics sent to {username}: {message}")
+    # Queue the message for the user
+    if get_outbox().enqueue(statistics_key(phone_number), phone_number, message):
+        print(f"Daily statistics queued for {username}: {message}")
+    else:
+        print(f"Daily statistics for {username} were already queued today.")
+
+
+def get_intake_statistics(username):
+    """
+    Get a user's daily, weekly and monthly intake and their goal streak.
+
+    Args:
+        username (str): The user's name.
+    Returns:
+        dict or str: The statistics, or a message indicating the user is not found.
+    """
+    user = get_user_store().get_by_username(username)
+    if not user:
+        return "User not found."
+
+    rollups = get_intake_rollups()
+    today = rollups.day_totals(user["id"])
+    return {
+        "today": round(today["intake"], 2),
+        "reminders_today": today["reminders"],
+        "week": round(rollups.week_total(user["id"]), 2),
+        "month": round(rollups.month_total(user["id"]), 2),
+        "daily_target": user.get("daily_target", 0),
+        "streak": rollups.streak(user["id"]),
+    }
+
+
+def send_daily_statistics_all(users=None):
+    """
+    Send the daily statistics of all users as one batched job.
+    Reads the users and their intake of the day once, picks every user's message
+    in one vectorized pass and sends them through the bulk SMS path.
+
+    Args:
+        users (list): User records, when the caller already loaded them. Defaults to all users.
+    Returns:
+        dict: Run report with the counts of users, sent, failed and skipped messages,
+            the duration, throughput and the failed sends.
+    """
+    start = time.perf_counter()
+    users = list(get_user_store().users()) if users is None else users
+    messages, skipped = build_daily_statistics_messages(users)
+    return _statistics_report(users, skipped, get_outbox().send_now(_keyed(messages, statistics_key)), start)
+
+
+async def send_daily_statistics_all_async(users):
+    """
+    asyncio version of send_daily_statistics_all() for the given user records.
+    """
+    start = time.perf_counter()
+    messages, skipped = await asyncio.to_thread(build_daily_statistics_messages, users)
+    report = await get_outbox().send_now_async(_keyed(messages, statistics_key))
+    return _statistics_report(users, skipped, report, start)
+
+
+def build_daily_statistics_messages(users):
+    """
+    Read the users' intake of the day once and pick every user's statistics message in one vectorized pass.
+    Returns:
+        tuple: ((phone_number, message) pairs, users skipped for lacking a valid target).
+    """
+    import numpy as np
+
+    # Users without a valid target cannot get a percentage
+    skipped = [user for user in users if not user.get("daily_target", 0) > 0]
+    users = [user for user in users if user.get("daily_target", 0) > 0]
+
+    totals = get_intake_rollups().day_totals_many([user["id"] for user in users])
+    water_intakes = [round(totals[user["id"]]["intake"], 2) for user in users]
+    daily_targets = [user["daily_target"] for user in users]
+
+    percentages = np.asarray(water_intakes, dtype=np.float64) / np.asarray(daily_targets, dtype=np.float64) * 100
+    brackets = _statistics_brackets(percentages).tolist()
+
+    messages = [(user.get("phone_number", "Unknown Number"),
+                 STATISTICS_MESSAGES[bracket].format(water_intake=water_intake, daily_target=daily_target))
+                for user, bracket, water_intake, daily_target in zip(users, brackets, water_intakes, daily_targets)]
+    return messages, skipped
+
+
+def _statistics_report(users, skipped, send_report, start):
+    """Summarize and print a daily statistics run that started at perf_counter() time `start`."""
+    duration = time.perf_counter() - start
+    stats = send_report["stats"]
+    report = {
+        "users": len(users),
+        "sent": stats["sent"],
+        "failed": stats["failed"],
+        "skipped": len(skipped),
+        "duration": round(duration, 3),
+        "messages_per_second": round(stats["total"] / duration, 2) if duration > 0 else 0.0,
+        "failures": [result for result in send_report["results"] if not result["success"]],
+    }
+    print(f"Daily statistics: {report['sent']}/{report['users']} sent, {report['failed']} failed, "
+          f"{report['skipped']} skipped in {report['duration']}s ({report['messages_per_second']} msg/s).")
+    for failure in report["failures"]:
+        print(f"  Failed to send SMS to {failure['phone_number']}: {failure['response']}")
+    for user in skipped:
+        print(f"  No valid daily water target found for '{user.get('username')}'.")
+    return report
+
+
+class ReminderScheduler:
+    """
+    Min-heap scheduler that groups due users into time slots.
+    Each job (e.g. reminders or daily statistics) has a handler that receives a
+    list of user records. All users of a job that fall into the same slot are
+    handled together, with one store read and one bulk send, so a tick costs
+    O(due slots) instead of O(users). Users can be added and removed at any time
+    without rebuilding the schedule.
+
+    To keep the gateway load flat, a job can spread its users over a window:
+    every user gets a fixed offset derived from a hash of the job and user id,
+    so the spread is the same after a restart. A slot capacity caps the users
+    per slot across all jobs; users beyond it move to the next slot with room.
+    """
+
+    def __init__(self, clock=clocks.now, slot_seconds=SCHEDULER_SLOT_SECONDS, slot_capacity=None):
+        """
+        Args:
+            clock (callable): Returns the current time in seconds since the epoch. Defaults to the shared clock.
+            slot_seconds (int): Width of a time slot.
+            slot_capacity (int): Maximum users per slot across all jobs. None for no limit.
+        """
+        self.clock = clock
+        self.slot_seconds = slot_seconds
+        self.slot_capacity = slot_capacity
+        self._jobs = {}  # kind -> {"handler": ..., "every": seconds, "at": "HH:MM", "spread": seconds}
+        self._heap = []  # Slot start times, each pushed once
+        self._slots = {}  # slot time -> {kind: set of user ids}
+        self._slot_counts = {}  # slot time -> users in the slot across all jobs
+        self._overflow = {}  # Full slot time -> a later slot to try next
+        self._user_slots = {}  # (kind, user id) -> slot time
+        self._user_bases = {}  # (kind, user id) -> due time before the user's offset
+        self._lock = threading.RLock()
+
+    def add_job(self, kind, handler, every=None, at=None, spread=0):
+        """
+        Register a recurring job.
+        Args:
+            kind (str): Name of the job, e.g. "reminder".
+            handler (callable): Called with the list of due user records.
+            every (float): Repeat every this many seconds.
+            at (str): Or repeat daily at this local time ("HH:MM").
+            spread (float): Spread the users over this many seconds after the due time.
+        """
+        if (every is None) == (at is None):
+            raise ValueError("Specify exactly one of 'every' or 'at'.")
+        with self._lock:
+            self._jobs[kind] = {"handler": handler, "every": every, "at": at, "spread": spread}
+
+    def every(self, kind):
+        """
+        Returns:
+            float or None: Seconds between two runs of the job, None for a daily job.
+        """
+        return self._jobs[kind]["every"]
+
+    def _next_due(self, kind, after):
+        """Return the next time the job is due, strictly after `after`, before any user offset."""
+        job = self._jobs[kind]
+        if job["every"] is not None:
+            return after + job["every"]
+
+        hour, minute = map(int, job["at"].split(":"))
+        moment = datetime.fromtimestamp(after)
+        due = moment.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if due <= moment:
+            due += timedelta(days=1)
+        return due.timestamp()
+
+    def offset(self, kind, user_id):
+        """
+        Returns:
+            float: The user's fixed offset within the job's spread window, a whole number of slots.
+        """
+        spread_slots = int(self._jobs[kind]["spread"] // self.slot_seconds)
+        if spread_slots <= 1:
+            return 0
+        return (zlib.crc32(f"{kind}:{user_id}".encode()) % spread_slots) * self.slot_seconds
+
+    def _free_slot(self, slot):
+        """Return the first slot from `slot` on with room left. Must hold the lock."""
+        if not self.slot_capacity:
+            return slot
+        full = []
+        while self._slot_counts.get(slot, 0) >= self.slot_capacity:
+            full.append(slot)
+            slot = self._overflow.get(slot, slot + self.slot_seconds)
+        for skipped in full:
+            self._overflow[skipped] = slot  # Later searches jump straight past the full run
+        return slot
+
+    def _schedule(self, kind, user_id, base):
+        """Put a user in the slot of `base` plus their offset, or the next one with room. Must hold the lock."""
+        due = base + self.offset(kind, user_id)
+        slot = self._free_slot(due - due % self.slot_seconds)
+        if slot not in self._slots:
+            self._slots[slot] = {}
+            heapq.heappush(self._heap, slot)
+        self._slots[slot].setdefault(kind, set()).add(user_id)
+        self._slot_counts[slot] = self._slot_counts.get(slot, 0) + 1
+        self._user_slots[(kind, user_id)] = slot
+        self._user_bases[(kind, user_id)] = base
+
+    def add_users(self, user_ids, kind, first_due=None):
+        """
+        Schedule users for a job.
+        Args:
+            user_ids (iterable): The ids of the users.
+            kind (str): The job to schedule them for.
+            first_due (float): When they are first due, before their offsets. Defaults to the job's next run.
+        """
+        with self._lock:
+            if first_due is None:
+                first_due = self._next_due(kind, self.clock())
+            for user_id in user_ids:
+                self._remove(kind, user_id)
+                self._schedule(kind, user_id, first_due)
+
+    def add_user(self, user_id, kinds=None, first_due=None):
+        """Schedule one user for the given jobs (default: all jobs)."""
+        with self._lock:
+            for kind in kinds or list(self._jobs):
+                self.add_users([user_id], kind, first_due)
+
+    def _remove(self, kind, user_id):
+        slot = self._user_slots.pop((kind, user_id), None)
+        if slot is not None:
+            self._user_bases.pop((kind, user_id), None)
+            self._slots[slot][kind].discard(user_id)  # Empty slots are dropped when they come due
+            self._slot_counts[slot] -= 1
+
+    def remove_user(self, user_id):
+        """Unschedule a user from all jobs."""
+        with self._lock:
+            for kind in self._jobs:
+                self._remove(kind, user_id)
+
+    def next_run(self):
+        """
+        Returns:
+            float or None: The start of the earliest scheduled slot.
+        """
+        with self._lock:
+            return self._heap[0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """
+        Take every slot that is due and reschedule its users for their next run.
+        Args:
+            now (float): The current time. Defaults to the scheduler's clock.
+        Returns:
+            list: (kind, user ids) batches in due order.
+        """
+        now = self.clock() if now is None else now
+        batches = []
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                slot = heapq.heappop(self._heap)
+                jobs = self._slots.pop(slot)
+                del self._slot_counts[slot]
+                self._overflow.pop(slot, None)
+                for kind, user_ids in jobs.items():
+                    if not user_ids:
+                        continue
+                    next_bases = {}  # Most users of a batch share their base time
+                    for user_id in user_ids:
+                        del self._user_slots[(kind, user_id)]
+                        base = self._user_bases.pop((kind, user_id))
+                        if base not in next_bases:
+                            next_bases[base] = self._next_due(kind, base)
+                        next_base = next_bases[base]
+                        # Keep the cadence of interval jobs, but never schedule into the past
+                        offset = self.offset(kind, user_id)
+                        if next_base + offset <= now:
+                            next_base = self._next_due(kind, now - offset)
+                        self._schedule(kind, user_id, next_base)
+                    batches.append((kind, sorted(user_ids)))
+        return batches
+
+    def slot_fill(self, start=None, end=None):
+        """
+        Returns:
+            dict: slot time -> {kind: users} for the scheduled slots in [start, end), in time order.
+        """
+        with self._lock:
+            return {slot: {kind: len(user_ids) for kind, user_ids in self._slots[slot].items() if user_ids}
+                    for slot in sorted(self._slots)
+                    if (start is None or slot >= start) and (end is None or slot < end)}
+
+    def load_report(self, start=None, end=None, kind=None):
+        """
+        Summarize how full the slots in [start, end) are, i.e. the gateway load to expect.
+        Args:
+            kind (str): Only count the users of this job. Defaults to all jobs.
+        Returns:
+            dict: Number of used slots, users, the peak and mean users per used slot,
+                the peak slot and the slot capacity.
+        """
+        with self._lock:
+            if kind is None:
+                counts = dict(self._slot_counts)
+            else:
+                counts = {slot: len(jobs.get(kind, ())) for slot, jobs in self._slots.items()}
+        counts = {slot: count for slot, count in counts.items()
+                  if count and (start is None or slot >= start) and (end is None or slot < end)}
+        if not counts:
+            return {"slots": 0, "users": 0, "peak": 0, "mean": 0.0, "peak_slot": None,
+                    "capacity": self.slot_capacity}
+        peak_slot = max(counts, key=counts.get)
+        return {"slots": len(counts), "users": sum(counts.values()), "peak": counts[peak_slot],
+                "mean": round(sum(counts.values()) / len(counts), 2), "peak_slot": peak_slot,
+                "capacity": self.slot_capacity}
+
+    def run_pending(self, now=None):
+        """
+        Run the handlers of all due batches.
+        Returns:
+            int: The number of users handled.
+        """
+        with metrics.timer("scheduler_tick"):
+            return self._run_batches(self.pop_due(now))
+
+    def load_batch(self, user_ids):
+        """
+        Read the records of a due batch with one store read.
+        Users removed from the store are dropped from the schedule as well.
+        Returns:
+            list: The user records that still exist.
+        """
+        users = get_user_store().get_by_ids(user_ids)
+        if len(users) < len(user_ids):
+            found = {user["id"] for user in users}
+            for user_id in user_ids:
+                if user_id not in found:
+                    self.remove_user(user_id)
+        return users
+
+    def _run_batches(self, batches):
+        handled = 0
+        for kind, user_ids in batches:
+            users = self.load_batch(user_ids)
+            if users:
+                self._jobs[kind]["handler"](users)
+                handled += len(users)
+                metrics.inc("scheduler_users_total", len(users), job=kind)
+        return handled
+
+    def run_forever(self, stop_event=None, max_sleep=1.0):
+        """
+        Run due batches until the stop event is set, sleeping until the next slot in between.
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.run_pending()
+            next_run = self.next_run()
+            delay = max_sleep if next_run is None else min(max_sleep, max(0.0, next_run - self.clock()))
+            stop_event.wait(delay)
+
+
+_scheduler = None
+
+
+def create_scheduler(reminder_interval=NOTIFICATION_INTERVAL_MINUTES * 60, slot_capacity=SCHEDULER_SLOT_CAPACITY,
+                     clock=clocks.now):
+    """
+    Build a scheduler with the reminder and daily statistics jobs.
+    Args:
+        reminder_interval (float): Seconds between two reminders of a user; the reminders are spread over it.
+        slot_capacity (int): Users per slot across both jobs, None for unlimited.
+        clock (callable): Returns the current time in seconds since the epoch.
+    Returns:
+        ReminderScheduler: The new scheduler, without users.
+    """
+    scheduler = ReminderScheduler(clock=clock, slot_capacity=slot_capacity)
+    scheduler.add_job("reminder", lambda users: send_reminder_round(users=users, interval=reminder_interval),
+                      every=reminder_interval, spread=reminder_interval)
+    scheduler.add_job("statistics", send_daily_statistics_all,
+                      at=DAILY_STATISTICS_TIME, spread=STATISTICS_SPREAD_SECONDS)
+    return scheduler
+
+
+def get_scheduler():
+    """
+    Returns:
+        ReminderScheduler: The shared scheduler with the reminder and daily statistics jobs.
+    """
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = create_scheduler()
+    return _scheduler
+
+
+def _print_load(name, scheduler, kind):
+    """Print how the users of a job are spread over the slots of its next run."""
+    report = scheduler.load_report(kind=kind)
+    print(f"{name}: {report['users']} users over {report['slots']} slots, "
+          f"peak {report['peak']} per slot (capacity {report['capacity'] or 'unlimited'}).")
 
 
 def schedule_reminders():
     """
     Schedule reminders for all users at 1-2 minute intervals.
+    Every user keeps a fixed offset within the interval, so the sends are spread evenly.
     """
-    user_data = load_user_data()
-    users = user_data.get('users', [])  # Access 'users' key to get the list of users
-
-    for user in users:
-        username = user['username']
-        # Schedule reminders at 1-2 minute intervals
-        schedule.every(NOTIFICATION_INTERVAL_MINUTES).minutes.do(send_reminder, username=username)
+    scheduler = get_scheduler()
+    scheduler.add_users([user['id'] for user in get_user_store().users()], "reminder")
+    _print_load("Reminders scheduled", scheduler, "reminder")
 
 
 def schedule_daily_statistics_reminders():
     """
     Schedule daily statistics messages for all users at a set time.
+    The users are spread over STATISTICS_SPREAD_SECONDS after it, each in a fixed slot.
     """
-    user_data = load_user_data()
-    users = user_data.get('users', [])  # Access 'users' key to get the list of users
-
-    for user in users:
-        username = user['username']
-        water_intake = user.get("water_intake", 0)  # Ensure this is being updated properly
-        daily_target = user.get("daily_target", 0)
-
-        # Schedule daily statistics at 8 PM
-        schedule.every().day.at("20:00").do(send_daily_statistics, username=username,
-                                            water_intake=water_intake,
-                                            daily_target=daily_target)
+    # Daily statistics from 8 PM
+    scheduler = get_scheduler()
+    scheduler.add_users([user['id'] for user in get_user_store().users()], "statistics")
+    _print_load("Daily statistics scheduled", scheduler, "statistics")
@@ -0,0 +1,237 @@
+import asyncio
+import functools
+import signal
+import time
+import metrics
+from fetch_data import QUOTE_REFILL_INTERVAL, QUOTE_RETRY_DELAY, get_quote_pool, init_env
+from intake_journal import get_intake_journal
+from intake_rollups import get_intake_rollups
+from message_ingestion import get_message_ingestor
+from outbox import get_outbox
+from reply_poller import REPLY_POLL_INTERVAL, REPLY_TIMEOUT, DEFAULT_REPLY, get_reply_poller
+from schedule_management import (get_scheduler, handle_user_response, schedule_reminders,
+                                 schedule_daily_statistics_reminders, send_reminder_round_async,
+                                 send_daily_statistics_all_async)
+from sms_service import get_async_gateway_client, get_messages_async
+from user_management import get_user_store
+from audit_log import get_audit_log
+
+# Service loop settings
+SERVICE_TEAM_NAME = "WaterProof"
+SERVICE_MAX_SLEEP = 1.0  # Longest wait between scheduler checks, so new users are picked up quickly
+SERVICE_QUOTE_CHECK_INTERVAL = 5  # Seconds between checks whether the quote pool needs a refill
+SERVICE_SHUTDOWN_TIMEOUT = 30  # Seconds in-flight batches may take to finish on shutdown
+REPLY_COMMANDS = ("done", "skip")
+
+
+class AquaMindService:
+    """
+    asyncio runtime of the AquaMind service.
+    Runs the reminder scheduler, the reply poller and the quote prefetcher as
+    concurrent tasks on one event loop. Due scheduler batches (reminder rounds
+    and the daily statistics) each run as their own task and send through the
+    async gateway client, so a large batch never holds up the other loops and
+    nothing sleeps on a blocked thread. SIGINT/SIGTERM stop the loops, let
+    in-flight batches finish and close the gateway session.
+    """
+
+    def __init__(self, team_name=SERVICE_TEAM_NAME, poll_interval=REPLY_POLL_INTERVAL):
+        """
+        Args:
+            team_name (str): The team whose messages are polled.
+            poll_interval (float): Seconds between gateway fetches for replies.
+        """
+        self.team_name = team_name
+        self.poll_interval = poll_interval
+        self.scheduler = get_scheduler()
+        self.ingestor = get_message_ingestor(team_name)
+        self.poller = get_reply_poller(team_name, poll_interval)
+        self.poller.driven_externally = True
+        self.handlers = {
+            "reminder": functools.partial(send_reminder_round_async, interval=self.scheduler.every("reminder")),
+            "statistics": send_daily_statistics_all_async,
+        }
+        self._stopping = None
+        self._inflight = set()
+
+    async def _sleep(self, delay):
+        """
+        Wait for `delay` seconds or until the service stops.
+        Returns:
+            bool: True if the service is stopping.
+        """
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        return self._stopping.is_set()
+
+    def _spawn(self, coroutine):
+        """Run a coroutine as a tracked task, so shutdown can wait for it."""
+        task = asyncio.create_task(coroutine)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+        return task
+
+    async def _run_batch(self, kind, user_ids):
+        try:
+            users = await asyncio.to_thread(self.scheduler.load_batch, user_ids)
+            if users:
+                with metrics.timer("service_batch", job=kind):
+                    await self.handlers[kind](users)
+                metrics.inc("scheduler_users_total", len(users), job=kind)
+        except Exception as e:  # A failed batch must not stop the service
+            print(f"Scheduled {kind} batch failed: {e}")
+
+    async def run_scheduler(self):
+        """Start a task for every due batch, then wait until the next slot."""
+        while not self._stopping.is_set():
+            for kind, user_ids in self.scheduler.pop_due():
+                self._spawn(self._run_batch(kind, user_ids))
+            next_run = self.scheduler.next_run()
+            delay = SERVICE_MAX_SLEEP if next_run is None else \
+                min(SERVICE_MAX_SLEEP, max(0.0, next_run - self.scheduler.clock()))
+            await self._sleep(delay)
+
+    async def poll_replies(self):
+        """
+        Fetch the messages once per interval, hand replies to waiters and record
+        'done'/'skip' answers of registered users. Messages from other numbers
+        stay unread for the registration pipeline.
+        """
+        while not self._stopping.is_set():
+            try:
+                response = await get_messages_async(self.team_name)
+                if isinstance(response, list):
+                    new_groups = await asyncio.to_thread(self._new_replies, response)
+                    delivered = self.poller.dispatch(new_groups)
+                    # Commit only the replies a waiter took or a user's answer recorded; the others come back
+                    await asyncio.to_thread(self.ingestor.commit, delivered + await self._handle_replies(new_groups))
+                else:
+                    print("Error: Expected a list of messages, but got:", response)
+                self.poller.expire()
+            except Exception as e:  # Keep polling
+                print(f"Reply polling error: {e}")
+            await self._sleep(self.poll_interval)
+
+    def _new_replies(self, response):
+        """
+        Pick the new messages of waiting numbers and registered users from a getMessages response.
+        Filters by the cursors first, so only senders with new messages are looked up.
+        Blocking; runs in a worker thread.
+        """
+        waiting = set(self.poller.waiting_numbers())
+        user_store = get_user_store()
+        return [{phone_number: messages} for group in self.ingestor.ingest(response)
+                for phone_number, messages in group.items()
+                if phone_number in waiting or user_store.get_by_phone(phone_number)]
+
+    def _handle_reply(self, phone_number, message):
+        """
+        Record a 'done'/'skip' answer of a registered user. Blocking; runs in a worker thread.
+        Returns:
+            bool: True if the number belongs to a registered user, so the reply was processed.
+        """
+        text = (message.get("text") or "").strip().lower()
+        user = get_user_store().get_by_phone(phone_number)
+        if user and text in REPLY_COMMANDS:
+            handle_user_response(user["username"], text)
+        return user is not None
+
+    async def _handle_replies(self, message_groups):
+        """
+        Handle the latest new message of every number concurrently.
+        Returns:
+            list: The message groups of registered users that were handled without an error, ready to commit.
+        """
+        replies = [(phone_number, messages) for group in message_groups for phone_number, messages in group.items()]
+        # Recording an answer may send the next reminder, so keep it off the loop
+        results = await asyncio.gather(*(asyncio.to_thread(self._handle_reply, phone_number, messages[-1])
+                                         for phone_number, messages in replies), return_exceptions=True)
+        handled = []
+        for (phone_number, messages), result in zip(replies, results):
+            if isinstance(result, Exception):
+                print(f"Handling the reply of {phone_number} failed: {result}")
+            elif result:
+                handled.append({phone_number: messages})
+        return handled
+
+    async def prefetch_quotes(self):
+        """Refill the quote pool whenever it runs low, backing off while the quote API fails."""
+        pool = get_quote_pool(background=False)
+        last_refill = float("-inf")
+        while not self._stopping.is_set():
+            delay = SERVICE_QUOTE_CHECK_INTERVAL
+            if pool.needs_refill() or time.monotonic() - last_refill >= QUOTE_REFILL_INTERVAL:
+                last_refill = time.monotonic()
+                if not await asyncio.to_thread(pool.refill) and pool.needs_refill():
+                    delay = QUOTE_RETRY_DELAY  # Don't hammer an API that is down
+            await self._sleep(delay)
+
+    async def wait_for_reply(self, phone_number, timeout=REPLY_TIMEOUT, default=DEFAULT_REPLY):
+        """
+        Wait for the next reply from a phone number without blocking the loop.
+        Returns:
+            The latest new message, or the default on timeout.
+        """
+        return await asyncio.wrap_future(self.poller.wait_for_reply(phone_number, timeout, default=default))
+
+    def stop(self):
+        """Ask the service to shut down; safe to call from a signal handler."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Not supported on this platform or outside the main thread
+
+    async def run(self):
+        """Run all loops until stop() is called or a signal arrives, then shut down gracefully."""
+        self._stopping = asyncio.Event()
+        self._install_signal_handlers()
+        loops = [asyncio.create_task(self.run_scheduler(), name="scheduler"),
+                 asyncio.create_task(self.poll_replies(), name="reply-poller"),
+                 asyncio.create_task(self.prefetch_quotes(), name="quote-prefetch")]
+        print("AquaMind service running.")
+        try:
+            await self._stopping.wait()
+        finally:
+            await self.shutdown(loops)
+
+    async def shutdown(self, loops=()):
+        """Stop the loops, let in-flight batches finish and release the resources."""
+        self._stopping.set()
+        await asyncio.gather(*loops, return_exceptions=True)
+        if self._inflight:
+            print(f"Waiting for {len(self._inflight)} in-flight task(s)...")
+            _, pending = await asyncio.wait(set(self._inflight), timeout=SERVICE_SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self.poller.expire()
+        self.poller.stop()  # Resolves the remaining waiters with their default
+        await get_async_gateway_client().close()
+        await asyncio.to_thread(get_quote_pool().save)
+        await asyncio.to_thread(get_outbox(background=False).close)  # Stops the drainer threads
+        await asyncio.to_thread(get_intake_journal().close)  # Compacts it into the rollups
+        await asyncio.to_thread(get_intake_rollups().close)
+        get_audit_log().flush()
+        print("AquaMind service stopped.")
+
+
+def main():
+    """Schedule all users and run the service until interrupted."""
+    init_env()
+    metrics.init_metrics()
+    schedule_reminders()
+    schedule_daily_statistics_reminders()
+    asyncio.run(AquaMindService().run())
+
+
+if __name__ == "__main__":
+    main()
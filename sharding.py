@@ -0,0 +1,524 @@
+import argparse
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import clocks
+from datetime import date
+from config import settings
+from fetch_data import init_env
+from message_ingestion import get_message_ingestor
+from reply_poller import REPLY_POLL_INTERVAL
+from outbox import get_outbox
+from user_management import (DATA_REQUEST_MESSAGE, create_user_store, parse_user_details, set_user_store,
+                             register_users)
+from schedule_management import get_scheduler, handle_user_response
+from intake_journal import get_intake_journal
+from intake_rollups import get_intake_rollups
+from sms_service import TokenBucket, set_rate_limiter
+
+# Sharded worker mode settings
+SHARD_DATA_DIR = "shards"  # Every worker keeps its storage in a subdirectory named after it
+SHARD_VIRTUAL_NODES = 128  # Points per worker on the hash ring; more points spread users more evenly
+SHARD_MAX_SLEEP = 1.0  # Longest a worker waits for a command before checking its scheduler again
+SHARD_TEAM_NAME = "WaterProof"
+
+
+class ShardError(RuntimeError):
+    """
+    Raised when one or more workers failed a command or are gone.
+    `results` holds the answers of the workers that succeeded, by worker name.
+    """
+
+    def __init__(self, message, results):
+        super().__init__(message)
+        self.results = results
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping phone numbers to workers.
+    Each worker owns many points on the ring and a phone number belongs to the
+    worker of the first point at or after its hash. Adding a worker therefore only
+    moves the numbers that fall on the new worker's points, about 1/N of them,
+    instead of reshuffling everyone.
+    """
+
+    def __init__(self, nodes=(), virtual_nodes=SHARD_VIRTUAL_NODES):
+        """
+        Args:
+            nodes (iterable): Names of the initial workers.
+            virtual_nodes (int): Points per worker.
+        """
+        self.virtual_nodes = virtual_nodes
+        self._points = []  # Sorted hashes
+        self._owners = {}  # hash -> worker name
+        self.nodes = []
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.virtual_nodes):
+            point = _hash(f"{node}#{replica}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove_node(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        self._points = [point for point in self._points if self._owners[point] != node]
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+
+    def node_for(self, key):
+        """
+        Returns:
+            str: The worker owning the key (a phone number), or None if the ring is empty.
+        """
+        if not self._points:
+            return None
+        index = bisect.bisect_left(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+class ShardWorker:
+    """
+    One worker process: owns the users of its shard, their storage and their schedule.
+    Runs in its own data directory, so the user store, intake journal, rollups and
+    audit log of different workers never share a file.
+    """
+
+    def __init__(self, name, backend=None, rate_limit=None):
+        self.name = name
+        self.store = create_user_store(backend)
+        set_user_store(self.store)
+        self.set_rate(settings.SMS_RATE_LIMIT if rate_limit is None else rate_limit)
+        self.scheduler = get_scheduler()
+        self.replies_handled = 0
+        self._schedule([user["id"] for user in self.store.users()])
+
+    def _schedule(self, user_ids):
+        if user_ids:
+            self.scheduler.add_users(user_ids, "reminder")
+            self.scheduler.add_users(user_ids, "statistics")
+
+    def set_rate(self, rate_limit):
+        """Use this worker's share of the gateway's rate limit."""
+        set_rate_limiter(TokenBucket(rate_limit, max(1, settings.SMS_RATE_BURST)))
+
+    def register(self, records):
+        results = register_users(records)
+        self._schedule([self.store.get_by_phone(result["phone_number"])["id"]
+                        for result in results if result["success"]])
+        return results
+
+    def replies(self, replies):
+        """
+        Record 'done'/'skip' replies of this shard's users and register new numbers.
+        Returns:
+            list: The phone numbers whose replies were processed.
+        """
+        taken = []
+        new_numbers = []
+        for phone_number, text in replies:
+            user = self.store.get_by_phone(phone_number)
+            if not user:
+                new_numbers.append((phone_number, text))
+                continue
+            taken.append(phone_number)
+            if (text or "").strip().lower() in ("done", "skip"):
+                handle_user_response(user["username"], text)
+                self.replies_handled += 1
+        if new_numbers:
+            self._register_replies(new_numbers)
+            taken.extend(phone_number for phone_number, _ in new_numbers)
+        return taken
+
+    def _register_replies(self, new_numbers):
+        """
+        Register new numbers from their replies, taken as "username age weight gender".
+        Every number is told the outcome; a reply that does not parse gets the data
+        request instead, at most once a day.
+        """
+        day = date.fromtimestamp(clocks.now()).isoformat()
+        records = []
+        messages = []
+        for phone_number, text in new_numbers:
+            try:
+                username, age, weight, gender = parse_user_details(text or "")
+            except ValueError:
+                messages.append((f"get_data:{phone_number}:{day}", phone_number, DATA_REQUEST_MESSAGE))
+                continue
+            records.append({"username": username, "phone_number": phone_number,
+                            "gender": gender, "age": age, "weight": weight})
+        for result in self.register(records):
+            key = f"welcome:{result['phone_number']}" if result["success"] else \
+                f"registration_error:{result['phone_number']}:{day}"
+            messages.append((key, result["phone_number"], result["message"]))
+        get_outbox().enqueue_many(messages)
+
+    def export_moved(self, nodes, virtual_nodes=SHARD_VIRTUAL_NODES):
+        """
+        Copy out the users that the ring with the given workers assigns elsewhere.
+        They stay in this shard until drop_users() is called for them, once their new owner imported them.
+        Returns:
+            list: {"user": record, "rollups": rows} entries for the new owners.
+        """
+        ring = HashRing(nodes, virtual_nodes)
+        moved = [user for user in self.store.users() if ring.node_for(user["phone_number"]) != self.name]
+        if not moved:
+            return []
+        get_intake_journal().compact()  # Every event is in the rollups that leave with the users
+        rollups = get_intake_rollups()
+        return [{"user": user, "rollups": rollups.export_user(user["id"])} for user in moved]
+
+    def drop_users(self, user_ids):
+        """
+        Remove users that moved to another shard.
+        Returns:
+            int: The number of users removed.
+        """
+        user_ids = set(user_ids)
+        rollups = get_intake_rollups()
+        for user_id in user_ids:
+            self.scheduler.remove_user(user_id)
+            rollups.forget_user(user_id)
+        users = self.store.users()
+        remaining = [user for user in users if user["id"] not in user_ids]
+        self.store.replace({"users": remaining})  # One write for all removals
+        return len(users) - len(remaining)
+
+    def import_users(self, entries):
+        """Take over users from another shard (or from a single-process store)."""
+        rollups = get_intake_rollups()
+        users = []
+        taken = set()
+        next_id = self.store.next_id()
+        for entry in entries:
+            user = dict(entry["user"])
+            if user["id"] in taken or self.store.get_by_id(user["id"]):
+                user["id"] = next_id  # Ids are only unique within a shard
+            next_id = max(next_id, user["id"] + 1)
+            taken.add(user["id"])
+            if entry.get("rollups"):
+                rollups.import_user(user["id"], entry["rollups"])
+            users.append(user)
+        self.store.add_users(users)
+        self._schedule([user["id"] for user in users])
+        return len(users)
+
+    def stats(self):
+        return {"users": sum(1 for _ in self.store.users()), "replies_handled": self.replies_handled}
+
+    def serve(self, conn):
+        """Run the scheduler and answer the coordinator's commands until told to stop."""
+        commands = {"register": self.register, "replies": self.replies, "export": self.export_moved,
+                    "import": self.import_users, "drop": self.drop_users, "set_rate": self.set_rate,
+                    "stats": self.stats}
+        while True:
+            try:
+                self.scheduler.run_pending()
+            except Exception as e:  # Keep serving the shard
+                print(f"[{self.name}] Scheduler error: {e}")
+            next_run = self.scheduler.next_run()
+            timeout = SHARD_MAX_SLEEP if next_run is None else \
+                min(SHARD_MAX_SLEEP, max(0.0, next_run - self.scheduler.clock()))
+            try:
+                if not conn.poll(timeout):
+                    continue
+                command, args = conn.recv()
+            except (EOFError, OSError):
+                return  # The coordinator is gone
+            if command == "stop":
+                get_intake_journal().compact()
+                conn.send({"result": self.stats()})
+                return
+            try:
+                conn.send({"result": commands[command](*args)})
+            except Exception as e:
+                conn.send({"error": f"{type(e).__name__}: {e}"})
+
+
+def _worker_main(name, data_dir, backend, rate_limit, conn):
+    """Entry point of a worker process."""
+    os.makedirs(data_dir, exist_ok=True)
+    os.chdir(data_dir)
+    ShardWorker(name, backend, rate_limit).serve(conn)
+
+
+class ShardCoordinator:
+    """
+    Splits the users across worker processes by consistent hashing on their phone number.
+    The coordinator is the only reader of the gateway's messages: it ingests them
+    once and routes every reply to the worker owning the number. Registrations are
+    routed the same way, including the details new numbers send in. Each worker sends with an equal share of the gateway's
+    rate limit, so adding workers scales the CPU side without overrunning the
+    gateway. Adding a worker moves only the users the ring reassigns to it.
+    """
+
+    def __init__(self, workers=None, team_name=SHARD_TEAM_NAME, backend=None, data_dir=SHARD_DATA_DIR,
+                 virtual_nodes=SHARD_VIRTUAL_NODES):
+        """
+        Args:
+            workers (int): Number of worker processes. Defaults to settings.SHARD_WORKERS.
+            team_name (str): The team whose messages are routed.
+            backend (str): User storage backend of the workers, see create_user_store().
+            data_dir (str): Directory holding the workers' data directories.
+            virtual_nodes (int): Points per worker on the hash ring.
+        """
+        self.initial_workers = workers or settings.SHARD_WORKERS
+        self.team_name = team_name
+        self.backend = backend
+        self.data_dir = os.path.abspath(data_dir)
+        self.ring = HashRing(virtual_nodes=virtual_nodes)
+        self.ingestor = get_message_ingestor(team_name)
+        self._context = multiprocessing.get_context("spawn")  # Workers must not inherit open stores
+        self._workers = {}  # name -> (process, connection)
+        self._lock = threading.Lock()
+
+    def _rate_share(self, count):
+        return settings.SMS_RATE_LIMIT / count if settings.SMS_RATE_LIMIT else 0
+
+    def _spawn(self, name, rate_limit):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, name=f"aquamind-{name}", daemon=True,
+                                        args=(name, os.path.join(self.data_dir, name), self.backend,
+                                              rate_limit, child_conn))
+        process.start()
+        child_conn.close()  # Only the worker holds its end, so recv() sees EOF if the worker dies
+        self._workers[name] = (process, parent_conn)
+
+    def start(self):
+        """Start the initial workers."""
+        with self._lock:
+            for index in range(self.initial_workers):
+                name = f"worker-{index}"
+                self._spawn(name, self._rate_share(self.initial_workers))
+                self.ring.add_node(name)
+
+    def _call_many(self, calls):
+        """
+        Send commands to several workers, then collect the answers, so the workers run them in parallel.
+        Args:
+            calls (dict): worker name -> (command, args tuple).
+        Every answer is read before an error is raised, so no stale answer is left in
+        a pipe for the next command.
+        Returns:
+            dict: worker name -> result.
+        Raises:
+            ShardError: If a worker reported an error or its process is gone.
+        """
+        errors = []
+        sent = []
+        for name, (command, args) in calls.items():
+            try:
+                self._workers[name][1].send((command, args))
+                sent.append(name)
+            except OSError as e:  # BrokenPipeError: the worker exited
+                errors.append(f"{name}: worker is gone ({type(e).__name__})")
+        results = {}
+        for name in sent:
+            try:
+                answer = self._workers[name][1].recv()
+            except (EOFError, OSError) as e:  # The worker died before answering
+                errors.append(f"{name}: worker is gone ({type(e).__name__})")
+                continue
+            if "error" in answer:
+                errors.append(f"{name}: {answer['error']}")
+            else:
+                results[name] = answer["result"]
+        if errors:
+            raise ShardError("; ".join(errors), results)
+        return results
+
+    def _group(self, items, phone_number):
+        groups = {}
+        for item in items:
+            groups.setdefault(self.ring.node_for(phone_number(item)), []).append(item)
+        return groups
+
+    def owner(self, phone_number):
+        """
+        Returns:
+            str: The name of the worker owning the phone number.
+        """
+        return self.ring.node_for(phone_number)
+
+    def register_users(self, records):
+        """
+        Register users on the workers owning their numbers.
+        Returns:
+            list: One result per record, in input order, see user_management.register_users().
+        """
+        with self._lock:
+            groups = self._group(records, lambda record: record.get("phone_number") or "")
+            answers = self._call_many({name: ("register", (group,)) for name, group in groups.items()})
+        by_record = {}
+        for name, group in groups.items():
+            for record, result in zip(group, answers[name]):
+                by_record[id(record)] = result
+        return [by_record[id(record)] for record in records]
+
+    def import_users(self, users):
+        """
+        Distribute existing user records, e.g. from a single-process user_data.json.
+        Returns:
+            int: The number of users imported.
+        """
+        with self._lock:
+            groups = self._group(users, lambda user: user["phone_number"])
+            answers = self._call_many({name: ("import", ([{"user": user} for user in group],))
+                                       for name, group in groups.items()})
+        return sum(answers.values())
+
+    def route_replies(self, message_groups):
+        """
+        Send each number's latest new message to the worker owning the number.
+        Args:
+            message_groups (list): New messages as returned by MessageIngestor.ingest().
+        Returns:
+            list: The phone numbers whose replies their worker processed.
+        Raises:
+            ShardError: If a worker failed; its `results` hold the numbers taken by the others.
+        """
+        replies = [(phone_number, messages[-1].get("text"))
+                   for group in message_groups for phone_number, messages in group.items()]
+        with self._lock:
+            groups = self._group(replies, lambda reply: reply[0])
+            answers = self._call_many({name: ("replies", (group,)) for name, group in groups.items()})
+        return [phone_number for taken in answers.values() for phone_number in taken]
+
+    def poll_once(self):
+        """
+        Fetch the new messages once, route them to their workers and commit the ones
+        a worker processed. A worker registers the new numbers it owns from their
+        replies, so every message is consumed once.
+        Returns:
+            int: The number of replies taken.
+        """
+        new_groups = self.ingestor.poll()
+        try:
+            taken = set(self.route_replies(new_groups))
+        except ShardError as e:
+            taken = {phone_number for numbers in e.results.values() for phone_number in numbers}
+            self.ingestor.commit(self._taken_groups(new_groups, taken))
+            raise
+        self.ingestor.commit(self._taken_groups(new_groups, taken))
+        return len(taken)
+
+    @staticmethod
+    def _taken_groups(message_groups, taken):
+        return [group for group in message_groups if any(phone_number in taken for phone_number in group)]
+
+    def add_worker(self):
+        """
+        Start one more worker and move the users the ring now assigns to it.
+        The old owners keep the users until the new worker imported them; if the
+        export or import fails, the new worker is discarded and nothing moves.
+        Returns:
+            int: The number of users moved.
+        """
+        with self._lock:
+            name = f"worker-{len(self._workers)}"
+            while name in self._workers:
+                name += "+"
+            share = self._rate_share(len(self._workers) + 1)
+            self._spawn(name, share)
+            self.ring.add_node(name)
+
+            existing = [worker for worker in self._workers if worker != name]
+            try:
+                exported = self._call_many({worker: ("export", (list(self.ring.nodes), self.ring.virtual_nodes))
+                                            for worker in existing})
+                entries = [entry for worker_entries in exported.values() for entry in worker_entries]
+                groups = self._group(entries, lambda entry: entry["user"]["phone_number"])
+                self._call_many({worker: ("import", (group,)) for worker, group in groups.items()})
+            except Exception:
+                self._discard(name)
+                raise
+            # Only now that the new owner has them may the old owners let go of the users
+            self._call_many({worker: ("drop", ([entry["user"]["id"] for entry in worker_entries],))
+                             for worker, worker_entries in exported.items() if worker_entries})
+            self._call_many({worker: ("set_rate", (share,)) for worker in existing})
+        print(f"Added {name}; moved {len(entries)} users.")
+        return len(entries)
+
+    def _discard(self, name):
+        """Take a worker that holds no users of its own off the ring and stop it. Must hold the lock."""
+        self.ring.remove_node(name)
+        process, conn = self._workers.pop(name)
+        try:
+            conn.send(("stop", ()))
+            conn.recv()
+        except (EOFError, OSError):
+            pass  # Already gone
+        process.join()
+        conn.close()
+
+    def stats(self):
+        """
+        Returns:
+            dict: worker name -> {"users": count, "replies_handled": count}.
+        """
+        with self._lock:
+            return self._call_many({name: ("stats", ()) for name in self._workers})
+
+    def run(self, stop_event=None, poll_interval=REPLY_POLL_INTERVAL):
+        """Route replies until the stop event is set, then stop the workers."""
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set():
+                try:
+                    self.poll_once()
+                except Exception as e:  # Keep routing
+                    print(f"Reply routing error: {e}")
+                stop_event.wait(poll_interval)
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Let every worker compact its journal and exit."""
+        with self._lock:
+            try:
+                results = self._call_many({name: ("stop", ()) for name, (process, _) in self._workers.items()
+                                           if process.is_alive()})
+            except ShardError as e:  # Still join the others
+                print(f"Stopping the workers: {e}")
+                results = e.results
+            for process, conn in self._workers.values():
+                process.join()
+                conn.close()
+            self._workers.clear()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run AquaMind as sharded worker processes.")
+    parser.add_argument("--workers", type=int, default=settings.SHARD_WORKERS)
+    parser.add_argument("--import-users", metavar="USER_DATA_JSON",
+                        help="Distribute the users of a single-process user_data.json across the workers")
+    args = parser.parse_args()
+
+    init_env()  # Before the workers are spawned, so they inherit the environment
+    coordinator = ShardCoordinator(args.workers)
+    coordinator.start()
+    if args.import_users:
+        with open(args.import_users, 'r') as user_file:
+            print(f"Imported {coordinator.import_users(json.load(user_file).get('users', []))} users.")
+    try:
+        coordinator.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
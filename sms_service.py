@@ -1,21 +1,516 @@
 
-import requests
+import asyncio
 import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from audit_log import audit
+from config import settings
 
 # Base API URL
-BASE_URL = 'http://hackathons.masterschool.com:3030'
+BASE_URL = settings.GATEWAY_BASE_URL
 
+# Circuit breaker states, also exported as the gateway_circuit_state gauge
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
 
-# Utility Functions
-def save_to_file(data, filename):
+# Methods that may be repeated after a timeout or 5xx; a repeated POST /sms/send sends the text twice
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a gateway endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
     """
-    Saves JSON data to a file.
-    Args:
-        data (dict): Data to be saved.
-        filename (str): The name of the file.
+    Circuit breaker for one gateway endpoint.
+    Judges the most recent calls: once enough of them failed (5xx, connection
+    errors, timeouts) or were slower than the slow-call threshold, the breaker
+    opens and calls fail immediately instead of queueing behind a struggling
+    gateway. After a cool-down it lets a few probe calls through (half-open); a
+    healthy probe closes it again, a failing one reopens it.
     """
-    with open(filename, "w") as file:
-        json.dump(data, file, indent=4)
+
+    def __init__(self, endpoint, window=None, min_calls=None, failure_rate=None, slow_call=None,
+                 open_seconds=None, probes=None, clock=time.monotonic):
+        """
+        Args:
+            endpoint (str): Name of the endpoint, for status and metrics.
+        The thresholds default to the GATEWAY_BREAKER_* values in config.settings.
+        """
+        self.endpoint = endpoint
+        self.min_calls = min_calls or settings.GATEWAY_BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate or settings.GATEWAY_BREAKER_FAILURE_RATE
+        self.slow_call = slow_call or settings.GATEWAY_BREAKER_SLOW_CALL
+        self.open_seconds = settings.GATEWAY_BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.probes = probes or settings.GATEWAY_BREAKER_PROBES
+        self.clock = clock
+        self.state = CLOSED
+        self.opened_at = None
+        self._calls = deque(maxlen=window or settings.GATEWAY_BREAKER_WINDOW)  # True for a bad call
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        """Must hold the lock."""
+        self.state = state
+        if state == OPEN:
+            self.opened_at = self.clock()
+        if state == CLOSED:
+            self._calls.clear()
+        self._probes_in_flight = 0
+        metrics.set_gauge("gateway_circuit_state", CIRCUIT_STATE_VALUES[state], endpoint=self.endpoint)
+        if state != HALF_OPEN:
+            print(f"Gateway circuit for {self.endpoint} is {state}.")
+
+    def allow(self):
+        """
+        Ask to make a call. A call that is allowed must be reported with record().
+        Returns:
+            bool: False while the breaker is open.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self.opened_at < self.open_seconds:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def record(self, ok, latency):
+        """
+        Report the outcome of an allowed call.
+        Args:
+            ok (bool): False for a 5xx response, connection error or timeout.
+            latency (float): Seconds the call took.
+        """
+        bad = not ok or latency > self.slow_call
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._set_state(OPEN if bad else CLOSED)
+                return
+            if self.state == OPEN:
+                return  # A call that started before the breaker opened
+            self._calls.append(bad)
+            if len(self._calls) >= self.min_calls and sum(self._calls) / len(self._calls) >= self.failure_rate:
+                self._set_state(OPEN)
+
+    def status(self):
+        """
+        Returns:
+            dict: The state, the share of bad calls in the window and when the breaker last opened.
+        """
+        with self._lock:
+            calls = len(self._calls)
+            return {"state": self.state, "calls": calls,
+                    "failure_rate": round(sum(self._calls) / calls, 3) if calls else 0.0,
+                    "opened_at": self.opened_at}
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of concurrent gateway requests.
+    Every healthy response below the latency target grows the limit by about one
+    per round of requests (additive increase); an error, a 429/5xx or a slow
+    response cuts it in half (multiplicative decrease), at most once per latency
+    target so one burst of slow responses does not collapse it to the minimum.
+    """
+
+    def __init__(self, max_limit=None, min_limit=None, latency_target=None, clock=time.monotonic):
+        """
+        Args:
+            max_limit (int): Upper bound and starting value. Defaults to settings.GATEWAY_POOL_SIZE.
+            min_limit (int): Lower bound. Defaults to settings.GATEWAY_CONCURRENCY_MIN.
+            latency_target (float): Seconds; slower responses shrink the limit.
+        """
+        self.max_limit = max_limit or settings.GATEWAY_POOL_SIZE
+        self.min_limit = min_limit or settings.GATEWAY_CONCURRENCY_MIN
+        self.latency_target = latency_target or settings.GATEWAY_LATENCY_TARGET
+        self.clock = clock
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def try_acquire(self):
+        """Take a slot if one is free, without waiting."""
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Block until a slot under the current limit is free, then take it."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """Wait for a free slot without blocking the event loop."""
+        delay = 0.001
+        while not self.try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(0.05, delay * 2)
+
+    def release(self, latency, overloaded=False):
+        """
+        Free a slot and adapt the limit.
+        Args:
+            latency (float): Seconds the request took.
+            overloaded (bool): True for an error, a 429 or a 5xx response.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                now = self.clock()
+                if now - self._last_decrease >= self.latency_target:
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            limit = self.limit
+            self._condition.notify_all()
+        metrics.set_gauge("gateway_concurrency_limit", int(limit))
+
+    def status(self):
+        """
+        Returns:
+            dict: The current limit and the requests in flight.
+        """
+        with self._condition:
+            return {"limit": int(self.limit), "in_flight": self.in_flight, "max_limit": self.max_limit}
+
+
+_circuit_breakers = {}
+_concurrency_limiter = None
+_resilience_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint):
+    """
+    Returns:
+        CircuitBreaker: The breaker of the endpoint, shared by the sync and async clients.
+    """
+    breaker = _circuit_breakers.get(endpoint)
+    if breaker is None:
+        with _resilience_lock:
+            breaker = _circuit_breakers.setdefault(endpoint, CircuitBreaker(endpoint))
+    return breaker
+
+
+def get_concurrency_limiter():
+    """
+    Returns:
+        AdaptiveLimiter: The concurrency limit shared by all requests to the gateway.
+    """
+    global _concurrency_limiter
+    if _concurrency_limiter is None:
+        with _resilience_lock:
+            if _concurrency_limiter is None:
+                _concurrency_limiter = AdaptiveLimiter()
+    return _concurrency_limiter
+
+
+def gateway_status():
+    """
+    Report how the gateway is treated right now.
+    Returns:
+        dict: {"circuits": {endpoint: breaker status}, "concurrency": limiter status}.
+    """
+    return {"circuits": {endpoint: breaker.status() for endpoint, breaker in list(_circuit_breakers.items())},
+            "concurrency": get_concurrency_limiter().status()}
+
+
+def _never_sent(error):
+    """
+    Tell whether a failed request provably never reached the gateway, so even a
+    non-idempotent request may be repeated. That holds when no connection could
+    be made; a read timeout or a connection dropped mid-exchange may come after
+    the gateway already acted on the request.
+    """
+    import requests
+    from urllib3.exceptions import ProtocolError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.Timeout):
+        return False
+    cause = error.args[0] if error.args else None
+    return isinstance(error, requests.ConnectionError) and not isinstance(cause, ProtocolError)
+
+
+def _never_sent_async(error):
+    """aiohttp counterpart of _never_sent()."""
+    import aiohttp
+
+    return isinstance(error, (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError))
+
+
+def _record_attempt(breaker, limiter, start, status_code):
+    """Report one request to the endpoint's breaker and the concurrency limiter; status_code None means no response."""
+    latency = time.perf_counter() - start
+    failed = status_code is None or status_code >= 500
+    limiter.release(latency, overloaded=failed or status_code == 429)
+    breaker.record(not failed, latency)
+
+
+class GatewayClient:
+    """
+    Shared HTTP client for the SMS gateway.
+    Keeps a pool of kept-alive connections, applies connect/read timeouts to every
+    request and retries failed attempts with bounded exponential backoff.
+    Idempotent requests are retried on 5xx responses, timeouts and connection
+    errors. Others, like POST /sms/send, are only retried when the connection
+    could not be made: after a read timeout or a 5xx the gateway may already have
+    sent the message, so the outcome is returned to the caller instead. Every
+    attempt passes the endpoint's circuit breaker and the shared adaptive
+    concurrency limit.
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_factor=None, backoff_max=None):
+        """
+        Args:
+            base_url (str): The gateway's base URL. Defaults to BASE_URL.
+            pool_size (int): Maximum number of kept-alive connections.
+            connect_timeout (float): Seconds to wait for a connection.
+            read_timeout (float): Seconds to wait for a response.
+            max_retries (int): Retries after the first attempt.
+            backoff_factor (float): Delay before the first retry, doubled on every further retry.
+            backoff_max (float): Upper bound for a single retry delay.
+        Unset arguments are taken from config.settings.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url or BASE_URL
+        self.pool_size = pool_size or settings.GATEWAY_POOL_SIZE
+        self.timeout = (connect_timeout or settings.GATEWAY_CONNECT_TIMEOUT,
+                        read_timeout or settings.GATEWAY_READ_TIMEOUT)
+        self.max_retries = settings.GATEWAY_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = settings.GATEWAY_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self.backoff_max = backoff_max or settings.GATEWAY_BACKOFF_MAX
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Read the proxy and CA bundle settings from the environment once; with trust_env
+        # requests scans the whole environment again on every request
+        self.session.proxies.update(requests.utils.get_environ_proxies(self.base_url))
+        ca_bundle = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE")
+        if ca_bundle:
+            self.session.verify = ca_bundle
+        self.session.trust_env = False
+
+    def _backoff(self, attempt):
+        """Sleep before retry number `attempt` (starting at 0)."""
+        time.sleep(min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    def request(self, method, path, endpoint=None, idempotent=None, **kwargs):
+        """
+        Send a request to the gateway, retrying failed attempts that are safe to repeat.
+        Args:
+            method (str): HTTP method, e.g. "GET" or "POST".
+            path (str): Path relative to the base URL, e.g. "/sms/send".
+            endpoint (str): Name of the call for the metrics, e.g. "send_sms". Defaults to the path.
+            idempotent (bool): Whether repeating the request is harmless, so it may be retried
+                after timeouts and 5xx responses. Defaults to True for IDEMPOTENT_METHODS.
+        Returns:
+            requests.Response: The last response received.
+        Raises:
+            requests.RequestException: If the request still fails after all retries, or
+                CircuitOpenError if the endpoint's circuit breaker is open.
+        """
+        import requests
+
+        url = f"{self.base_url}{path}"
+        endpoint = endpoint or path
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        breaker, limiter = get_circuit_breaker(endpoint), get_concurrency_limiter()
+        with metrics.timer("gateway_request", endpoint=endpoint) as labels:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    metrics.inc("gateway_retries_total", endpoint=endpoint)
+                if not breaker.allow():
+                    labels["outcome"] = "circuit_open"
+                    raise CircuitOpenError(f"Gateway circuit for {endpoint} is open.")
+                limiter.acquire()
+                start = time.perf_counter()
+                try:
+                    res = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as error:
+                    _record_attempt(breaker, limiter, start, None)
+                    if attempt == self.max_retries or not (idempotent or _never_sent(error)):
+                        labels["outcome"] = "connection_error"
+                        raise
+                    self._backoff(attempt)
+                    continue
+                except BaseException:
+                    _record_attempt(breaker, limiter, start, None)
+                    raise
+                _record_attempt(breaker, limiter, start, res.status_code)
+
+                if res.status_code < 500 or attempt == self.max_retries or not idempotent:
+                    labels["outcome"] = "ok" if res.status_code < 400 else f"http_{res.status_code}"
+                    return res
+                self._backoff(attempt)
+
+    def get(self, path, endpoint=None, **kwargs):
+        return self.request("GET", path, endpoint, **kwargs)
+
+    def post(self, path, endpoint=None, **kwargs):
+        return self.request("POST", path, endpoint, **kwargs)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+
+_gateway_client = None
+_gateway_client_lock = threading.Lock()
+
+
+def get_gateway_client():
+    """
+    Returns:
+        GatewayClient: The client shared by all API functions, created on first use.
+    """
+    global _gateway_client
+    with _gateway_client_lock:
+        if _gateway_client is None:
+            _gateway_client = GatewayClient()
+        return _gateway_client
+
+
+# Response of the async client; the body is read before the connection is released
+AsyncResponse = namedtuple("AsyncResponse", ["status_code", "text", "elapsed"])
+
+
+class AsyncGatewayClient:
+    """
+    asyncio counterpart of GatewayClient, built on aiohttp.
+    Uses the same pool size, timeouts and retry policy, so one event loop can
+    keep many gateway requests in flight without a thread per request. The
+    session is created on first use inside the running loop. aiohttp is only
+    imported once an async client is built, so the synchronous code paths
+    start without it.
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff_factor=None, backoff_max=None):
+        """
+        Args: see GatewayClient.
+        """
+        import aiohttp
+
+        self.base_url = base_url or BASE_URL
+        self.pool_size = pool_size or settings.GATEWAY_POOL_SIZE
+        self.timeout = aiohttp.ClientTimeout(connect=connect_timeout or settings.GATEWAY_CONNECT_TIMEOUT,
+                                             sock_read=read_timeout or settings.GATEWAY_READ_TIMEOUT)
+        self.max_retries = settings.GATEWAY_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_factor = settings.GATEWAY_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        self.backoff_max = backoff_max or settings.GATEWAY_BACKOFF_MAX
+        self._session = None
+        self._loop = None
+
+    def _get_session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # A session belongs to the loop it was created in
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._loop = loop
+        return self._session
+
+    async def _backoff(self, attempt):
+        """Sleep before retry number `attempt` (starting at 0) without blocking the loop."""
+        await asyncio.sleep(min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+
+    async def request(self, method, path, endpoint=None, idempotent=None, **kwargs):
+        """
+        Send a request to the gateway, retrying failed attempts that are safe to repeat.
+        Args: see GatewayClient.request().
+        Returns:
+            AsyncResponse: The last response received.
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: If the request still fails after all retries.
+            CircuitOpenError: If the endpoint's circuit breaker is open.
+        """
+        import aiohttp
+
+        url = f"{self.base_url}{path}"
+        endpoint = endpoint or path
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        session = self._get_session()
+        breaker, limiter = get_circuit_breaker(endpoint), get_concurrency_limiter()
+        with metrics.timer("gateway_request", endpoint=endpoint) as labels:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    metrics.inc("gateway_retries_total", endpoint=endpoint)
+                if not breaker.allow():
+                    labels["outcome"] = "circuit_open"
+                    raise CircuitOpenError(f"Gateway circuit for {endpoint} is open.")
+                await limiter.acquire_async()
+                start = time.perf_counter()
+                try:
+                    async with session.request(method, url, **kwargs) as res:
+                        text = await res.text()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
+                    _record_attempt(breaker, limiter, start, None)
+                    if attempt == self.max_retries or not (idempotent or _never_sent_async(error)):
+                        labels["outcome"] = "connection_error"
+                        raise
+                    await self._backoff(attempt)
+                    continue
+                except BaseException:
+                    _record_attempt(breaker, limiter, start, None)
+                    raise
+                _record_attempt(breaker, limiter, start, res.status)
+
+                if res.status < 500 or attempt == self.max_retries or not idempotent:
+                    labels["outcome"] = "ok" if res.status < 400 else f"http_{res.status}"
+                    return AsyncResponse(res.status, text, time.perf_counter() - start)
+                await self._backoff(attempt)
+
+    async def get(self, path, endpoint=None, **kwargs):
+        return await self.request("GET", path, endpoint, **kwargs)
+
+    async def post(self, path, endpoint=None, **kwargs):
+        return await self.request("POST", path, endpoint, **kwargs)
+
+    async def close(self):
+        """Close the session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_async_gateway_client = None
+
+
+def get_async_gateway_client():
+    """
+    Returns:
+        AsyncGatewayClient: The client shared by the async API functions, created on first use.
+    """
+    global _async_gateway_client
+    if _async_gateway_client is None:
+        _async_gateway_client = AsyncGatewayClient()
+    return _async_gateway_client
 
 
 # API Functions
@@ -27,35 +522,35 @@ def add_new_team(team_name):
     Returns:
         dict: JSON response from the API or an error message.
     """
+    import requests
+
     # Validate team name
     team_name = team_name.strip()
     if not team_name or not team_name.isalpha():
         print("Error: Team name must contain only letters and cannot be blank.")
         return {"status": "Error", "description": "Invalid team name."}
 
-    url = f"{BASE_URL}/team/addNewTeam"
     data = {"teamName": team_name}  # Prepare the request payload.
 
     try:
-        res = requests.post(url, json=data)  # Send the POST request.
-        print(f"Raw Response Text: {res.text}")  # Log the raw response.
+        res = get_gateway_client().post("/team/addNewTeam", "add_new_team", json=data)  # Send the POST request.
+        # Log the raw response off the request path
+        audit("add_new_team", body=res, status=res.status_code, elapsed=res.elapsed.total_seconds())
 
         if res.status_code == 200:  # Check if the request was successful.
             try:
-                response_json = res.json()  # Parse the response as JSON.
-                save_to_file(response_json, "1_TeamAdded.html")  # Save response to file.
-                return response_json
+                return res.json()  # Parse the response as JSON.
             except json.JSONDecodeError:
-                save_to_file({"error": res.text}, "1_TeamAdded.html")  # Handle invalid JSON.
+                audit("add_new_team", error="Invalid JSON response")  # Handle invalid JSON.
                 return {"error": "Invalid JSON response"}
         elif res.status_code == 500 and "already exists" in res.text:
             print(f"Error: Team '{team_name}' already exists.")
             return {"error": f"Team '{team_name}' already exists."}
         else:
-            save_to_file({"error": res.text}, "1_TeamAdded.html")
             return {"error": res.text}
-    except requests.RequestException as e:
+    except (requests.RequestException, CircuitOpenError) as e:
         print(f"Request failed: {e}")
+        audit("add_new_team", error=str(e))
         return {"error": str(e)}
 
 
@@ -68,6 +563,8 @@ def register_number(phone_number, team_name):
     Returns:
         dict: JSON response from the API or an error message.
     """
+    import requests
+
     phone_number = phone_number.strip().lstrip("+")  # Remove '+' and spaces.
 
     # Validate phone number format
@@ -78,26 +575,24 @@ def register_number(phone_number, team_name):
         print("Error: Phone number must start with country code '49'.")
         return {"status": "Error", "description": "Phone number must start with country code 49."}
 
-    url = f"{BASE_URL}/team/registerNumber"
     data = {"phoneNumber": phone_number, "teamName": team_name}  # Request payload.
 
     try:
-        res = requests.post(url, json=data)  # Send the POST request.
-        print(f"Raw Response Text: {res.text}")  # Log the raw response.
+        res = get_gateway_client().post("/team/registerNumber", "register_number", json=data)  # Send the POST request.
+        # Log the raw response off the request path
+        audit("register_number", body=res, status=res.status_code, elapsed=res.elapsed.total_seconds())
 
         if res.status_code == 200:
             try:
-                response_json = res.json()  # Parse the response as JSON.
-                save_to_file(response_json, "2_outputRegNum.html")  # Save response to file.
-                return response_json
+                return res.json()  # Parse the response as JSON.
             except json.JSONDecodeError:
-                save_to_file({"error": res.text}, "2_outputRegNum.html")  # Handle invalid JSON.
+                audit("register_number", error="Invalid JSON response")  # Handle invalid JSON.
                 return {"error": "Invalid JSON response"}
         else:
-            save_to_file({"error": res.text}, "2_outputRegNum.html")
             return {"error": res.text}
-    except requests.RequestException as e:
+    except (requests.RequestException, CircuitOpenError) as e:
         print(f"Request failed: {e}")
+        audit("register_number", error=str(e))
         return {"error": str(e)}
 
 
@@ -109,28 +604,44 @@ def get_messages(team_name):
     Returns:
         dict: JSON response from the API or an error message.
     """
-    url = f"{BASE_URL}/team/getMessages/{team_name}"  # API endpoint.
+    import requests
 
     try:
-        res = requests.get(url)  # Send the GET request.
-        print(f"Raw Response Text: {res.text}")  # Log the raw response.
+        res = get_gateway_client().get(f"/team/getMessages/{team_name}", "get_messages")  # Send the GET request.
+        # Log the raw response off the request path
+        audit("get_messages", body=res, status=res.status_code, elapsed=res.elapsed.total_seconds())
 
         if res.status_code == 200:
             try:
-                response_json = res.json()  # Parse the response as JSON.
-                save_to_file(response_json, "3_outputMessages.html")  # Save response to file.
-                return response_json
+                return res.json()  # Parse the response as JSON.
             except json.JSONDecodeError:
-                save_to_file({"error": res.text}, "3_outputMessages.html")  # Handle invalid JSON.
+                audit("get_messages", error="Invalid JSON response")  # Handle invalid JSON.
                 return {"error": "Invalid JSON response"}
         else:
-            save_to_file({"error": res.text}, "3_outputMessages.html")
             return {"error": res.text}
-    except requests.RequestException as e:
+    except (requests.RequestException, CircuitOpenError) as e:
         print(f"Request failed: {e}")
+        audit("get_messages", error=str(e))
         return {"error": str(e)}
 
 
+def _validate_sms(phone_number, message):
+    """
+    Check an SMS before sending it.
+    Returns:
+        tuple: (normalized phone number, None) or (phone number, error response).
+    """
+    if len(message) > 160:
+        print(f"Error: Message exceeds 160 characters ({len(message)}).")
+        return phone_number, {"status": "Error", "description": "Message length exceeds limit."}
+
+    phone_number = phone_number.strip().lstrip("+")  # Remove '+' and spaces.
+    if not phone_number.isdigit() or not phone_number.startswith("49"):
+        print("Error: Invalid phone number format.")
+        return phone_number, {"status": "Error", "description": "Invalid phone number format."}
+    return phone_number, None
+
+
 def send_sms(phone_number, message, sender=""):
     """
     Sends an SMS message to a specified phone number.
@@ -139,38 +650,254 @@ def send_sms(phone_number, message, sender=""):
         message (str): The SMS content.
         sender (str): The sender ID (optional).
     Returns:
-        dict: JSON response from the API or an error message.
+        dict: JSON response from the API or an error message. An error carries
+            "not_sent": True when the message provably was not sent (no connection,
+            an open circuit or a 4xx refusal), so it is safe to send it again.
     """
-    if len(message) > 160:
-        print(f"Error: Message exceeds 160 characters ({len(message)}).")
-        return {"status": "Error", "description": "Message length exceeds limit."}
+    import requests
 
-    phone_number = phone_number.strip().lstrip("+")  # Remove '+' and spaces.
-    if not phone_number.isdigit() or not phone_number.startswith("49"):
-        print("Error: Invalid phone number format.")
-        return {"status": "Error", "description": "Invalid phone number format."}
+    phone_number, error = _validate_sms(phone_number, message)
+    if error:
+        return error
 
-    url = f"{BASE_URL}/sms/send"
     data = {"phoneNumber": phone_number, "message": message, "sender": sender}  # Request payload.
 
     try:
-        res = requests.post(url, json=data)  # Send the POST request.
-        print(f"Raw Response Text: {res.text}")  # Log the raw response.
+        res = get_gateway_client().post("/sms/send", "send_sms", json=data)  # Send the POST request.
+        # Log the raw response off the request path
+        audit("send_sms", body=res, status=res.status_code, elapsed=res.elapsed.total_seconds())
 
         if res.status_code == 200:
             try:
-                response_json = res.json()  # Parse the response as JSON.
-                save_to_file(response_json, "4_outputSendSMS.html")  # Save response to file.
-                return response_json
+                return res.json()  # Parse the response as JSON.
             except json.JSONDecodeError:
-                save_to_file({"error": res.text}, "4_outputSendSMS.html")  # Handle invalid JSON.
+                audit("send_sms", error="Invalid JSON response")  # Handle invalid JSON.
                 return {"error": "Invalid JSON response"}
         else:
-            save_to_file({"error": res.text}, "4_outputSendSMS.html")
-            return {"error": res.text}
-    except requests.RequestException as e:
+            return {"error": res.text, "not_sent": 400 <= res.status_code < 500}
+    except (requests.RequestException, CircuitOpenError) as e:
+        print(f"Request failed: {e}")
+        audit("send_sms", error=str(e))
+        return {"error": str(e), "not_sent": isinstance(e, CircuitOpenError) or _never_sent(e)}
+
+
+def _parse_async_response(event, res):
+    """Audit a response of the async client and turn it into the result of the API function."""
+    audit(event, body=res.text, status=res.status_code, elapsed=round(res.elapsed, 3))
+    if res.status_code == 200:
+        try:
+            return json.loads(res.text)
+        except json.JSONDecodeError:
+            audit(event, error="Invalid JSON response")
+            return {"error": "Invalid JSON response"}
+    return {"error": res.text}
+
+
+async def get_messages_async(team_name):
+    """
+    asyncio version of get_messages().
+    Returns:
+        list or dict: The team's messages or an error message.
+    """
+    import aiohttp
+
+    try:
+        res = await get_async_gateway_client().get(f"/team/getMessages/{team_name}", "get_messages")
+    except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
         print(f"Request failed: {e}")
+        audit("get_messages", error=str(e))
         return {"error": str(e)}
+    return _parse_async_response("get_messages", res)
+
+
+async def send_sms_async(phone_number, message, sender=""):
+    """
+    asyncio version of send_sms().
+    Returns:
+        dict: JSON response from the API or an error message, see send_sms().
+    """
+    import aiohttp
+
+    phone_number, error = _validate_sms(phone_number, message)
+    if error:
+        return error
+
+    data = {"phoneNumber": phone_number, "message": message, "sender": sender}
+    try:
+        res = await get_async_gateway_client().post("/sms/send", "send_sms", json=data)
+    except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+        print(f"Request failed: {e}")
+        audit("send_sms", error=str(e))
+        return {"error": str(e), "not_sent": isinstance(e, CircuitOpenError) or _never_sent_async(e)}
+    response = _parse_async_response("send_sms", res)
+    if 400 <= res.status_code < 500:
+        response["not_sent"] = True
+    return response
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting how many requests are made per second.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Args:
+            rate (float): Tokens added per second. 0 disables the limit.
+            capacity (int): Maximum number of tokens, i.e. the allowed burst.
+        """
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        if not self.rate:
+            return
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def _take(self):
+        """Take a token if one is available. Returns 0, or the seconds until the next token."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire_async(self):
+        """Wait for a token without blocking the event loop, then take it."""
+        if not self.rate:
+            return
+        while True:
+            wait = self._take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Returns:
+        TokenBucket: The bucket shared by all bulk sends, so they stay within the gateway's throughput together.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(settings.SMS_RATE_LIMIT, settings.SMS_RATE_BURST)
+        return _rate_limiter
+
+
+def set_rate_limiter(rate_limiter):
+    """
+    Replace the shared bucket, e.g. to give a worker process its share of the gateway's throughput.
+    Args:
+        rate_limiter (TokenBucket): The bucket to use from now on.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = rate_limiter
+
+
+def is_success(response):
+    """
+    Check whether a response returned by one of the API functions reports success.
+    Args:
+        response (dict): The response to check.
+    Returns:
+        bool: False if the response describes an error.
+    """
+    return "error" not in response and response.get("status") != "Error"
+
+
+def send_sms_bulk(messages, concurrency=None, rate_limiter=None):
+    """
+    Send many SMS messages concurrently while respecting the gateway's rate limit.
+    Args:
+        messages (iterable): (phone_number, message) or (phone_number, message, sender) tuples.
+        concurrency (int): Maximum parallel requests. Defaults to settings.SMS_BULK_CONCURRENCY.
+        rate_limiter (TokenBucket): Limiter to draw from. Defaults to the shared one.
+    Returns:
+        dict: Per-message results in input order and aggregate stats. Example:
+            {"results": [{"phone_number": ..., "message": ..., "response": {...}, "success": True}],
+             "stats": {"total": 1, "sent": 1, "failed": 0, "duration": 0.2, "messages_per_second": 5.0}}
+    """
+    messages = list(messages)
+    rate_limiter = rate_limiter or get_rate_limiter()
+    concurrency = concurrency or settings.SMS_BULK_CONCURRENCY
+
+    def send_one(item):
+        phone_number, message = item[0], item[1]
+        sender = item[2] if len(item) > 2 else ""
+        rate_limiter.acquire()
+        try:
+            response = send_sms(phone_number, message, sender)
+        except Exception as e:  # One failing message must not abort the batch
+            response = {"error": str(e)}
+        return {"phone_number": phone_number, "message": message,
+                "response": response, "success": is_success(response)}
+
+    start = time.perf_counter()
+    if messages:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(messages))) as executor:
+            results = list(executor.map(send_one, messages))
+    else:
+        results = []
+    return bulk_report(results, time.perf_counter() - start)
+
+
+async def send_sms_bulk_async(messages, concurrency=None, rate_limiter=None):
+    """
+    asyncio version of send_sms_bulk(): the messages are sent as tasks on the
+    running loop instead of from a thread pool.
+    Args: see send_sms_bulk().
+    Returns:
+        dict: Per-message results in input order and aggregate stats, see send_sms_bulk().
+    """
+    messages = list(messages)
+    rate_limiter = rate_limiter or get_rate_limiter()
+    semaphore = asyncio.Semaphore(concurrency or settings.SMS_BULK_CONCURRENCY)
+
+    async def send_one(item):
+        phone_number, message = item[0], item[1]
+        sender = item[2] if len(item) > 2 else ""
+        async with semaphore:
+            await rate_limiter.acquire_async()
+            try:
+                response = await send_sms_async(phone_number, message, sender)
+            except Exception as e:  # One failing message must not abort the batch
+                response = {"error": str(e)}
+        return {"phone_number": phone_number, "message": message,
+                "response": response, "success": is_success(response)}
+
+    start = time.perf_counter()
+    results = list(await asyncio.gather(*(send_one(item) for item in messages)))
+    return bulk_report(results, time.perf_counter() - start)
+
+
+def bulk_report(results, duration):
+    """Add the aggregate stats to the per-message results of a bulk send."""
+    sent = sum(1 for result in results if result["success"])
+    stats = {
+        "total": len(results),
+        "sent": sent,
+        "failed": len(results) - sent,
+        "duration": round(duration, 3),
+        "messages_per_second": round(len(results) / duration, 2) if duration > 0 else 0.0,
+    }
+    return {"results": results, "stats": stats}
 
 
 # Interactive Menu
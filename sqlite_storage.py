@@ -0,0 +1,250 @@
+import json
+import metrics
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Columns stored natively; any other user fields are kept in the 'extra' JSON column
+USER_COLUMNS = ("id", "username", "phone_number", "gender", "age", "weight",
+                "daily_target", "water_intake", "reminders_sent")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    phone_number TEXT,
+    gender TEXT,
+    age INTEGER,
+    weight REAL,
+    daily_target REAL,
+    water_intake REAL,
+    reminders_sent INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_username ON users (username);
+CREATE INDEX IF NOT EXISTS idx_users_phone_number ON users (phone_number);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Statements are kept as constants so sqlite3's statement cache reuses the prepared versions
+SELECT_USERS = f"SELECT {', '.join(USER_COLUMNS)}, extra FROM users"
+SELECT_BY_USERNAME = SELECT_USERS + " WHERE username = ? ORDER BY id LIMIT 1"
+SELECT_BY_PHONE = SELECT_USERS + " WHERE phone_number = ? ORDER BY id LIMIT 1"
+SELECT_BY_ID = SELECT_USERS + " WHERE id = ?"
+SELECT_ALL = SELECT_USERS + " ORDER BY id"
+SELECT_MAX_ID = "SELECT COALESCE(MAX(id), 0) FROM users"
+UPSERT_USER = (
+    f"INSERT INTO users ({', '.join(USER_COLUMNS)}, extra) "
+    f"VALUES ({', '.join('?' * (len(USER_COLUMNS) + 1))}) "
+    "ON CONFLICT (id) DO UPDATE SET "
+    + ", ".join(f"{column} = excluded.{column}" for column in USER_COLUMNS[1:] + ("extra",))
+)
+SQLITE_MAX_PARAMETERS = 900  # Stay below SQLite's limit on bound parameters per statement
+DELETE_BY_ID = "DELETE FROM users WHERE id = ?"
+
+
+def _to_row(user):
+    """Convert a user dictionary into a row tuple for the users table."""
+    extra = {key: value for key, value in user.items() if key not in USER_COLUMNS}
+    return tuple(user.get(column) for column in USER_COLUMNS) + (json.dumps(extra) if extra else None,)
+
+
+def _to_user(row):
+    """Convert a users table row back into a user dictionary."""
+    if row is None:
+        return None
+    user = {column: value for column, value in zip(USER_COLUMNS, row) if value is not None}
+    if row[-1]:
+        user.update(json.loads(row[-1]))
+    return user
+
+
+class SqliteUserStore:
+    """
+    User store backed by a SQLite database.
+    Offers the same interface as user_management.UserStore, but every change
+    writes only the affected rows. The database runs in WAL mode so readers in
+    other processes are not blocked while a write is in progress.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path (str): Path to the SQLite database file.
+        """
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several changes into a single transaction.
+        Batches can be nested; the transaction is committed when the outermost one exits.
+        """
+        with self._lock:
+            if self._batch_depth == 0:
+                self._conn.execute("BEGIN IMMEDIATE")
+            self._batch_depth += 1
+            try:
+                yield self
+            except Exception:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._conn.execute("COMMIT")
+
+    def _query_one(self, sql, params):
+        with self._lock:
+            return _to_user(self._conn.execute(sql, params).fetchone())
+
+    def refresh(self):
+        """
+        Returns:
+            dict: All user data in the same shape as the JSON file. Example: {"users": []}.
+        """
+        return {"users": self.users()}
+
+    def users(self):
+        """
+        Returns:
+            list: All registered users, ordered by id.
+        """
+        with self._lock, metrics.timer("user_store_load", backend="sqlite"):
+            return [_to_user(row) for row in self._conn.execute(SELECT_ALL)]
+
+    def get_by_username(self, username):
+        """Return the user with the given username, or None."""
+        return self._query_one(SELECT_BY_USERNAME, (username,))
+
+    def get_by_phone(self, phone_number):
+        """Return the user with the given phone number, or None."""
+        return self._query_one(SELECT_BY_PHONE, (phone_number,))
+
+    def get_by_id(self, user_id):
+        """Return the user with the given id, or None."""
+        return self._query_one(SELECT_BY_ID, (user_id,))
+
+    def get_by_ids(self, user_ids):
+        """
+        Look up several users with as few queries as possible.
+        Args:
+            user_ids (iterable): The ids to look up.
+        Returns:
+            list: The users found, in the order of the ids; unknown ids are skipped.
+        """
+        user_ids = list(user_ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(user_ids), SQLITE_MAX_PARAMETERS):
+                chunk = user_ids[start:start + SQLITE_MAX_PARAMETERS]
+                sql = f"{SELECT_USERS} WHERE id IN ({', '.join('?' * len(chunk))})"
+                for row in self._conn.execute(sql, chunk):
+                    found[row[0]] = _to_user(row)
+        return [found[user_id] for user_id in user_ids if user_id in found]
+
+    def next_id(self):
+        """Return the id to assign to the next registered user."""
+        with self._lock:
+            return self._conn.execute(SELECT_MAX_ID).fetchone()[0] + 1
+
+    def add_user(self, user):
+        """Insert a new user."""
+        self.add_users([user])
+
+    def add_users(self, users):
+        """Insert several users in one transaction."""
+        self.update_users(users)
+
+    def update_user(self, user):
+        """Persist changes made to a user record."""
+        self.update_users([user])
+
+    def update_users(self, users):
+        """Persist changes made to several user records in one transaction."""
+        with self.batch(), metrics.timer("user_store_save", backend="sqlite"):
+            self._conn.executemany(UPSERT_USER, [_to_row(user) for user in users])
+
+    def remove_user(self, username):
+        """
+        Remove a user by username.
+        Args:
+            username (str): The username of the user to remove.
+        Returns:
+            bool: True if the user was found and removed.
+        """
+        with self.batch():
+            user = self.get_by_username(username)
+            if user is None:
+                return False
+            self._conn.execute(DELETE_BY_ID, (user["id"],))
+        return True
+
+    def replace(self, user_data):
+        """
+        Replace the whole user data set.
+        Args:
+            user_data (dict): A dictionary with a list of users. Example: {"users": []}.
+        """
+        with self.batch():
+            self._conn.execute("DELETE FROM users")
+            self.update_users(user_data.get("users", []))
+
+    def save(self):
+        """Changes are written as they are made, so there is nothing left to save."""
+
+    def get_meta(self, key, default=None):
+        """Read a value from the meta table."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        """Write a value to the meta table."""
+        with self.batch():
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def migrate_json_to_sqlite(json_path, store):
+    """
+    Copy the users from the JSON user data file into a SQLite store.
+    The migration runs once; the store remembers that it happened and later
+    calls return without touching the database.
+    Args:
+        json_path (str): Path to the existing user_data.json file.
+        store (SqliteUserStore): The store to migrate into.
+    Returns:
+        int: The number of users migrated.
+    """
+    if store.get_meta("migrated_from_json") or not os.path.exists(json_path):
+        return 0
+
+    try:
+        with open(json_path, 'r') as user_file:
+            users = json.load(user_file).get("users", [])
+    except json.JSONDecodeError:
+        print(f"Error: Corrupted user data file '{json_path}', nothing migrated.")
+        return 0
+
+    with store.batch():
+        store.add_users(users)
+        store.set_meta("migrated_from_json", json_path)
+
+    print(f"Migrated {len(users)} users from '{json_path}' to '{store.db_path}'.")
+    return len(users)
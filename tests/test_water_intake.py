@@ -0,0 +1,37 @@
+import itertools
+
+import pytest
+
+from water_intake import calculate_daily_intake, calculate_daily_intake_batch
+
+GENDERS = ["male", "female", "other"]
+# Both sides of the child/adult bracket, plus the extremes
+AGES = [0, 1, 12, 13, 14, 15, 30, 149]
+# Weights where 30 mL per kg meets each default target (2.1, 1.9, 2.5 and 2.0 liters), and their neighbours
+WEIGHTS = [0.1, 10.0, 63.3, 63.34, 63.4, 66.6, 66.67, 66.7, 70.0, 70.1, 83.3, 83.34, 83.4, 150.0, 200.0]
+
+
+def test_batch_matches_scalar_over_grid():
+    rows = list(itertools.product(GENDERS, AGES, WEIGHTS))
+    genders, ages, weights = zip(*rows)
+
+    batch = calculate_daily_intake_batch(genders, ages, weights).tolist()
+
+    for row, target in zip(rows, batch):
+        assert target == calculate_daily_intake(*row), row
+
+
+@pytest.mark.parametrize("gender, age, weight, expected", [
+    ("male", 13, 10.0, 2.1),
+    ("female", 13, 10.0, 1.9),
+    ("male", 14, 10.0, 2.5),
+    ("female", 14, 10.0, 2.0),
+    ("male", 30, 100.0, 3.0),
+])
+def test_batch_targets_at_bracket_edges(gender, age, weight, expected):
+    assert calculate_daily_intake_batch([gender], [age], [weight]).tolist() == [pytest.approx(expected)]
+    assert calculate_daily_intake(gender, age, weight) == pytest.approx(expected)
+
+
+def test_batch_of_nothing_is_empty():
+    assert calculate_daily_intake_batch([], [], []).size == 0
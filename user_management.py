@@ -1,31 +1,313 @@
 import json
 import os
-from water_intake import calculate_daily_intake
+import threading
+from contextlib import contextmanager
+import metrics
+from config import settings
+from intake_rollups import get_intake_rollups
+from water_intake import calculate_daily_intake, calculate_daily_intake_batch
 
 # Constants for file paths and modes
 USER_DATA_FILE_PATH = "user_data.json"
+USER_DB_FILE_PATH = "user_data.db"
+DATA_REQUEST_MESSAGE = "Please send your username, age, weight, gender (e.g., john_doe 30 70 male)"
+
+
+class UserStore:
+    """
+    In-memory view of the user data file with hash indexes for fast lookups.
+    The file is parsed once and only reloaded when its modification time changes,
+    so repeated lookups by username, phone number or id cost O(1) instead of a
+    full read and scan of the file. The file is replaced atomically on save, and
+    a lock serialises reloads and changes made from worker threads.
+    """
+
+    def __init__(self, file_path=USER_DATA_FILE_PATH):
+        """
+        Args:
+            file_path (str): Path to the JSON file holding the user data.
+        """
+        self.file_path = file_path
+        self.user_data = {"users": []}
+        self._loaded = False
+        self._file_stamp = None
+        self._by_username = {}
+        self._by_phone = {}
+        self._by_id = {}
+        self._max_id = 0
+        self._batch_depth = 0
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several changes so the data file is written only once, when the
+        outermost batch exits. Other threads wait until the batch is done.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self.save()
+
+    def _stat(self):
+        """Return the (mtime, size) stamp of the data file, or None if it does not exist."""
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_file(self):
+        """
+        Read user data from the JSON file.
+        Returns:
+            dict: A dictionary with a list of users. Example: {"users": []}.
+        """
+        if not os.path.exists(self.file_path):
+            return {"users": []}  # Initialize an empty list for users if the file does not exist
+
+        try:
+            with metrics.timer("user_store_load", backend="json"), open(self.file_path, 'r') as user_file:
+                return json.load(user_file)
+        except json.JSONDecodeError:
+            print("Error: Corrupted user data file.")
+            return {"users": []}
+        except Exception as e:
+            print(f"An unexpected error occurred: {str(e)}")
+            return {"users": []}
+
+    def _reindex(self):
+        """Rebuild the username, phone number and id indexes from the loaded users."""
+        self.user_data.setdefault("users", [])
+        self._by_username = {}
+        self._by_phone = {}
+        self._by_id = {}
+        self._max_id = 0
+        for user in self.user_data["users"]:
+            self._index(user)
+
+    def _index(self, user):
+        """Add a single user to the indexes, keeping the first match like a linear scan would."""
+        self._by_username.setdefault(user.get("username"), user)
+        self._by_phone.setdefault(user.get("phone_number"), user)
+        self._by_id.setdefault(user.get("id"), user)
+        if isinstance(user.get("id"), int):
+            self._max_id = max(self._max_id, user["id"])
+
+    def refresh(self):
+        """
+        Reload the data file if it changed on disk since it was last read. Changes
+        a batch has not written yet are kept rather than replaced by the file.
+        Returns:
+            dict: The cached user data.
+        """
+        with self._lock:
+            if self._dirty:
+                return self.user_data
+            stamp = self._stat()
+            if not self._loaded or stamp != self._file_stamp:
+                self.user_data = self._read_file()
+                self._loaded = True
+                self._file_stamp = stamp
+                self._reindex()
+            return self.user_data
+
+    def users(self):
+        """
+        Returns:
+            list: All registered users.
+        """
+        return self.refresh()["users"]
+
+    def get_by_username(self, username):
+        """Return the user with the given username, or None."""
+        with self._lock:
+            self.refresh()
+            return self._by_username.get(username)
+
+    def get_by_phone(self, phone_number):
+        """Return the user with the given phone number, or None."""
+        with self._lock:
+            self.refresh()
+            return self._by_phone.get(phone_number)
+
+    def get_by_id(self, user_id):
+        """Return the user with the given id, or None."""
+        with self._lock:
+            self.refresh()
+            return self._by_id.get(user_id)
+
+    def get_by_ids(self, user_ids):
+        """
+        Look up several users with a single freshness check.
+        Args:
+            user_ids (iterable): The ids to look up.
+        Returns:
+            list: The users found, in the order of the ids; unknown ids are skipped.
+        """
+        with self._lock:
+            self.refresh()
+            return [self._by_id[user_id] for user_id in user_ids if user_id in self._by_id]
+
+    def next_id(self):
+        """Return the id to assign to the next registered user."""
+        with self._lock:
+            self.refresh()
+            return self._max_id + 1
+
+    def add_user(self, user):
+        """
+        Append a new user and save the data file.
+        Args:
+            user (dict): The user record to add.
+        """
+        self.add_users([user])
+
+    def add_users(self, users):
+        """
+        Append several new users and save the data file once.
+        Args:
+            users (list): The user records to add.
+        """
+        with self._lock:
+            self.refresh()
+            for user in users:
+                self.user_data["users"].append(user)
+                self._index(user)
+            self.save()
+
+    def update_user(self, user):
+        """
+        Persist changes made to a user record returned by one of the lookups.
+        Args:
+            user (dict): The modified user record.
+        """
+        self.save()
+
+    def update_users(self, users):
+        """
+        Persist changes made to several user records with a single write.
+        Args:
+            users (list): The modified user records.
+        """
+        self.save()
+
+    def remove_user(self, username):
+        """
+        Remove a user by username and save the data file.
+        Args:
+            username (str): The username of the user to remove.
+        Returns:
+            bool: True if the user was found and removed.
+        """
+        with self._lock:
+            user = self.get_by_username(username)
+            if user is None:
+                return False
+
+            self.user_data["users"].remove(user)
+            self._reindex()
+            self.save()
+        return True
+
+    def replace(self, user_data):
+        """
+        Replace the whole user data set and save it.
+        Args:
+            user_data (dict): A dictionary containing user data to be saved.
+        """
+        with self._lock:
+            self.user_data = user_data
+            self._loaded = True
+            self._reindex()
+            self.save()
+
+    def save(self):
+        """
+        Save the cached user data to the JSON file.
+        The data is written to a temporary file that then replaces the old one, so
+        a crash mid-write never leaves a truncated file behind.
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._batch_depth:
+                self._dirty = True  # Written once the outermost batch exits
+                return
+
+            self._dirty = False
+            temp_path = f"{self.file_path}.tmp"
+            try:
+                with metrics.timer("user_store_save", backend="json"):
+                    with open(temp_path, 'w') as user_file:
+                        json.dump(self.user_data, user_file, indent=4)
+                    os.replace(temp_path, self.file_path)
+                self._file_stamp = self._stat()  # Our own write must not trigger a reload
+            except IOError as io_error:
+                print(f"File I/O error: {str(io_error)}")
+            except Exception as e:
+                print(f"An unexpected error occurred: {str(e)}")
+
+
+_user_store = None
+
+
+def create_user_store(backend=None):
+    """
+    Create a user store for the configured storage backend.
+    Args:
+        backend (str): "json" or "sqlite". Defaults to settings.USER_STORAGE_BACKEND.
+    Returns:
+        UserStore or SqliteUserStore: The new store.
+    """
+    backend = backend or settings.USER_STORAGE_BACKEND
+    if backend == "json":
+        return UserStore(USER_DATA_FILE_PATH)
+    if backend == "sqlite":
+        from sqlite_storage import SqliteUserStore, migrate_json_to_sqlite
+
+        store = SqliteUserStore(USER_DB_FILE_PATH)
+        migrate_json_to_sqlite(USER_DATA_FILE_PATH, store)  # One-shot, no-op once done
+        return store
+    raise ValueError(f"Unknown user storage backend: {backend!r}")
+
+
+def get_user_store():
+    """
+    Returns:
+        UserStore or SqliteUserStore: The shared store used by all module functions.
+    """
+    global _user_store
+    if _user_store is None:
+        _user_store = create_user_store()
+    return _user_store
+
+
+def set_user_store(store):
+    """
+    Replace the shared user store, e.g. to plug in a different backend.
+    Args:
+        store (UserStore or SqliteUserStore): The store to use from now on.
+    """
+    global _user_store
+    _user_store = store
 
 
 def load_user_data():
     """
     Load user data from the JSON file.
     Tries to read the user data from the specified JSON file. If the file does not
-    exist or is corrupted, it returns an empty list of users.
+    exist or is corrupted, it returns an empty list of users. The data is cached by
+    the shared user store instead of being re-read on every call.
     Returns:
         dict: A dictionary with a list of users. Example: {"users": []}.
     """
-    if not os.path.exists(USER_DATA_FILE_PATH):
-        return {"users": []}  # Initialize an empty list for users if the file does not exist
-
-    try:
-        with open(USER_DATA_FILE_PATH, 'r') as user_file:
-            return json.load(user_file)
-    except json.JSONDecodeError:
-        print("Error: Corrupted user data file.")
-        return {"users": []}
-    except Exception as e:
-        print(f"An unexpected error occurred: {str(e)}")
-        return {"users": []}
+    return get_user_store().refresh()
 
 
 def save_user_data(user_data):
@@ -37,13 +319,70 @@ def save_user_data(user_data):
     Returns:
         None
     """
-    try:
-        with open(USER_DATA_FILE_PATH, 'w') as user_file:
-            json.dump(user_data, user_file, indent=4)
-    except IOError as io_error:
-        print(f"File I/O error: {str(io_error)}")
-    except Exception as e:
-        print(f"An unexpected error occurred: {str(e)}")
+    get_user_store().replace(user_data)
+
+
+def _validate_user_details(gender, age, weight):
+    """
+    Validate the details of a user about to be registered.
+    Returns:
+        str or None: An error message, or None if the details are valid.
+    """
+    if gender not in ['male', 'female']:
+        return "Invalid gender. Please enter 'male' or 'female'."
+
+    if not (0 < age < 150):
+        return "Invalid age. Please enter a valid age."
+
+    if weight <= 0:
+        return "Invalid weight. Please enter a positive weight."
+
+    return None
+
+
+def parse_user_details(message):
+    """
+    Parse a registration reply of the form "username age weight gender".
+    Returns:
+        tuple: (username, age, weight, gender)
+    Raises:
+        ValueError: If the reply does not have that form.
+    """
+    user_details = message.split()
+    if len(user_details) != 4:
+        raise ValueError("Incorrect input format.")
+
+    username, age, weight, gender = user_details
+    if not age.isdigit() or not weight.replace('.', '', 1).isdigit():
+        raise ValueError("Age must be an integer and weight a float.")
+
+    age = int(age)
+    weight = float(weight)
+    gender = gender.lower()
+    if gender not in ['male', 'female']:
+        raise ValueError("Gender must be 'male' or 'female'.")
+
+    return username, age, weight, gender
+
+
+def _new_user_record(user_id, username, phone_number, gender, age, weight):
+    """
+    Build the stored record for a new user, including their daily water intake target.
+    The day's intake and answered reminders are not stored; they are read from the rollups.
+    """
+    return {
+        "id": user_id,
+        "username": username,
+        "phone_number": phone_number,
+        "gender": gender,
+        "age": age,
+        "weight": weight,
+        "daily_target": calculate_daily_intake(gender, age, weight),
+    }
+
+
+def _welcome_message(user):
+    return f"Welcome, {user['username']}! Your daily water intake target is {user['daily_target']:.2f} liters."
 
 
 def register_user(username, phone_number, gender, age, weight):
@@ -61,42 +400,22 @@ def register_user(username, phone_number, gender, age, weight):
         str: A message indicating success or the error encountered.
     """
     # Input validation
-    if gender not in ['male', 'female']:
-        return "Invalid gender. Please enter 'male' or 'female'."
-
-    if not (0 < age < 150):
-        return "Invalid age. Please enter a valid age."
-
-    if weight <= 0:
-        return "Invalid weight. Please enter a positive weight."
-
-    # Calculate daily water intake target
-    daily_target = calculate_daily_intake(gender, age, weight)
+    error = _validate_user_details(gender, age, weight)
+    if error:
+        return error
 
-    # Open the users file and load data
     try:
-        user_data = load_user_data()
-        user_id = len(user_data['users']) + 1  # Auto-increment user ID
+        user_store = get_user_store()
+        with user_store.batch():  # No other thread may take the same id in between
+            user_id = user_store.next_id()  # Auto-increment user ID
 
-        # Create the new user record
-        new_user = {
-            "id": user_id,
-            "username": username,
-            "phone_number": phone_number,
-            "gender": gender,
-            "age": age,
-            "weight": weight,
-            "daily_target": daily_target,
-            "water_intake": 0.0  # Initial water intake is 0
-        }
+            # Create the new user record, including the daily water intake target
+            new_user = _new_user_record(user_id, username, phone_number, gender, age, weight)
 
-        # Append the new user to the user data
-        user_data['users'].append(new_user)
+            # Append the new user and save updated user data
+            user_store.add_user(new_user)
 
-        # Save updated user data
-        save_user_data(user_data)
-
-        return f"Welcome, {username}! Your daily water intake target is {daily_target:.2f} liters."
+        return _welcome_message(new_user)
 
     except OSError as os_error:
         return f"File system error occurred: {str(os_error)}"
@@ -106,24 +425,100 @@ def register_user(username, phone_number, gender, age, weight):
         return f"An unexpected error occurred: {str(e)}"
 
 
+def register_users(records):
+    """
+    Register a batch of new users with a single load and a single save of the user data.
+    Each record is validated on its own, so an invalid record is reported without
+    stopping the rest of the batch. Phone numbers that are already registered, or
+    that appear twice in the batch, are rejected.
+    Args:
+        records (list): Dictionaries with the keys 'username', 'phone_number',
+            'gender', 'age' and 'weight'.
+    Returns:
+        list: One result per record, in input order. Example:
+            {"phone_number": "49...", "username": "john_doe", "success": True, "message": "Welcome, ..."}
+    """
+    results = []
+    new_users = []
+
+    try:
+        user_store = get_user_store()
+        with user_store.batch():  # The ids stay reserved until the batch is saved
+            next_id = user_store.next_id()
+            seen_numbers = set()
+
+            for record in records:
+                username = record.get("username")
+                phone_number = record.get("phone_number")
+                result = {"phone_number": phone_number, "username": username, "success": False}
+                results.append(result)
+
+                error = _validate_user_details(record.get("gender"), record.get("age"), record.get("weight"))
+                if not error and (phone_number in seen_numbers or user_store.get_by_phone(phone_number)):
+                    error = "Phone number is already registered."
+                if error:
+                    result["message"] = error
+                    continue
+
+                new_user = _new_user_record(next_id, username, phone_number, record["gender"],
+                                            record["age"], record["weight"])
+                next_id += 1
+                seen_numbers.add(phone_number)
+                new_users.append(new_user)
+                result.update(success=True, message=_welcome_message(new_user))
+
+            if new_users:
+                user_store.add_users(new_users)
+
+    except Exception as e:
+        # Nothing from the batch was saved, so no record counts as registered
+        for result in results:
+            if result["success"]:
+                result.update(success=False, message=f"An unexpected error occurred: {str(e)}")
+
+    return results
+
+
+def recompute_daily_targets():
+    """
+    Recalculate the daily water intake target of every user in one vectorized pass,
+    e.g. after the formula changed or a population was imported.
+    Returns:
+        int: The number of users updated.
+    """
+    user_store = get_user_store()
+    users = user_store.users()
+    if not users:
+        return 0
+
+    daily_targets = calculate_daily_intake_batch([user.get("gender") for user in users],
+                                                 [user.get("age", 0) for user in users],
+                                                 [user.get("weight", 0) for user in users])
+    for user, daily_target in zip(users, daily_targets.tolist()):
+        user["daily_target"] = daily_target
+
+    user_store.update_users(users)
+    return len(users)
+
+
 def get_user_info(username):
     """
     Retrieve information about a specific user.
     Args:
         username (str): The username of the user to fetch information for.
     Returns:
-        dict or str: The user's data if found, or a message indicating the user is not found.
+        dict or str: The user's data with today's water_intake and reminders_sent if
+            found, or a message indicating the user is not found.
     """
     if not username:
         return "Error: Username must be provided."
 
-    user_data = load_user_data()
-
-    for user in user_data['users']:
-        if user['username'] == username:
-            return user  # Return the user's data
+    user = get_user_store().get_by_username(username)
+    if user is None:
+        return "User not found."
 
-    return "User not found."
+    today = get_intake_rollups().day_totals(user["id"])
+    return dict(user, water_intake=round(today["intake"], 2), reminders_sent=today["reminders"])
 
 
 def remove_user(username):
@@ -137,19 +532,7 @@ def remove_user(username):
     if not username:
         return "Error: Username must be provided."
 
-    user_data = load_user_data()
-
-    # Check if the user exists in the system
-    user_found = False
-    for user in user_data['users']:
-        if user['username'] == username:
-            user_data['users'].remove(user)
-            user_found = True
-            break
-
-    if not user_found:
+    if not get_user_store().remove_user(username):
         return "User not found."
 
-    # Save updated user data
-    save_user_data(user_data)
     return "User removed successfully!"
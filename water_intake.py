@@ -17,3 +17,29 @@ def calculate_daily_intake(gender, age, weight):
     daily_target = max(daily_target, weight * 0.03)
 
     return daily_target
+
+
+def calculate_daily_intake_batch(genders, ages, weights):
+    """
+    Calculate the daily water intake targets for many users at once.
+    Gives exactly the same results as calculate_daily_intake, element by element.
+    Args:
+        genders (array-like): The users' genders ('male' or 'female').
+        ages (array-like): The users' ages.
+        weights (array-like): The users' weights in kilograms.
+    Returns:
+        numpy.ndarray: The daily water intake targets in liters.
+    """
+    import numpy as np
+
+    is_male = np.asarray(genders) == 'male'
+    is_child = np.asarray(ages) <= 13
+    weights = np.asarray(weights, dtype=np.float64)
+
+    # Default daily intake based on age and gender
+    daily_targets = np.where(is_child,
+                             np.where(is_male, 2.1, 1.9),
+                             np.where(is_male, 2.5, 2.0))
+
+    # Adjust based on weight (e.g., 30 mL per kg)
+    return np.maximum(daily_targets, weights * 0.03)